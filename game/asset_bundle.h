@@ -0,0 +1,322 @@
+#pragma once
+
+#include <climits>
+#include <cstddef>
+#include <cstdint>
+#include <cstring>
+
+#include "include/raylib.h"
+
+// Textures packed by scripts/AssetPack.py. The bundle is memory-mapped, so
+// opening it reads only the table; pixel pages are paged in by the upload
+// that needs them and dropped again when the bundle is closed. Pixels are
+// already decoded into a raylib PixelFormat: stored assets go to the GPU
+// straight from the mapping, DEFLATE-compressed ones are inflated first.
+//
+// File layout (little endian):
+//   header:  "DBND", uint16 version, uint16 header size, uint32 asset count, uint32 entry size
+//   entries: one AssetEntry per asset, sorted by name (strcmp order)
+//   data:    the pixels of every asset, each starting on a 16 byte boundary
+// The fields are read in place, so this assumes a little-endian machine.
+
+#ifdef _WIN32
+// windows.h clashes with raylib (Rectangle, CloseWindow, DrawText), so only
+// the few functions needed for a read-only mapping are declared here
+extern "C"
+{
+    __declspec(dllimport) void* __stdcall CreateFileA(const char* name, unsigned long access, unsigned long share,
+                                                      void* security, unsigned long disposition, unsigned long flags,
+                                                      void* templateFile);
+    __declspec(dllimport) int __stdcall GetFileSizeEx(void* file, long long* size);
+    __declspec(dllimport) void* __stdcall CreateFileMappingA(void* file, void* security, unsigned long protect,
+                                                             unsigned long sizeHigh, unsigned long sizeLow,
+                                                             const char* name);
+    __declspec(dllimport) void* __stdcall MapViewOfFile(void* mapping, unsigned long access, unsigned long offsetHigh,
+                                                        unsigned long offsetLow, size_t size);
+    __declspec(dllimport) int __stdcall UnmapViewOfFile(const void* address);
+    __declspec(dllimport) int __stdcall CloseHandle(void* handle);
+}
+#else
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+#endif
+
+enum AssetCompression : uint32_t
+{
+    ASSET_STORED = 0,
+    ASSET_DEFLATE = 1
+};
+
+const uint16_t assetBundleVersion = 1;
+const uint16_t assetBundleHeaderSize = 16;
+
+struct AssetEntry
+{
+    char name[48];
+    uint32_t width;
+    uint32_t height;
+    uint32_t format;
+    uint32_t compression;
+    uint64_t offset;
+    uint64_t size;
+    uint64_t rawSize;
+};
+
+static_assert(sizeof(AssetEntry) == 88, "AssetEntry has to match the bundle layout");
+
+class AssetBundle
+{
+public:
+    AssetBundle() = default;
+    AssetBundle(const AssetBundle&) = delete;
+    AssetBundle& operator=(const AssetBundle&) = delete;
+
+    ~AssetBundle()
+    {
+        Close();
+    }
+
+    // Maps the bundle and checks its table; false if it is missing or damaged
+    bool Open(const char* path)
+    {
+        Close();
+        if(!Map(path))
+        {
+            return false;
+        }
+        if(!Validate())
+        {
+            Close();
+            return false;
+        }
+        return true;
+    }
+
+    void Close()
+    {
+        if(data)
+        {
+#ifdef _WIN32
+            UnmapViewOfFile(data);
+            CloseHandle(mapping);
+            CloseHandle(file);
+            mapping = nullptr;
+            file = nullptr;
+#else
+            munmap((void*)data, (size_t)size);
+#endif
+        }
+        data = nullptr;
+        size = 0;
+        entries = nullptr;
+        count = 0;
+    }
+
+    bool IsOpen() const
+    {
+        return data != nullptr;
+    }
+
+    uint32_t Count() const
+    {
+        return count;
+    }
+
+    const AssetEntry& Entry(uint32_t index) const
+    {
+        return entries[index];
+    }
+
+    // Binary search over the sorted table; nullptr if there is no such asset
+    const AssetEntry* Find(const char* name) const
+    {
+        uint32_t first = 0;
+        uint32_t last = count;
+        while(first < last)
+        {
+            uint32_t middle = first + (last - first) / 2;
+            int order = strcmp(entries[middle].name, name);
+            if(order == 0)
+            {
+                return &entries[middle];
+            }
+            if(order < 0)
+            {
+                first = middle + 1;
+            }
+            else
+            {
+                last = middle;
+            }
+        }
+        return nullptr;
+    }
+
+    const uint8_t* Data(const AssetEntry& entry) const
+    {
+        return data + entry.offset;
+    }
+
+private:
+    bool Map(const char* path)
+    {
+#ifdef _WIN32
+        const unsigned long genericRead = 0x80000000ul;
+        const unsigned long fileShareRead = 0x1;
+        const unsigned long openExisting = 3;
+        const unsigned long pageReadOnly = 0x02;
+        const unsigned long fileMapRead = 0x4;
+        void* invalidHandle = (void*)(intptr_t)-1;
+
+        file = CreateFileA(path, genericRead, fileShareRead, nullptr, openExisting, 0, nullptr);
+        if(file == invalidHandle)
+        {
+            file = nullptr;
+            return false;
+        }
+        long long fileSize = 0;
+        if(!GetFileSizeEx(file, &fileSize) || fileSize < assetBundleHeaderSize)
+        {
+            CloseHandle(file);
+            file = nullptr;
+            return false;
+        }
+        mapping = CreateFileMappingA(file, nullptr, pageReadOnly, 0, 0, nullptr);
+        data = mapping ? (const uint8_t*)MapViewOfFile(mapping, fileMapRead, 0, 0, 0) : nullptr;
+        if(!data)
+        {
+            if(mapping)
+            {
+                CloseHandle(mapping);
+            }
+            CloseHandle(file);
+            mapping = nullptr;
+            file = nullptr;
+            return false;
+        }
+        size = (uint64_t)fileSize;
+#else
+        int descriptor = open(path, O_RDONLY);
+        if(descriptor < 0)
+        {
+            return false;
+        }
+        struct stat status;
+        if(fstat(descriptor, &status) != 0 || status.st_size < assetBundleHeaderSize)
+        {
+            close(descriptor);
+            return false;
+        }
+        void* address = mmap(nullptr, (size_t)status.st_size, PROT_READ, MAP_PRIVATE, descriptor, 0);
+        // The mapping keeps the file alive on its own
+        close(descriptor);
+        if(address == MAP_FAILED)
+        {
+            return false;
+        }
+        data = (const uint8_t*)address;
+        size = (uint64_t)status.st_size;
+#endif
+        return true;
+    }
+
+    bool Validate()
+    {
+        uint16_t version, headerSize;
+        uint32_t entryCount, entrySize;
+        memcpy(&version, data + 4, sizeof(version));
+        memcpy(&headerSize, data + 6, sizeof(headerSize));
+        memcpy(&entryCount, data + 8, sizeof(entryCount));
+        memcpy(&entrySize, data + 12, sizeof(entrySize));
+        if(memcmp(data, "DBND", 4) != 0 || version != assetBundleVersion || headerSize != assetBundleHeaderSize ||
+           entrySize != sizeof(AssetEntry) || headerSize + (uint64_t)entryCount * entrySize > size)
+        {
+            return false;
+        }
+
+        entries = (const AssetEntry*)(data + headerSize);
+        count = entryCount;
+        // A truncated file must not send an upload past the end of the mapping
+        for(uint32_t i = 0; i < count; i++)
+        {
+            const AssetEntry& entry = entries[i];
+            if(memchr(entry.name, '\0', sizeof(entry.name)) == nullptr || entry.offset > size ||
+               entry.size > size - entry.offset)
+            {
+                return false;
+            }
+            // Nor must the upload read more pixels than the asset holds
+            if(!PixelsMatch(entry))
+            {
+                return false;
+            }
+        }
+        return true;
+    }
+
+    static bool PixelsMatch(const AssetEntry& entry)
+    {
+        if(entry.format < PIXELFORMAT_UNCOMPRESSED_GRAYSCALE || entry.format > PIXELFORMAT_COMPRESSED_ASTC_8x8_RGBA)
+        {
+            return false;
+        }
+        // GetPixelDataSize works in int; 16 bytes is the widest pixel
+        if(entry.width == 0 || entry.height == 0 || (uint64_t)entry.width * entry.height > INT_MAX / 16)
+        {
+            return false;
+        }
+        uint64_t pixelSize = (uint64_t)GetPixelDataSize((int)entry.width, (int)entry.height, (int)entry.format);
+        if(entry.compression == ASSET_STORED)
+        {
+            return entry.size == pixelSize;
+        }
+        if(entry.compression == ASSET_DEFLATE)
+        {
+            return entry.rawSize == pixelSize;
+        }
+        return false;
+    }
+
+    const uint8_t* data = nullptr;
+    uint64_t size = 0;
+    const AssetEntry* entries = nullptr;
+    uint32_t count = 0;
+#ifdef _WIN32
+    void* file = nullptr;
+    void* mapping = nullptr;
+#endif
+};
+
+// Uploads an asset as a texture. Needs a window (an OpenGL context); returns a
+// texture with id 0 if the bundle has no such asset.
+inline Texture2D LoadBundleTexture(const AssetBundle& bundle, const char* name)
+{
+    Texture2D texture = {};
+    const AssetEntry* entry = bundle.Find(name);
+    if(!entry)
+    {
+        return texture;
+    }
+
+    Image image = {nullptr, (int)entry->width, (int)entry->height, 1, (int)entry->format};
+    if(entry->compression == ASSET_STORED)
+    {
+        // No decode and no copy: the driver reads the pixels from the mapping
+        image.data = (void*)bundle.Data(*entry);
+        return LoadTextureFromImage(image);
+    }
+    if(entry->compression == ASSET_DEFLATE)
+    {
+        int rawSize = 0;
+        unsigned char* pixels = DecompressData(bundle.Data(*entry), (int)entry->size, &rawSize);
+        if(pixels && (uint64_t)rawSize == entry->rawSize)
+        {
+            image.data = pixels;
+            texture = LoadTextureFromImage(image);
+        }
+        MemFree(pixels);
+    }
+    return texture;
+}
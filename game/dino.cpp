@@ -1,129 +1,474 @@
-#include "include/raylib.h"
+#include "dino_sim.h"
+#include "replay.h"
 
-const int screenWidth = 800;
-const int screenHeight = 450;
+#ifdef DINO_HEADLESS
 
-struct Dino
+#include <chrono>
+#include <cstdint>
+#include <cstdio>
+#include <cstdlib>
+#include <cstring>
+#include <string>
+#include <vector>
+
+// Headless mode: no window and no raylib calls. Games advance with a fixed
+// timestep as fast as the CPU allows, and the jump key comes from a seeded
+// policy or a script of frame numbers. Prints "seed score frames" per game.
+// --record-dir writes one replay per game; --replay plays a recorded session
+// (from this mode or the window) back without rendering.
+
+struct Random
 {
-    Rectangle rect;
-    Vector2 velocity;
-    bool  isJumping;
+    uint64_t state;
+
+    explicit Random(uint64_t seed) : state(seed * 2685821657736338717ull + 1) {}
+
+    // xorshift64*, returns a float in [0, 1)
+    float Next()
+    {
+        state ^= state >> 12;
+        state ^= state << 25;
+        state ^= state >> 27;
+        return (float)((state * 2685821657736338717ull) >> 40) / (float)(1 << 24);
+    }
 };
 
-struct Obstacle
+enum Policy
 {
-    Rectangle rect;
-    float speed;
+    POLICY_RANDOM,
+    POLICY_REACTIVE,
+    POLICY_SCRIPT
 };
 
-void InitDino(Dino& dino)
+struct Options
 {
-    dino.rect = {100, screenWidth - 50 - 40, 40, 40};
-    dino.velocity = {0, 0};
-    dino.isJumping = false;
-}
+    uint64_t seed = 1;
+    long games = 1;
+    long maxFrames = 60 * 60 * 10;
+    float deltaTime = 1.0f / 60.0f;
+    Policy policy = POLICY_REACTIVE;
+    float jumpChance = 0.02f;
+    std::vector<long> script;
+    const char* recordDirectory = nullptr;
+    const char* replayPath = nullptr;
+};
 
-void InitObstacle(Obstacle& obstacle, float speed) 
+bool LoadScript(const char* path, std::vector<long>& script)
 {
-    obstacle.rect = {screenWidth, screenHeight - 50 - 40, 40, 40};
-    obstacle.speed = speed;
+    FILE* file = fopen(path, "r");
+    if(!file)
+    {
+        return false;
+    }
+    long frame;
+    while(fscanf(file, "%ld", &frame) == 1)
+    {
+        script.push_back(frame);
+    }
+    fclose(file);
+    return true;
 }
 
-bool CheckCollision(const Dino& dino, const Obstacle& obstacle)
+bool ParseOptions(int argc, char** argv, Options& options)
 {
-    return CheckCollisionRecs(dino.rect, obstacle.rect);
+    for(int i = 1; i < argc; i++)
+    {
+        const char* arg = argv[i];
+        const char* value = i + 1 < argc ? argv[i + 1] : nullptr;
+        if(!value)
+        {
+            fprintf(stderr, "Missing value for %s\n", arg);
+            return false;
+        }
+        i++;
+
+        if(strcmp(arg, "--seed") == 0) options.seed = strtoull(value, nullptr, 10);
+        else if(strcmp(arg, "--games") == 0) options.games = strtol(value, nullptr, 10);
+        else if(strcmp(arg, "--max-frames") == 0) options.maxFrames = strtol(value, nullptr, 10);
+        else if(strcmp(arg, "--dt") == 0) options.deltaTime = strtof(value, nullptr);
+        else if(strcmp(arg, "--jump-chance") == 0) options.jumpChance = strtof(value, nullptr);
+        else if(strcmp(arg, "--policy") == 0)
+        {
+            if(strcmp(value, "random") == 0) options.policy = POLICY_RANDOM;
+            else if(strcmp(value, "reactive") == 0) options.policy = POLICY_REACTIVE;
+            else
+            {
+                fprintf(stderr, "Unknown policy '%s'\n", value);
+                return false;
+            }
+        }
+        else if(strcmp(arg, "--record-dir") == 0) options.recordDirectory = value;
+        else if(strcmp(arg, "--replay") == 0) options.replayPath = value;
+        else if(strcmp(arg, "--script") == 0)
+        {
+            options.policy = POLICY_SCRIPT;
+            if(!LoadScript(value, options.script))
+            {
+                fprintf(stderr, "Cannot read script '%s'\n", value);
+                return false;
+            }
+        }
+        else
+        {
+            fprintf(stderr, "Unknown option '%s'\n", arg);
+            return false;
+        }
+    }
+    return true;
 }
 
-int main()
+struct Player
 {
-    InitWindow(screenWidth, screenHeight, "Dino Game");
+    const Options& options;
+    Random random;
+    float reactionDistance;
+    size_t scriptIndex;
 
-    Dino dino;
-    Obstacle obstacle;
+    Player(const Options& options, uint64_t seed)
+        : options(options), random(seed), reactionDistance(0), scriptIndex(0)
+    {
+        DrawReactionDistance();
+    }
 
-    InitDino(dino);
-    InitObstacle(obstacle, 200);
+    void DrawReactionDistance()
+    {
+        reactionDistance = 10.0f + random.Next() * 80.0f;
+    }
 
+    bool WantsJump(const Game& game)
+    {
+        switch(options.policy)
+        {
+            case POLICY_RANDOM:
+                return random.Next() < options.jumpChance;
 
-    bool gameOver = false;
-    int score = 0;
-    const float gravity = 1000.0f;
-    const float jumpVelocity = -450.0f;
+            case POLICY_REACTIVE:
+            {
+                float gap = game.obstacle.rect.x - (game.dino.rect.x + game.dino.rect.width);
+                if(!game.dino.isJumping && gap >= 0 && gap < reactionDistance)
+                {
+                    DrawReactionDistance();
+                    return true;
+                }
+                return false;
+            }
 
-    SetTargetFPS(60);
+            case POLICY_SCRIPT:
+                if(scriptIndex < options.script.size() && options.script[scriptIndex] == game.frame)
+                {
+                    scriptIndex++;
+                    return true;
+                }
+                return false;
+        }
+        return false;
+    }
+};
 
-    while(!WindowShouldClose())
+// Plays a replay back tick by tick and checks the outcome against its end record
+int PlayReplay(const char* path)
+{
+    ReplayReader reader;
+    if(!reader.Open(path))
     {
-        float deltaTime = GetFrameTime();
+        fprintf(stderr, "Cannot read replay '%s'\n", path);
+        return 2;
+    }
 
-        if(!gameOver)
+    std::chrono::steady_clock::time_point start = std::chrono::steady_clock::now();
+    Game game;
+    InitGame(game);
+    uint64_t ticks = 0;
+    uint64_t games = 1;
+    uint8_t input;
+    while(reader.Next(input))
+    {
+        if(game.gameOver && (input & INPUT_RESTART))
         {
-            if(IsKeyPressed(KEY_SPACE) && !dino.isJumping)
-            {
-                dino.isJumping = true;
-                dino.velocity.y = jumpVelocity;
-            }
+            games++;
+        }
+        StepSession(game, input, reader.header.timestep);
+        ticks++;
+    }
+    double seconds = std::chrono::duration<double>(std::chrono::steady_clock::now() - start).count();
 
-            dino.velocity.y += gravity * deltaTime;
-            dino.rect.y += dino.velocity.y * deltaTime;
+    printf("%llu %d %ld\n", (unsigned long long)reader.header.seed, game.score, game.frame);
+    fprintf(stderr, "%llu ticks in %.3f s (%.0fx real time)\n", (unsigned long long)ticks, seconds,
+            seconds > 0 ? ticks * reader.header.timestep / seconds : 0.0);
 
-            // Prevent falling through the floor
-            if(dino.rect.y > screenHeight - 50 - dino.rect.height)
-            {
-                dino.rect.y = screenHeight - 50 - dino.rect.height;
-                dino.isJumping = false;
-                dino.velocity.y = 0;
-            }
-            obstacle.rect.x -= obstacle.speed * deltaTime;
+    if(!reader.complete)
+    {
+        fprintf(stderr, "Replay has no end record; the recording was cut off\n");
+        return 0;
+    }
+    if(reader.ticks != ticks || reader.games != games || reader.score != (uint64_t)game.score)
+    {
+        fprintf(stderr, "Replay diverged: recorded %llu ticks, %llu games, score %llu\n",
+                (unsigned long long)reader.ticks, (unsigned long long)reader.games, (unsigned long long)reader.score);
+        return 1;
+    }
+    return 0;
+}
 
-            if(obstacle.rect.x < -obstacle.rect.width)
-            {
-                obstacle.rect.x = screenWidth;
-                score++;
-            }
+int main(int argc, char** argv)
+{
+    Options options;
+    if(!ParseOptions(argc, argv, options))
+    {
+        return 2;
+    }
+    if(options.replayPath)
+    {
+        return PlayReplay(options.replayPath);
+    }
+
+    for(long i = 0; i < options.games; i++)
+    {
+        uint64_t seed = options.seed + i;
+        Player player(options, seed);
+        Game game;
+        InitGame(game);
 
-            if(CheckCollision(dino, obstacle))
+        ReplayWriter writer;
+        if(options.recordDirectory)
+        {
+            std::string path = std::string(options.recordDirectory) + "/seed_" + std::to_string(seed) + ".dreplay";
+            if(!writer.Open(path.c_str(), {seed, options.deltaTime}))
             {
-                gameOver = true;
+                fprintf(stderr, "Cannot write replay '%s'\n", path.c_str());
+                return 2;
             }
+        }
 
+        while(!game.gameOver && game.frame < options.maxFrames)
+        {
+            uint8_t input = player.WantsJump(game) ? INPUT_JUMP : 0;
+            writer.Record(input);
+            StepSession(game, input, options.deltaTime);
         }
-        else 
+        writer.Close(1, game.score);
+
+        printf("%llu %d %ld\n", (unsigned long long)seed, game.score, game.frame);
+    }
+    return 0;
+}
+
+#else
+
+#include <cstdio>
+#include <cstdlib>
+#include <cstring>
+
+#include "asset_bundle.h"
+#include "frame_profiler.h"
+
+// Textures from the asset bundle (scripts/AssetPack.py). Whatever the bundle
+// does not have is drawn as a plain rectangle.
+struct Sprites
+{
+    Texture2D dino = {};
+    Texture2D obstacle = {};
+};
+
+// Reads assets.bundle next to the executable, or the path in DINO_ASSETS_FILE.
+// The bundle is unmapped again once the textures are on the GPU.
+void LoadSprites(Sprites& sprites)
+{
+    const char* path = getenv("DINO_ASSETS_FILE");
+    AssetBundle bundle;
+    if(!bundle.Open(path ? path : TextFormat("%sassets.bundle", GetApplicationDirectory())))
+    {
+        return;
+    }
+    sprites.dino = LoadBundleTexture(bundle, "dino");
+    sprites.obstacle = LoadBundleTexture(bundle, "obstacle");
+}
+
+void UnloadSprites(Sprites& sprites)
+{
+    if(sprites.dino.id != 0) UnloadTexture(sprites.dino);
+    if(sprites.obstacle.id != 0) UnloadTexture(sprites.obstacle);
+}
+
+void DrawSprite(Texture2D texture, Rectangle rect, Color fallback)
+{
+    if(texture.id == 0)
+    {
+        DrawRectangleRec(rect, fallback);
+        return;
+    }
+    DrawTexturePro(texture, {0.0f, 0.0f, (float)texture.width, (float)texture.height}, rect, {0.0f, 0.0f}, 0.0f, WHITE);
+}
+
+void DrawGame(const Game& game, const Sprites& sprites)
+{
+    ClearBackground(RAYWHITE);
+
+    // Ground
+    DrawRectangle(0, screenHeight - 50, screenWidth, 50, DARKGRAY);
+
+    // Dino
+    DrawSprite(sprites.dino, game.dino.rect, GREEN);
+
+    // Obstacle
+    DrawSprite(sprites.obstacle, game.obstacle.rect, RED);
+
+    // Score and instructions
+    DrawText(TextFormat("Score: %d", game.score), 10, 10, 20, BLACK);
+
+    if (game.gameOver)
+    {
+        DrawText("GAME OVER! Press R to Restart", screenWidth / 2 - 160, screenHeight / 2 - 20, 20, RED);
+    }
+}
+
+// A replay being watched. Ticks before skipTo are simulated without drawing;
+// once the recording ends the keyboard takes over. recordPath is where a live
+// session is recorded (--record, or DINO_REPLAY_FILE); nothing is written without it.
+struct Playback
+{
+    ReplayReader reader;
+    bool active = false;
+    long skipTo = 0;
+    const char* recordPath = nullptr;
+};
+
+bool ParseArguments(int argc, char** argv, Playback& playback)
+{
+    for(int i = 1; i + 1 < argc; i += 2)
+    {
+        if(strcmp(argv[i], "--replay") == 0)
         {
-            // Restart game
-            if (IsKeyPressed(KEY_R)) 
+            if(!playback.reader.Open(argv[i + 1]))
             {
-                gameOver = false;
-                score = 0;
-                InitDino(dino);
-                InitObstacle(obstacle, 200);
+                fprintf(stderr, "Cannot read replay '%s'\n", argv[i + 1]);
+                return false;
             }
+            playback.active = true;
+        }
+        else if(strcmp(argv[i], "--skip-to") == 0)
+        {
+            playback.skipTo = strtol(argv[i + 1], nullptr, 10);
+        }
+        else if(strcmp(argv[i], "--record") == 0)
+        {
+            playback.recordPath = argv[i + 1];
+        }
+        else
+        {
+            fprintf(stderr, "Unknown option '%s'\n", argv[i]);
+            return false;
+        }
+    }
+    return true;
+}
+
+int main(int argc, char** argv)
+{
+    Playback playback;
+    if(!ParseArguments(argc, argv, playback))
+    {
+        return 2;
+    }
+
+    // The game steps with a fixed timestep so a session can be replayed exactly
+    float timestep = playback.active ? playback.reader.header.timestep : 1.0f / 60.0f;
+
+    Game game;
+    InitGame(game);
+    long tick = 0;
+    int games = 1;
+
+    // Fast-forward: simulate without a window up to the requested tick
+    uint8_t input;
+    while(playback.active && tick < playback.skipTo)
+    {
+        if(!playback.reader.Next(input))
+        {
+            playback.active = false;
+            break;
         }
+        StepSession(game, input, timestep);
+        tick++;
+    }
 
-        // Draw everything
-        BeginDrawing();
-        ClearBackground(RAYWHITE);
+    // A live session can be recorded, so a bug can be replayed afterwards
+    ReplayWriter writer;
+    const char* recordPath = playback.recordPath ? playback.recordPath : getenv("DINO_REPLAY_FILE");
+    if(!playback.active && recordPath && recordPath[0] != '\0')
+    {
+        writer.Open(recordPath, {0, timestep});
+    }
+
+    InitWindow(screenWidth, screenHeight, "Dino Game");
+    SetTargetFPS(60);
 
-        // Ground
-        DrawRectangle(0, screenHeight - 50, screenWidth, 50, DARKGRAY);
+    Sprites sprites;
+    LoadSprites(sprites);
 
-        // Dino
-        DrawRectangleRec(dino.rect, GREEN);
+    FrameProfiler profiler;
+    profiler.Open("dino_frames.bin");
 
-        // Obstacle
-        DrawRectangleRec(obstacle.rect, RED);
+    float accumulator = 0.0f;
+    uint8_t pendingInput = 0;
 
-        // Score and instructions
-        DrawText(TextFormat("Score: %d", score), 10, 10, 20, BLACK);
+    while(!WindowShouldClose())
+    {
+        profiler.BeginFrame();
 
-        if (gameOver) 
+        // Key presses are kept until a tick consumes them. While a replay drives the
+        // game they are dropped, so they do not all fire once it ends
+        if(playback.active)
         {
-            DrawText("GAME OVER! Press R to Restart", screenWidth / 2 - 160, screenHeight / 2 - 20, 20, RED);
+            pendingInput = 0;
+        }
+        else
+        {
+            if(IsKeyPressed(KEY_SPACE)) pendingInput |= INPUT_JUMP;
+            if(IsKeyPressed(KEY_R)) pendingInput |= INPUT_RESTART;
         }
 
+        accumulator += GetFrameTime();
+        if(accumulator > 0.25f)
+        {
+            accumulator = 0.25f;
+        }
+        while(accumulator >= timestep)
+        {
+            if(playback.active && !playback.reader.Next(input))
+            {
+                playback.active = false;
+            }
+            if(!playback.active)
+            {
+                input = pendingInput;
+                pendingInput = 0;
+                writer.Record(input);
+            }
+            if(game.gameOver && (input & INPUT_RESTART))
+            {
+                games++;
+            }
+            StepSession(game, input, timestep);
+            tick++;
+            accumulator -= timestep;
+        }
+
+        profiler.MarkUpdate();
+
+        // Draw everything
+        BeginDrawing();
+        DrawGame(game, sprites);
+        profiler.MarkDraw();
         EndDrawing();
+        profiler.EndFrame();
     }
 
+    writer.Close(games, game.score);
+    profiler.Close();
+    UnloadSprites(sprites);
     CloseWindow();
     return 0;
 }
+
+#endif
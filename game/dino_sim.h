@@ -0,0 +1,113 @@
+#pragma once
+
+#include "include/raylib.h"
+
+// Game state and rules of the Dino game, kept apart from rendering so the
+// same update code drives both the window and the headless simulation.
+// Only raylib's plain structs are used here, nothing that needs the library.
+
+const int screenWidth = 800;
+const int screenHeight = 450;
+
+const float gravity = 1000.0f;
+const float jumpVelocity = -450.0f;
+const float obstacleSpeed = 200.0f;
+
+struct Dino
+{
+    Rectangle rect;
+    Vector2 velocity;
+    bool  isJumping;
+};
+
+struct Obstacle
+{
+    Rectangle rect;
+    float speed;
+};
+
+struct Game
+{
+    Dino dino;
+    Obstacle obstacle;
+    bool gameOver;
+    int score;
+    long frame;
+};
+
+inline void InitDino(Dino& dino)
+{
+    dino.rect = {100, screenWidth - 50 - 40, 40, 40};
+    dino.velocity = {0, 0};
+    dino.isJumping = false;
+}
+
+inline void InitObstacle(Obstacle& obstacle, float speed)
+{
+    obstacle.rect = {screenWidth, screenHeight - 50 - 40, 40, 40};
+    obstacle.speed = speed;
+}
+
+inline void InitGame(Game& game)
+{
+    InitDino(game.dino);
+    InitObstacle(game.obstacle, obstacleSpeed);
+    game.gameOver = false;
+    game.score = 0;
+    game.frame = 0;
+}
+
+// Same test as raylib's CheckCollisionRecs, so the headless build needs no library
+inline bool RectanglesOverlap(Rectangle a, Rectangle b)
+{
+    return a.x < b.x + b.width && a.x + a.width > b.x &&
+           a.y < b.y + b.height && a.y + a.height > b.y;
+}
+
+inline bool CheckCollision(const Dino& dino, const Obstacle& obstacle)
+{
+    return RectanglesOverlap(dino.rect, obstacle.rect);
+}
+
+// Advances the game by one step. jumpPressed is the state of the jump key for this frame.
+inline void UpdateGame(Game& game, bool jumpPressed, float deltaTime)
+{
+    if(game.gameOver)
+    {
+        return;
+    }
+
+    Dino& dino = game.dino;
+    Obstacle& obstacle = game.obstacle;
+
+    if(jumpPressed && !dino.isJumping)
+    {
+        dino.isJumping = true;
+        dino.velocity.y = jumpVelocity;
+    }
+
+    dino.velocity.y += gravity * deltaTime;
+    dino.rect.y += dino.velocity.y * deltaTime;
+
+    // Prevent falling through the floor
+    if(dino.rect.y > screenHeight - 50 - dino.rect.height)
+    {
+        dino.rect.y = screenHeight - 50 - dino.rect.height;
+        dino.isJumping = false;
+        dino.velocity.y = 0;
+    }
+    obstacle.rect.x -= obstacle.speed * deltaTime;
+
+    if(obstacle.rect.x < -obstacle.rect.width)
+    {
+        obstacle.rect.x = screenWidth;
+        game.score++;
+    }
+
+    if(CheckCollision(dino, obstacle))
+    {
+        game.gameOver = true;
+    }
+
+    game.frame++;
+}
@@ -0,0 +1,135 @@
+#pragma once
+
+// Opt-in frame timing. Build with DINO_PROFILE defined to record, per frame,
+// the update time, the draw time (BeginDrawing up to EndDrawing), the present
+// time (EndDrawing itself, which includes the SetTargetFPS wait) and the full
+// frame time. Samples go into a fixed ring buffer that is written to disk
+// whenever it fills up and when the profiler is closed.
+//
+// File layout (little endian): "DFRM", uint16 version, uint16 record size,
+// then one FrameSample per frame. scripts/FrameReport.py reads it.
+//
+// Without DINO_PROFILE every method is an empty inline function.
+
+#ifdef DINO_PROFILE
+
+#include <chrono>
+#include <cstdint>
+#include <cstdio>
+#include <cstdlib>
+
+struct FrameSample
+{
+    uint32_t frame;
+    float updateMs;
+    float drawMs;
+    float presentMs;
+    float frameMs;
+};
+
+class FrameProfiler
+{
+public:
+    static const int capacity = 4096;
+
+    ~FrameProfiler()
+    {
+        Close();
+    }
+
+    void Open(const char* defaultPath)
+    {
+        const char* path = getenv("DINO_PROFILE_FILE");
+        file = fopen(path ? path : defaultPath, "wb");
+        if(!file)
+        {
+            return;
+        }
+        const uint16_t version = 1;
+        const uint16_t recordSize = sizeof(FrameSample);
+        fwrite("DFRM", 1, 4, file);
+        fwrite(&version, sizeof(version), 1, file);
+        fwrite(&recordSize, sizeof(recordSize), 1, file);
+        lastFrameEnd = Clock::now();
+    }
+
+    void BeginFrame()
+    {
+        frameStart = Clock::now();
+    }
+
+    void MarkUpdate()
+    {
+        updateEnd = Clock::now();
+    }
+
+    void MarkDraw()
+    {
+        drawEnd = Clock::now();
+    }
+
+    void EndFrame()
+    {
+        Clock::time_point frameEnd = Clock::now();
+        FrameSample& sample = samples[count++];
+        sample.frame = frame++;
+        sample.updateMs = Milliseconds(frameStart, updateEnd);
+        sample.drawMs = Milliseconds(updateEnd, drawEnd);
+        sample.presentMs = Milliseconds(drawEnd, frameEnd);
+        sample.frameMs = Milliseconds(lastFrameEnd, frameEnd);
+        lastFrameEnd = frameEnd;
+
+        if(count == capacity)
+        {
+            Flush();
+        }
+    }
+
+    void Close()
+    {
+        if(file)
+        {
+            Flush();
+            fclose(file);
+            file = nullptr;
+        }
+    }
+
+private:
+    using Clock = std::chrono::steady_clock;
+
+    static float Milliseconds(Clock::time_point from, Clock::time_point to)
+    {
+        return std::chrono::duration<float, std::milli>(to - from).count();
+    }
+
+    void Flush()
+    {
+        if(file && count > 0)
+        {
+            fwrite(samples, sizeof(FrameSample), count, file);
+        }
+        count = 0;
+    }
+
+    FILE* file = nullptr;
+    FrameSample samples[capacity];
+    int count = 0;
+    uint32_t frame = 0;
+    Clock::time_point frameStart, updateEnd, drawEnd, lastFrameEnd;
+};
+
+#else
+
+class FrameProfiler
+{
+public:
+    void Open(const char*) {}
+    void BeginFrame() {}
+    void MarkUpdate() {}
+    void MarkDraw() {}
+    void EndFrame() {}
+    void Close() {}
+};
+
+#endif
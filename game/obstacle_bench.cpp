@@ -0,0 +1,148 @@
+#include <chrono>
+#include <cstdio>
+#include <cstdlib>
+#include <vector>
+
+#include "dino_sim.h"
+#include "obstacle_field.h"
+
+// Compares the per-struct obstacle loop the game uses today with the
+// struct-of-arrays ObstacleField and its grid culling, for growing obstacle
+// counts. Obstacles keep a constant density, so the level gets longer as the
+// count goes up. Needs no raylib library.
+//
+// Usage: obstacle_bench [max obstacle count]
+
+using Clock = std::chrono::steady_clock;
+
+static double Seconds(Clock::time_point from, Clock::time_point to)
+{
+    return std::chrono::duration<double>(to - from).count();
+}
+
+struct Result
+{
+    double updateSeconds;
+    double collisionSeconds;
+    long collisions;
+    long tests;
+};
+
+static Rectangle RandomObstacle(float worldWidth)
+{
+    float size = 20.0f + (float)(rand() % 30);
+    return {(float)(rand() % (int)worldWidth), (float)(screenHeight - 50) - size, size, size};
+}
+
+static Result RunStructs(const std::vector<Obstacle>& initial, float worldWidth, const Dino& dino, long frames)
+{
+    std::vector<Obstacle> obstacles = initial;
+    Result result = {0, 0, 0, 0};
+    const float deltaTime = 1.0f / 60.0f;
+
+    for(long frame = 0; frame < frames; frame++)
+    {
+        Clock::time_point start = Clock::now();
+        for(Obstacle& obstacle : obstacles)
+        {
+            obstacle.rect.x -= obstacle.speed * deltaTime;
+            if(obstacle.rect.x < -obstacle.rect.width)
+            {
+                obstacle.rect.x += worldWidth + obstacle.rect.width;
+            }
+        }
+        Clock::time_point updated = Clock::now();
+
+        for(const Obstacle& obstacle : obstacles)
+        {
+            result.tests++;
+            if(CheckCollision(dino, obstacle))
+            {
+                result.collisions++;
+                break;
+            }
+        }
+        Clock::time_point checked = Clock::now();
+
+        result.updateSeconds += Seconds(start, updated);
+        result.collisionSeconds += Seconds(updated, checked);
+    }
+    return result;
+}
+
+static Result RunField(const std::vector<Obstacle>& initial, float worldWidth, const Dino& dino, long frames)
+{
+    ObstacleField field;
+    field.worldWidth = worldWidth;
+    for(const Obstacle& obstacle : initial)
+    {
+        field.Add(obstacle.rect, obstacle.speed);
+    }
+
+    Result result = {0, 0, 0, 0};
+    const float deltaTime = 1.0f / 60.0f;
+
+    for(long frame = 0; frame < frames; frame++)
+    {
+        Clock::time_point start = Clock::now();
+        field.Update(deltaTime);
+        Clock::time_point updated = Clock::now();
+        if(field.CheckCollision(dino.rect, &result.tests))
+        {
+            result.collisions++;
+        }
+        Clock::time_point checked = Clock::now();
+
+        result.updateSeconds += Seconds(start, updated);
+        result.collisionSeconds += Seconds(updated, checked);
+    }
+    return result;
+}
+
+int main(int argc, char** argv)
+{
+    long maxCount = argc > 1 ? strtol(argv[1], nullptr, 10) : 16384;
+
+    Dino dino;
+    InitDino(dino);
+    dino.rect.y = screenHeight - 50 - dino.rect.height;
+
+    printf("%8s %6s %14s %14s %14s %14s %10s %10s\n", "count", "layout", "updates/s", "checks/s",
+           "update ns/obj", "check ns/obj", "tests/frm", "hits");
+
+    for(long count = 16; count <= maxCount; count *= 4)
+    {
+        srand(1234);
+        float worldWidth = count * 20.0f > screenWidth ? count * 20.0f : (float)screenWidth;
+        std::vector<Obstacle> obstacles(count);
+        for(Obstacle& obstacle : obstacles)
+        {
+            obstacle.rect = RandomObstacle(worldWidth);
+            obstacle.speed = obstacleSpeed * (0.5f + (float)(rand() % 100) / 100.0f);
+        }
+
+        // Roughly the same amount of work for every count
+        long frames = 20000000 / count;
+        if(frames < 200)
+        {
+            frames = 200;
+        }
+
+        Result results[2] = {
+            RunStructs(obstacles, worldWidth, dino, frames),
+            RunField(obstacles, worldWidth, dino, frames),
+        };
+        const char* layouts[2] = {"AoS", "SoA"};
+
+        for(int i = 0; i < 2; i++)
+        {
+            const Result& result = results[i];
+            double updates = (double)count * frames;
+            printf("%8ld %6s %14.0f %14.0f %14.2f %14.2f %10.1f %10ld\n", count, layouts[i],
+                   updates / result.updateSeconds, updates / result.collisionSeconds,
+                   result.updateSeconds * 1e9 / updates, result.collisionSeconds * 1e9 / updates,
+                   (double)result.tests / frames, result.collisions);
+        }
+    }
+    return 0;
+}
@@ -0,0 +1,290 @@
+#pragma once
+
+#include <cstdint>
+#include <cstdio>
+#include <cstring>
+
+#include "dino_sim.h"
+
+// Replays of game sessions. A session advances in fixed-timestep ticks and
+// each tick consumes one input bitmask (jump, restart), so the seed, the
+// timestep and the inputs are enough to reproduce everything that happened.
+//
+// File layout (little endian):
+//   header: "DRPL", uint16 version, uint16 header size, uint64 seed, float timestep
+//   runs:   uint8 input mask, varint tick count (runs of equal inputs)
+//   end:    0xFF, varint ticks, varint games, varint score of the last game
+// A session that never closed its writer (a crash) has no end record; the runs
+// before the last flush are still valid. scripts/Replay.py reads this format.
+
+enum ReplayInput : uint8_t
+{
+    INPUT_JUMP = 1,
+    INPUT_RESTART = 2
+};
+
+const uint16_t replayVersion = 1;
+const uint8_t replayEndMarker = 0xFF;
+
+struct ReplayHeader
+{
+    uint64_t seed;
+    float timestep;
+};
+
+// Advances a session by one tick. Restart only applies once the game is over,
+// like the R key in the window.
+inline void StepSession(Game& game, uint8_t input, float deltaTime)
+{
+    if(!game.gameOver)
+    {
+        UpdateGame(game, (input & INPUT_JUMP) != 0, deltaTime);
+    }
+    else if(input & INPUT_RESTART)
+    {
+        InitGame(game);
+    }
+}
+
+class ReplayWriter
+{
+public:
+    static const int capacity = 4096;
+
+    // Without Close the runs are kept but the file has no end record
+    ~ReplayWriter()
+    {
+        if(file)
+        {
+            if(runLength > 0)
+            {
+                WriteRun();
+            }
+            Flush();
+            fclose(file);
+        }
+    }
+
+    bool Open(const char* path, const ReplayHeader& header)
+    {
+        file = fopen(path, "wb");
+        if(!file)
+        {
+            return false;
+        }
+        const uint16_t headerSize = 20;
+        fwrite("DRPL", 1, 4, file);
+        fwrite(&replayVersion, sizeof(replayVersion), 1, file);
+        fwrite(&headerSize, sizeof(headerSize), 1, file);
+        fwrite(&header.seed, sizeof(header.seed), 1, file);
+        fwrite(&header.timestep, sizeof(header.timestep), 1, file);
+        ticks = 0;
+        runLength = 0;
+        return true;
+    }
+
+    bool IsOpen() const
+    {
+        return file != nullptr;
+    }
+
+    void Record(uint8_t input)
+    {
+        if(!file)
+        {
+            return;
+        }
+        if(runLength > 0 && input != runInput)
+        {
+            WriteRun();
+        }
+        runInput = input;
+        runLength++;
+        ticks++;
+    }
+
+    // Finishes the file with the end record. games and score describe the session's outcome.
+    void Close(uint64_t games, uint64_t score)
+    {
+        if(!file)
+        {
+            return;
+        }
+        if(runLength > 0)
+        {
+            WriteRun();
+        }
+        Reserve(1 + 3 * 10);
+        buffer[used++] = replayEndMarker;
+        WriteVarint(ticks);
+        WriteVarint(games);
+        WriteVarint(score);
+        Flush();
+        fclose(file);
+        file = nullptr;
+    }
+
+private:
+    void WriteRun()
+    {
+        Reserve(1 + 10);
+        buffer[used++] = runInput;
+        WriteVarint(runLength);
+        runLength = 0;
+    }
+
+    void WriteVarint(uint64_t value)
+    {
+        while(value >= 0x80)
+        {
+            buffer[used++] = (uint8_t)(value | 0x80);
+            value >>= 7;
+        }
+        buffer[used++] = (uint8_t)value;
+    }
+
+    void Reserve(int bytes)
+    {
+        if(used + bytes > capacity)
+        {
+            Flush();
+        }
+    }
+
+    void Flush()
+    {
+        if(file && used > 0)
+        {
+            fwrite(buffer, 1, used, file);
+        }
+        used = 0;
+    }
+
+    FILE* file = nullptr;
+    uint8_t buffer[capacity];
+    int used = 0;
+    uint8_t runInput = 0;
+    uint64_t runLength = 0;
+    uint64_t ticks = 0;
+};
+
+class ReplayReader
+{
+public:
+    static const int capacity = 65536;
+
+    ReplayHeader header = {0, 0};
+    // Filled in from the end record once Next returned false
+    bool complete = false;
+    uint64_t ticks = 0;
+    uint64_t games = 0;
+    uint64_t score = 0;
+
+    ~ReplayReader()
+    {
+        if(file)
+        {
+            fclose(file);
+        }
+    }
+
+    bool Open(const char* path)
+    {
+        file = fopen(path, "rb");
+        if(!file)
+        {
+            return false;
+        }
+        uint8_t raw[20];
+        if(fread(raw, 1, sizeof(raw), file) != sizeof(raw) || raw[0] != 'D' || raw[1] != 'R' ||
+           raw[2] != 'P' || raw[3] != 'L' || ReadLittle(raw + 4, 2) != replayVersion || ReadLittle(raw + 6, 2) != 20)
+        {
+            fclose(file);
+            file = nullptr;
+            return false;
+        }
+        header.seed = ReadLittle(raw + 8, 8);
+        uint32_t timestepBits = (uint32_t)ReadLittle(raw + 16, 4);
+        memcpy(&header.timestep, &timestepBits, sizeof(float));
+        return true;
+    }
+
+    // Input for the next tick; false once the recording ends.
+    bool Next(uint8_t& input)
+    {
+        while(runLeft == 0)
+        {
+            int byte = ReadByte();
+            uint64_t value;
+            if(byte < 0)
+            {
+                return false;
+            }
+            if(byte == replayEndMarker)
+            {
+                complete = ReadVarint(ticks) && ReadVarint(games) && ReadVarint(score);
+                return false;
+            }
+            if(!ReadVarint(value))
+            {
+                return false;
+            }
+            runInput = (uint8_t)byte;
+            runLeft = value;
+        }
+        runLeft--;
+        input = runInput;
+        return true;
+    }
+
+private:
+    static uint64_t ReadLittle(const uint8_t* bytes, int size)
+    {
+        uint64_t value = 0;
+        for(int i = size - 1; i >= 0; i--)
+        {
+            value = (value << 8) | bytes[i];
+        }
+        return value;
+    }
+
+    int ReadByte()
+    {
+        if(position == filled)
+        {
+            filled = file ? (int)fread(buffer, 1, capacity, file) : 0;
+            position = 0;
+            if(filled == 0)
+            {
+                return -1;
+            }
+        }
+        return buffer[position++];
+    }
+
+    bool ReadVarint(uint64_t& value)
+    {
+        value = 0;
+        for(int shift = 0; shift < 64; shift += 7)
+        {
+            int byte = ReadByte();
+            if(byte < 0)
+            {
+                return false;
+            }
+            value |= (uint64_t)(byte & 0x7F) << shift;
+            if(!(byte & 0x80))
+            {
+                return true;
+            }
+        }
+        return false;
+    }
+
+    FILE* file = nullptr;
+    uint8_t buffer[capacity];
+    int position = 0;
+    int filled = 0;
+    uint8_t runInput = 0;
+    uint64_t runLeft = 0;
+};
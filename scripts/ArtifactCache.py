@@ -0,0 +1,114 @@
+import hashlib
+import os
+import shutil
+
+from Utils import GetCacheDirectory
+
+# Shared content-addressed store for downloaded installers and archives.
+# Files live under <cache>/artifacts/<sha256> and are looked up by a pinned
+# digest only. They are stored as copies and materialized into the project
+# tree as hardlinks, falling back to a copy across volumes; every lookup
+# hashes the artifact again before handing it out. The store is capped in
+# size and evicts the least recently used artifacts first.
+
+
+class ArtifactCache:
+    enabled = True
+    # Size cap in bytes, overridable through BS14_ARTIFACT_CACHE_MB
+    maxSize = 4 * 1024 * 1024 * 1024
+
+    @staticmethod
+    def GetDirectory():
+        return os.path.join(GetCacheDirectory(), "artifacts")
+
+    @classmethod
+    def GetMaxSize(cls):
+        override = os.environ.get("BS14_ARTIFACT_CACHE_MB")
+        if override and override.isdigit():
+            return int(override) * 1024 * 1024
+        return cls.maxSize
+
+    @classmethod
+    def _ArtifactPath(cls, sha256):
+        return os.path.join(cls.GetDirectory(), sha256.lower())
+
+    @classmethod
+    def Materialize(cls, sha256, destination):
+        if not cls.enabled or not sha256:
+            return False
+
+        source = cls._ArtifactPath(sha256)
+        if not os.path.isfile(source):
+            return False
+        if cls.HashFile(source) != sha256.lower():
+            # Damaged on disk; drop it so the caller downloads a good copy
+            os.remove(source)
+            return False
+
+        destination = os.path.abspath(destination)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        if os.path.exists(destination):
+            os.remove(destination)
+        try:
+            os.link(source, destination)
+        except OSError:
+            shutil.copyfile(source, destination)
+
+        # Touch the artifact so eviction sees it as recently used
+        os.utime(source)
+        return True
+
+    @classmethod
+    def Store(cls, filepath, sha256=None):
+        if not cls.enabled:
+            return None
+
+        if sha256 is None:
+            sha256 = cls.HashFile(filepath)
+        sha256 = sha256.lower()
+
+        os.makedirs(cls.GetDirectory(), exist_ok=True)
+        target = cls._ArtifactPath(sha256)
+        if os.path.isfile(target):
+            os.utime(target)
+        else:
+            tempPath = target + ".tmp"
+            if os.path.exists(tempPath):
+                os.remove(tempPath)
+            # A copy, not a link: the project file may be rewritten in place later
+            shutil.copyfile(filepath, tempPath)
+            os.replace(tempPath, target)
+
+        cls.Evict()
+        return sha256
+
+    @classmethod
+    def Evict(cls):
+        directory = cls.GetDirectory()
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            return
+
+        artifacts = []
+        for name in names:
+            if len(name) != 64:
+                continue
+            stat = os.stat(os.path.join(directory, name))
+            artifacts.append((stat.st_mtime, stat.st_size, name))
+
+        totalSize = sum(size for _, size, _ in artifacts)
+        maxSize = cls.GetMaxSize()
+        for _, size, name in sorted(artifacts):
+            if totalSize <= maxSize:
+                break
+            os.remove(os.path.join(directory, name))
+            totalSize -= size
+
+    @staticmethod
+    def HashFile(filepath, blockSize=1024 * 1024):
+        hasher = hashlib.sha256()
+        with open(filepath, "rb") as file:
+            for block in iter(lambda: file.read(blockSize), b""):
+                hasher.update(block)
+        return hasher.hexdigest()
@@ -0,0 +1,438 @@
+import argparse
+import hashlib
+import json
+import os
+import struct
+import sys
+import time
+import zlib
+
+from Utils import print_colored
+
+GameDirectory = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "game"))
+
+# Packs the images under a directory into one bundle the game memory-maps
+# (see game/asset_bundle.h). Pixels are stored decoded, in the raylib pixel
+# format of the source (grayscale, gray + alpha, RGB or RGBA), so the game
+# uploads textures straight from the mapping instead of inflating and
+# unfiltering PNGs at startup. With --compress the pixels are stored as raw
+# DEFLATE where that saves space; those assets cost a decompression when they
+# are loaded, but no PNG decode.
+#
+# Decoded assets are cached by a hash of their source and the pack settings,
+# so only new or changed images are decoded again. When nothing changed the
+# bundle is not rewritten at all.
+#
+# PNG decoding only needs the standard library. The Sub and Up filters, which
+# nearly every encoder uses for screenshots and sprites, are undone on whole
+# rows at once; Average and Paeth rows fall back to a loop per byte.
+
+
+# raylib PixelFormat values
+PixelFormats = {"gray": 1, "gray-alpha": 2, "rgb": 4, "rgba": 7}
+
+StoredCompression = 0
+DeflateCompression = 1
+
+
+class BundleFormat:
+    magic = b"DBND"
+    version = 1
+    header = struct.Struct("<4sHHII")
+    # name, width, height, format, compression, offset, stored size, raw size
+    entry = struct.Struct("<48s4I3Q")
+    # Every asset's data starts on this boundary
+    alignment = 16
+    maxNameLength = 47
+
+
+# Function to undo the PNG row filters
+
+
+def _Unfilter(data, height, bytesPerPixel, rowBytes):
+    pixels = bytearray(rowBytes * height)
+    # Per-byte addition of whole rows held as integers: the low seven bits add
+    # normally, the top bit is added without carrying into the next byte
+    low = int.from_bytes(b"\x7f" * rowBytes, "little")
+    high = int.from_bytes(b"\x80" * rowBytes, "little")
+    rowMask = (1 << (8 * rowBytes)) - 1
+
+    def Add(first, second):
+        return ((first & low) + (second & low)) ^ ((first ^ second) & high)
+
+    previous = bytes(rowBytes)
+    position = 0
+    for y in range(height):
+        filterType = data[position]
+        row = data[position + 1:position + 1 + rowBytes]
+        position += 1 + rowBytes
+
+        if filterType == 0:
+            current = bytes(row)
+        elif filterType == 1:
+            # Sub: a running sum of every byte bytesPerPixel to the left, computed
+            # as a prefix scan that doubles its reach each step
+            value = int.from_bytes(row, "little")
+            shift = 8 * bytesPerPixel
+            while shift < 8 * rowBytes:
+                value = Add(value, (value << shift) & rowMask)
+                shift *= 2
+            current = value.to_bytes(rowBytes, "little")
+        elif filterType == 2:
+            current = Add(int.from_bytes(row, "little"), int.from_bytes(previous, "little")).to_bytes(rowBytes, "little")
+        elif filterType in (3, 4):
+            current = bytearray(row)
+            for i in range(rowBytes):
+                left = current[i - bytesPerPixel] if i >= bytesPerPixel else 0
+                up = previous[i]
+                if filterType == 3:
+                    current[i] = (current[i] + ((left + up) >> 1)) & 0xFF
+                else:
+                    upLeft = previous[i - bytesPerPixel] if i >= bytesPerPixel else 0
+                    estimate = left + up - upLeft
+                    distanceLeft = abs(estimate - left)
+                    distanceUp = abs(estimate - up)
+                    distanceUpLeft = abs(estimate - upLeft)
+                    if distanceLeft <= distanceUp and distanceLeft <= distanceUpLeft:
+                        predictor = left
+                    elif distanceUp <= distanceUpLeft:
+                        predictor = up
+                    else:
+                        predictor = upLeft
+                    current[i] = (current[i] + predictor) & 0xFF
+            current = bytes(current)
+        else:
+            raise ValueError(f"unknown PNG filter type {filterType}")
+
+        pixels[y * rowBytes:(y + 1) * rowBytes] = current
+        previous = current
+    return pixels
+
+
+def _UnpackBits(pixels, width, height, bitDepth, rowBytes):
+    # Samples smaller than a byte, high bits first; one byte per sample afterwards
+    samplesPerByte = 8 // bitDepth
+    mask = (1 << bitDepth) - 1
+    unpacked = bytearray(width * height)
+    for y in range(height):
+        row = pixels[y * rowBytes:(y + 1) * rowBytes]
+        for x in range(width):
+            byte = row[x // samplesPerByte]
+            unpacked[y * width + x] = (byte >> (8 - bitDepth * (x % samplesPerByte + 1))) & mask
+    return unpacked
+
+
+# Function to decode a PNG file into (width, height, raylib pixel format, pixels)
+
+
+def DecodePng(path):
+    with open(path, "rb") as file:
+        data = file.read()
+    if data[:8] != b"\x89PNG\r\n\x1a\n":
+        raise ValueError(f"{path} is not a PNG file")
+
+    chunks = []
+    header = None
+    palette = None
+    transparency = None
+    position = 8
+    while position + 8 <= len(data):
+        length, kind = struct.unpack_from(">I4s", data, position)
+        body = data[position + 8:position + 8 + length]
+        position += 12 + length
+        if kind == b"IHDR":
+            header = body
+        elif kind == b"PLTE":
+            palette = body
+        elif kind == b"tRNS":
+            transparency = body
+        elif kind == b"IDAT":
+            chunks.append(body)
+        elif kind == b"IEND":
+            break
+
+    if header is None or len(header) != 13:
+        raise ValueError(f"{path} has no image header")
+    width, height, bitDepth, colorType, _, _, interlace = struct.unpack(">IIBBBBB", header)
+    if interlace:
+        raise ValueError(f"{path} is interlaced; save it without interlacing")
+    if colorType not in (0, 2, 3, 4, 6) or bitDepth not in (1, 2, 4, 8, 16):
+        raise ValueError(f"{path} uses an unsupported color type {colorType} or bit depth {bitDepth}")
+
+    samples = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}[colorType]
+    bitsPerPixel = samples * bitDepth
+    rowBytes = (width * bitsPerPixel + 7) // 8
+    try:
+        filtered = zlib.decompress(b"".join(chunks))
+    except zlib.error as e:
+        raise ValueError(f"{path} is damaged: {e}")
+    if len(filtered) < (rowBytes + 1) * height:
+        raise ValueError(f"{path} is truncated")
+    pixels = _Unfilter(filtered, height, max(bitsPerPixel // 8, 1), rowBytes)
+
+    if bitDepth == 16:
+        # Keep the high byte of every big-endian sample
+        pixels = pixels[0::2]
+    elif bitDepth < 8:
+        pixels = _UnpackBits(pixels, width, height, bitDepth, rowBytes)
+        if colorType == 0:
+            # Stretch 0..2^bits-1 over 0..255
+            scale = 255 // ((1 << bitDepth) - 1)
+            pixels = pixels.translate(bytes(min(value * scale, 255) for value in range(256)))
+
+    if colorType == 3:
+        if palette is None:
+            raise ValueError(f"{path} has no palette")
+        colors = [palette[i * 3:i * 3 + 3] for i in range(len(palette) // 3)]
+        colors += [b"\x00\x00\x00"] * (256 - len(colors))
+        if transparency:
+            alphas = transparency + b"\xff" * (256 - len(transparency))
+            table = [color + alphas[i:i + 1] for i, color in enumerate(colors)]
+            return width, height, PixelFormats["rgba"], b"".join([table[index] for index in pixels])
+        return width, height, PixelFormats["rgb"], b"".join([colors[index] for index in pixels])
+
+    format = {0: "gray", 2: "rgb", 4: "gray-alpha", 6: "rgba"}[colorType]
+    return width, height, PixelFormats[format], bytes(pixels)
+
+
+# Function to decode one image and compress it; runs in a worker process
+
+
+def PrepareAsset(sourcePath, cachePath, compress):
+    width, height, format, pixels = DecodePng(sourcePath)
+    compression = StoredCompression
+    stored = pixels
+    if compress:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+        deflated = compressor.compress(pixels) + compressor.flush()
+        # Not worth a decompression at load time unless it saves a tenth
+        if len(deflated) < len(pixels) * 0.9:
+            compression = DeflateCompression
+            stored = deflated
+
+    tempPath = cachePath + ".tmp"
+    with open(tempPath, "wb") as blob:
+        blob.write(stored)
+    os.replace(tempPath, cachePath)
+    return {"width": width, "height": height, "format": format, "compression": compression,
+            "size": len(stored), "rawSize": len(pixels)}
+
+
+class AssetPacker:
+    # Bump when the decoded output changes, so cached assets are rebuilt
+    packerVersion = 1
+    extensions = (".png",)
+
+    def __init__(self, sourceDirectory, outputPath, compress=False, jobs=None):
+        self.sourceDirectory = os.path.abspath(sourceDirectory)
+        self.outputPath = os.path.abspath(outputPath)
+        self.compress = compress
+        self.jobs = jobs or os.cpu_count() or 1
+        self.cacheDirectory = self.outputPath + ".cache"
+        self.statePath = os.path.join(self.cacheDirectory, "state.json")
+        self._state = None
+
+    def _LoadState(self):
+        if self._state is None:
+            try:
+                with open(self.statePath, "r", encoding="utf-8") as stateFile:
+                    self._state = json.load(stateFile)
+            except (OSError, ValueError):
+                self._state = {}
+            self._state.setdefault("files", {})
+            self._state.setdefault("assets", {})
+            self._state.setdefault("bundle", None)
+        return self._state
+
+    def SaveState(self):
+        os.makedirs(self.cacheDirectory, exist_ok=True)
+        tempPath = self.statePath + ".tmp"
+        with open(tempPath, "w", encoding="utf-8") as stateFile:
+            json.dump(self._state, stateFile, indent=2)
+        os.replace(tempPath, self.statePath)
+
+    def HashFile(self, path):
+        # Hashes are remembered by size and mtime so unchanged images are not re-read
+        stat = os.stat(path)
+        files = self._LoadState()["files"]
+        entry = files.get(path)
+        if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+            return entry[2]
+
+        hasher = hashlib.sha256()
+        with open(path, "rb") as file:
+            for block in iter(lambda: file.read(1024 * 1024), b""):
+                hasher.update(block)
+        files[path] = [stat.st_size, stat.st_mtime_ns, hasher.hexdigest()]
+        return files[path][2]
+
+    def FindAssets(self):
+        # Asset name -> source path; names are paths relative to the source directory, without extension
+        assets = {}
+        for directory, subdirectories, fileNames in os.walk(self.sourceDirectory):
+            subdirectories.sort()
+            for fileName in sorted(fileNames):
+                if not fileName.lower().endswith(self.extensions):
+                    continue
+                path = os.path.join(directory, fileName)
+                name = os.path.splitext(os.path.relpath(path, self.sourceDirectory))[0].replace(os.sep, "/")
+                if len(name.encode("utf-8")) > BundleFormat.maxNameLength:
+                    raise ValueError(f"Asset name '{name}' is longer than {BundleFormat.maxNameLength} bytes")
+                if name in assets:
+                    raise ValueError(f"'{name}' comes from both {assets[name]} and {path}")
+                assets[name] = path
+        return assets
+
+    def _AssetKey(self, path):
+        identity = f"{self.packerVersion}:{self.compress}:{self.HashFile(path)}"
+        return hashlib.sha256(identity.encode("utf-8")).hexdigest()[:32]
+
+    def _BlobPath(self, key):
+        return os.path.join(self.cacheDirectory, key + ".bin")
+
+    def Pack(self):
+        startTime = time.perf_counter()
+        state = self._LoadState()
+        assets = self.FindAssets()
+        keys = {name: self._AssetKey(path) for name, path in assets.items()}
+
+        stale = {name: key for name, key in keys.items()
+                 if key not in state["assets"] or not os.path.exists(self._BlobPath(key))}
+        if stale:
+            os.makedirs(self.cacheDirectory, exist_ok=True)
+            self._PrepareAll({name: assets[name] for name in stale}, stale)
+
+        bundleKey = hashlib.sha256(json.dumps(sorted(keys.items())).encode("utf-8")).hexdigest()
+        if not stale and state["bundle"] == bundleKey and os.path.exists(self.outputPath):
+            self.SaveState()
+            elapsed = time.perf_counter() - startTime
+            print_colored(f"{os.path.relpath(self.outputPath)} is up to date ({elapsed * 1000:.1f} ms)", 32)
+            return False
+
+        self._WriteBundle(keys)
+        state["bundle"] = bundleKey
+        # Forget assets that are no longer part of the bundle
+        for key in set(state["assets"]) - set(keys.values()):
+            del state["assets"][key]
+            if os.path.exists(self._BlobPath(key)):
+                os.remove(self._BlobPath(key))
+        state["files"] = {path: entry for path, entry in state["files"].items() if path in assets.values()}
+        self.SaveState()
+
+        elapsed = time.perf_counter() - startTime
+        rawSize = sum(state["assets"][key]["rawSize"] for key in keys.values())
+        storedSize = os.path.getsize(self.outputPath)
+        print_colored(f"Packed {len(keys)} assets ({len(stale)} rebuilt) into {os.path.relpath(self.outputPath)}: "
+                      f"{rawSize / 1024 / 1024:.1f} MB of pixels in {storedSize / 1024 / 1024:.1f} MB "
+                      f"({elapsed:.2f} s)", 32)
+        return True
+
+    def _PrepareAll(self, paths, keys):
+        state = self._LoadState()
+        if len(paths) == 1 or self.jobs == 1:
+            for name, path in paths.items():
+                state["assets"][keys[name]] = PrepareAsset(path, self._BlobPath(keys[name]), self.compress)
+                print(f"Decoded {name}")
+            return
+
+        # Decoding is pure Python and CPU bound, so it runs in processes
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=min(self.jobs, len(paths))) as pool:
+            futures = {name: pool.submit(PrepareAsset, path, self._BlobPath(keys[name]), self.compress)
+                       for name, path in paths.items()}
+            for name, future in futures.items():
+                state["assets"][keys[name]] = future.result()
+                print(f"Decoded {name}")
+
+    def _WriteBundle(self, keys):
+        state = self._LoadState()
+        # Sorted by the bytes of the name, so the game can binary search with strcmp
+        names = sorted(keys, key=lambda name: name.encode("utf-8"))
+        offset = BundleFormat.header.size + len(names) * BundleFormat.entry.size
+        entries = []
+        for name in names:
+            asset = state["assets"][keys[name]]
+            offset = -(-offset // BundleFormat.alignment) * BundleFormat.alignment
+            entries.append(BundleFormat.entry.pack(name.encode("utf-8"), asset["width"], asset["height"],
+                                                   asset["format"], asset["compression"],
+                                                   offset, asset["size"], asset["rawSize"]))
+            offset += asset["size"]
+
+        os.makedirs(os.path.dirname(self.outputPath), exist_ok=True)
+        # Written next to the old bundle and swapped in, so a running game keeps a complete mapping
+        tempPath = self.outputPath + ".tmp"
+        with open(tempPath, "wb") as bundle:
+            bundle.write(BundleFormat.header.pack(BundleFormat.magic, BundleFormat.version,
+                                                  BundleFormat.header.size, len(names), BundleFormat.entry.size))
+            bundle.write(b"".join(entries))
+            for name in names:
+                bundle.write(b"\x00" * (-bundle.tell() % BundleFormat.alignment))
+                with open(self._BlobPath(keys[name]), "rb") as blob:
+                    bundle.write(blob.read())
+        os.replace(tempPath, self.outputPath)
+
+
+# Function to read the table of a bundle; returns one dict per asset
+
+
+def ReadBundle(path):
+    import mmap
+
+    with open(path, "rb") as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if len(data) < BundleFormat.header.size:
+                raise ValueError(f"{path} is too short to be an asset bundle")
+            magic, version, headerSize, count, entrySize = BundleFormat.header.unpack_from(data, 0)
+            if (magic != BundleFormat.magic or version != BundleFormat.version
+                    or headerSize != BundleFormat.header.size or entrySize != BundleFormat.entry.size):
+                raise ValueError(f"{path} is not a version {BundleFormat.version} asset bundle")
+            if headerSize + count * entrySize > len(data):
+                raise ValueError(f"{path} is truncated")
+
+            assets = []
+            for index in range(count):
+                name, width, height, format, compression, offset, size, rawSize = \
+                    BundleFormat.entry.unpack_from(data, headerSize + index * entrySize)
+                if offset + size > len(data):
+                    raise ValueError(f"{path} is truncated")
+                assets.append({"name": name.rstrip(b"\x00").decode("utf-8"), "width": width, "height": height,
+                               "format": format, "compression": compression, "offset": offset,
+                               "size": size, "rawSize": rawSize})
+            return assets
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack the game's images into a memory-mappable bundle.")
+    parser.add_argument("--source", default=os.path.join(GameDirectory, "assets"),
+                        help="directory holding the images (default: game/assets)")
+    parser.add_argument("--output", default=os.path.join(GameDirectory, "build", "release", "assets.bundle"),
+                        help="bundle to write (default: game/build/release/assets.bundle)")
+    parser.add_argument("--compress", action="store_true",
+                        help="store pixels as DEFLATE where that saves space (smaller file, slower load)")
+    parser.add_argument("-j", "--jobs", type=int, help="processes decoding images in parallel")
+    parser.add_argument("--list", metavar="BUNDLE", help="print the table of an existing bundle and exit")
+    args = parser.parse_args()
+
+    if args.list:
+        try:
+            assets = ReadBundle(args.list)
+        except (OSError, ValueError) as e:
+            print_colored(str(e), 31)
+            sys.exit(1)
+        formats = {value: name for name, value in PixelFormats.items()}
+        print(f"{'name':<32}{'size':>12}{'format':>12}{'stored':>12}{'pixels':>12}")
+        for asset in assets:
+            stored = f"{asset['size'] / 1024:.0f} KB" + (" z" if asset["compression"] else "")
+            print(f"{asset['name']:<32}{asset['width']:>6}x{asset['height']:<5}"
+                  f"{formats.get(asset['format'], asset['format']):>12}{stored:>12}{asset['rawSize'] / 1024:>9.0f} KB")
+        sys.exit(0)
+
+    if not os.path.isdir(args.source):
+        print_colored(f"{args.source} does not exist; put the game's images there.", 31)
+        sys.exit(1)
+    try:
+        AssetPacker(args.source, args.output, args.compress, args.jobs).Pack()
+    except (OSError, ValueError) as e:
+        print_colored(f"Packing failed: {e}", 31)
+        sys.exit(1)
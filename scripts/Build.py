@@ -0,0 +1,440 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from Utils import print_colored
+
+GameDirectory = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "game"))
+
+# Incremental build driver for the game sources. Object files are kept in a
+# cache keyed by a hash of the compiler, the flags, the source and every header
+# the compiler's depfile reported for it, so rebuilding an unchanged tree only
+# costs a few stat calls. raylib.h and the standard headers the sources
+# include are compiled once into a precompiled header that every translation
+# unit reuses.
+
+
+class BuildTarget:
+    def __init__(self, name, sources, defines=None, libraries=None, packAssets=False):
+        self.name = name
+        self.sources = sources
+        self.defines = defines or []
+        # None means "link against raylib and its platform libraries"
+        self.libraries = libraries
+        # Whether the executable loads its textures from assets.bundle next to it
+        self.packAssets = packAssets
+
+    def GetOutputName(self):
+        if sys.platform.startswith("win"):
+            return self.name + ".exe"
+        return self.name
+
+
+class Builder:
+    # rlgl.h and raymath.h stay out: a TU that does not use them would be rebuilt when they change
+    headers = ["include/raylib.h"]
+    includePattern = re.compile(r'^\s*#\s*include\s*([<"])([^>"]+)[>"]', re.MULTILINE)
+
+    compileFlags = {
+        "debug": ["-std=c++17", "-O0", "-g"],
+        "release": ["-std=c++17", "-O2"],
+    }
+
+    def __init__(self, compiler, config="release", directory=GameDirectory, verbose=False, usePch=True):
+        self.compiler = compiler
+        self.config = config
+        self.directory = directory
+        self.verbose = verbose
+        self.usePch = usePch
+        # Output of failed commands is captured instead of streamed when building in parallel
+        self.captureOutput = False
+
+        self.buildDirectory = os.path.join(directory, "build", config)
+        self.objectDirectory = os.path.join(self.buildDirectory, "objects")
+        self.statePath = os.path.join(self.buildDirectory, "state.json")
+        self._state = None
+        # Guards the state so several targets can be built from worker threads
+        self._lock = threading.RLock()
+        self._pchLock = threading.Lock()
+
+    @staticmethod
+    def GetPlatformLibraries():
+        if sys.platform.startswith("win"):
+            return ["-lraylib", "-lopengl32", "-lgdi32", "-lwinmm"]
+        if sys.platform == "darwin":
+            return ["-lraylib", "-framework", "OpenGL", "-framework", "Cocoa",
+                    "-framework", "IOKit", "-framework", "CoreVideo"]
+        return ["-lraylib", "-lGL", "-lm", "-lpthread", "-ldl", "-lrt", "-lX11"]
+
+    # Hashes are remembered per file by size and mtime so unchanged files are not re-read
+
+    def _LoadState(self):
+        with self._lock:
+            if self._state is None:
+                try:
+                    with open(self.statePath, "r", encoding="utf-8") as stateFile:
+                        self._state = json.load(stateFile)
+                except (OSError, ValueError):
+                    self._state = {}
+                self._state.setdefault("files", {})
+                self._state.setdefault("links", {})
+                self._state.setdefault("deps", {})
+                self._state.setdefault("timings", {})
+            return self._state
+
+    def SaveState(self):
+        with self._lock:
+            if self._state is None:
+                return
+            os.makedirs(self.buildDirectory, exist_ok=True)
+            tempPath = self.statePath + ".tmp"
+            with open(tempPath, "w", encoding="utf-8") as stateFile:
+                json.dump(self._state, stateFile, indent=2)
+            os.replace(tempPath, self.statePath)
+
+    def HashFile(self, path):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        with self._lock:
+            files = self._LoadState()["files"]
+            entry = files.get(path)
+            if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+                return entry[2]
+
+            hasher = hashlib.sha256()
+            with open(path, "rb") as file:
+                for block in iter(lambda: file.read(1024 * 1024), b""):
+                    hasher.update(block)
+            files[path] = [stat.st_size, stat.st_mtime_ns, hasher.hexdigest()]
+            return files[path][2]
+
+    def _CompilerIdentity(self):
+        executable = shutil.which(self.compiler) or self.compiler
+        try:
+            stat = os.stat(executable)
+            return f"{os.path.realpath(executable)}:{stat.st_size}:{stat.st_mtime_ns}"
+        except OSError:
+            return executable
+
+    def _IsClang(self):
+        return "clang" in os.path.basename(self.compiler)
+
+    def GetCompileFlags(self, defines):
+        return (
+            self.compileFlags[self.config]
+            + ["-I" + os.path.join(self.directory, "include")]
+            + ["-D" + define for define in defines]
+        )
+
+    def FindStandardHeaders(self, sources):
+        # Standard library headers (<vector>, <cstdio>: no extension, no directory) that the
+        # sources include, directly or through the local headers they include
+        standardHeaders = set()
+        visited = set()
+        pending = [os.path.join(self.directory, source) for source in sources]
+        while pending:
+            path = os.path.normpath(pending.pop())
+            if path in visited or not os.path.isfile(path):
+                continue
+            visited.add(path)
+            with open(path, "r", encoding="utf-8", errors="replace") as sourceFile:
+                content = sourceFile.read()
+            for delimiter, name in self.includePattern.findall(content):
+                if delimiter == '"':
+                    pending.append(os.path.join(os.path.dirname(path), name))
+                elif "." not in name and "/" not in name:
+                    standardHeaders.add(name)
+        return sorted(standardHeaders)
+
+    def BuildPrecompiledHeader(self, defines, sources):
+        # Returns the flags that make a translation unit use the raylib PCH
+        if not self.usePch:
+            return []
+
+        standardHeaders = self.FindStandardHeaders(sources)
+        # Targets sharing a PCH must not race to generate it
+        with self._pchLock:
+            return self._BuildPrecompiledHeaderLocked(defines, standardHeaders)
+
+    def _BuildPrecompiledHeaderLocked(self, defines, standardHeaders):
+        flags = self.GetCompileFlags(defines)
+        hasher = hashlib.sha256()
+        hasher.update(self._CompilerIdentity().encode())
+        hasher.update(" ".join(flags).encode())
+        hasher.update(" ".join(standardHeaders).encode())
+        for header in self.headers:
+            hasher.update(self.HashFile(os.path.join(self.directory, header)).encode())
+
+        pchDirectory = os.path.join(self.buildDirectory, "pch", hasher.hexdigest()[:16])
+        headerPath = os.path.join(pchDirectory, "raylib_pch.h")
+        outputPath = headerPath + (".pch" if self._IsClang() else ".gch")
+        usageFlags = ["-include-pch", outputPath] if self._IsClang() else ["-include", headerPath]
+        if os.path.isfile(outputPath):
+            return usageFlags
+
+        os.makedirs(pchDirectory, exist_ok=True)
+        with open(headerPath, "w", encoding="utf-8") as headerFile:
+            for header in standardHeaders:
+                headerFile.write(f"#include <{header}>\n")
+            for header in self.headers:
+                headerFile.write(f'#include "{os.path.basename(header)}"\n')
+
+        startTime = time.perf_counter()
+        tempPath = outputPath + ".tmp"
+        self._Run([self.compiler] + flags + ["-x", "c++-header", headerPath, "-o", tempPath])
+        os.replace(tempPath, outputPath)
+        print_colored(f"Precompiled raylib headers ({time.perf_counter() - startTime:.2f} s)", 36)
+        return usageFlags
+
+    @staticmethod
+    def ParseDepfile(path):
+        # Make-style "target: dep dep \<newline> dep"; only "\ " and "\#" are escapes,
+        # so Windows paths keep their backslashes
+        with open(path, "r", encoding="utf-8") as depFile:
+            content = depFile.read().replace("\\\r\n", " ").replace("\\\n", " ")
+        _, _, dependencies = content.partition(": ")
+        names = []
+        current = ""
+        index = 0
+        while index < len(dependencies):
+            character = dependencies[index]
+            if character == "\\" and dependencies[index + 1:index + 2] in (" ", "#"):
+                current += dependencies[index + 1]
+                index += 1
+            elif character.isspace():
+                if current:
+                    names.append(current)
+                current = ""
+            else:
+                current += character
+            index += 1
+        if current:
+            names.append(current)
+        return names
+
+    def _ObjectKey(self, sourceKey, source, dependencies):
+        hasher = hashlib.sha256(sourceKey.encode())
+        hasher.update(self.HashFile(source).encode())
+        for dependency in dependencies:
+            hasher.update(dependency.encode())
+            hasher.update(self.HashFile(dependency).encode())
+        return hasher.hexdigest()
+
+    def Compile(self, source, defines, pchFlags=None):
+        source = os.path.join(self.directory, source)
+        pchFlags = pchFlags or []
+        flags = self.GetCompileFlags(defines) + pchFlags
+
+        # Header dependencies come from the depfile of the previous compile of this source
+        sourceKey = hashlib.sha256(
+            " ".join([self._CompilerIdentity(), source] + flags).encode()
+        ).hexdigest()
+        dependencies = self._LoadState()["deps"].get(sourceKey)
+        if dependencies is not None:
+            try:
+                objectPath = os.path.join(
+                    self.objectDirectory, self._ObjectKey(sourceKey, source, dependencies) + ".o"
+                )
+                if os.path.isfile(objectPath):
+                    return objectPath, False
+            except FileNotFoundError:
+                # A header was removed; the compile below records the new dependency list
+                pass
+
+        os.makedirs(self.objectDirectory, exist_ok=True)
+        # Compile to a temporary name so an interrupted compile never poisons the cache
+        tempPath = os.path.join(self.objectDirectory, sourceKey + ".o.tmp")
+        depfilePath = tempPath + ".d"
+        startTime = time.perf_counter()
+        self._Run([self.compiler] + flags + ["-MD", "-MF", depfilePath, "-c", source, "-o", tempPath])
+        self._RecordCompileTime(source, bool(pchFlags), time.perf_counter() - startTime)
+
+        dependencies = [
+            os.path.abspath(os.path.join(self.directory, dependency))
+            for dependency in self.ParseDepfile(depfilePath)
+            if os.path.abspath(os.path.join(self.directory, dependency)) != source
+        ]
+        os.remove(depfilePath)
+        with self._lock:
+            self._LoadState()["deps"][sourceKey] = dependencies
+
+        objectPath = os.path.join(self.objectDirectory, self._ObjectKey(sourceKey, source, dependencies) + ".o")
+        os.replace(tempPath, objectPath)
+        return objectPath, True
+
+    def _RecordCompileTime(self, source, withPch, elapsed):
+        with self._lock:
+            timings = self._LoadState()["timings"].setdefault(os.path.relpath(source, self.directory), {})
+            timings["pch" if withPch else "noPch"] = elapsed
+            other = timings.get("noPch" if withPch else "pch")
+
+        message = f"Compiled {os.path.relpath(source, self.directory)} in {elapsed:.2f} s"
+        if other is not None:
+            message += f" ({other:.2f} s {'without' if withPch else 'with'} the precompiled header)"
+        print_colored(message, 36)
+
+    def Link(self, target, objects):
+        outputPath = os.path.join(self.buildDirectory, target.GetOutputName())
+        libraries = self.GetPlatformLibraries() if target.libraries is None else target.libraries
+        command = [self.compiler] + objects + ["-o", outputPath]
+        if sys.platform.startswith("win"):
+            # The bundled raylib in game/lib is built for Windows only
+            command += ["-L" + os.path.join(self.directory, "lib")]
+        command += libraries
+
+        linkKey = hashlib.sha256(" ".join([self._CompilerIdentity()] + command).encode()).hexdigest()
+        links = self._LoadState()["links"]
+        if links.get(outputPath) == linkKey and os.path.isfile(outputPath):
+            return outputPath, False
+
+        self._Run(command)
+        with self._lock:
+            links[outputPath] = linkKey
+        return outputPath, True
+
+    def Build(self, target):
+        startTime = time.perf_counter()
+        objects = []
+        compiled = False
+        pchFlags = self.BuildPrecompiledHeader(target.defines, target.sources)
+        for source in target.sources:
+            objectPath, rebuilt = self.Compile(source, target.defines, pchFlags)
+            objects.append(objectPath)
+            compiled = compiled or rebuilt
+
+        outputPath, linked = self.Link(target, objects)
+        self.SaveState()
+
+        elapsed = time.perf_counter() - startTime
+        if compiled or linked:
+            print_colored(f"Built {os.path.relpath(outputPath)} ({elapsed:.2f} s)", 32)
+        else:
+            print_colored(f"{target.name} is up to date ({elapsed * 1000:.1f} ms)", 32)
+        return outputPath, compiled or linked
+
+    def ComparePrecompiledHeader(self, target):
+        # Compiles every source with and without the PCH, outside the object cache
+        usePch = self.usePch
+        self.usePch = True
+        pchFlags = self.BuildPrecompiledHeader(target.defines, target.sources)
+        self.usePch = usePch
+
+        flags = self.GetCompileFlags(target.defines)
+        print(f"{'Source':<24}{'without PCH':>14}{'with PCH':>12}{'speedup':>10}")
+        with tempfile.TemporaryDirectory() as tempDirectory:
+            objectPath = os.path.join(tempDirectory, "compare.o")
+            for source in target.sources:
+                timings = []
+                for extraFlags in ([], pchFlags):
+                    startTime = time.perf_counter()
+                    self._Run([self.compiler] + flags + extraFlags + ["-c", source, "-o", objectPath])
+                    timings.append(time.perf_counter() - startTime)
+                print(f"{source:<24}{timings[0]:>13.2f}s{timings[1]:>11.2f}s{timings[0] / timings[1]:>9.2f}x")
+
+    def _Run(self, command):
+        if self.verbose:
+            print(" ".join(command))
+        if self.captureOutput:
+            subprocess.run(command, check=True, cwd=self.directory,
+                           stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        else:
+            subprocess.run(command, check=True, cwd=self.directory)
+
+
+# Function to pick the compiler the Setup scripts validated, preferring an explicit CXX
+
+
+def FindCompiler():
+    if os.environ.get("CXX"):
+        return os.environ["CXX"]
+
+    from DetectionCache import DetectionCache
+    from SetupBuildTools import BuildToolsConfiguration
+    from SetupClang import ClangConfiguration
+    from ToolProbe import ToolProbe
+    from Versions import CheckAll
+
+    # Cached probes make this free once Setup.py has run
+    checks = CheckAll(ToolProbe.RunAll({**ClangConfiguration.Probes(), **BuildToolsConfiguration.Probes()}))
+    isClangValid = ClangConfiguration.CheckClangInstallation(checks["clang"])
+    BuildToolsConfiguration.CheckCMakeInstallation(checks["cmake"])
+    BuildToolsConfiguration.CheckNinjaInstallation(checks["ninja"])
+    DetectionCache.Save()
+
+    # A clang package does not always bring clang++ along
+    if isClangValid and shutil.which("clang++"):
+        return "clang++"
+    if isClangValid:
+        print_colored("Clang is installed, but clang++ is not on PATH.", 33)
+    for fallback in ("clang++", "g++"):
+        if shutil.which(fallback):
+            print_colored(f"Falling back to {fallback}; run Setup.py to install the supported Clang.", 33)
+            return fallback
+    raise FileNotFoundError("No C++ compiler found. Run Setup.py first.")
+
+
+GameTarget = BuildTarget("dino_game", ["dino.cpp"], packAssets=True)
+# Simulation-only build of the same source; it needs neither a window nor raylib
+HeadlessTarget = BuildTarget("dino_headless", ["dino.cpp"], defines=["DINO_HEADLESS"], libraries=[])
+ObstacleBenchTarget = BuildTarget("obstacle_bench", ["obstacle_bench.cpp"], libraries=[])
+
+Targets = {target.name: target for target in [GameTarget, HeadlessTarget, ObstacleBenchTarget]}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the Dino game.")
+    parser.add_argument("--config", choices=sorted(Builder.compileFlags), default="release")
+    parser.add_argument("--compiler", help="C++ compiler to use instead of the validated Clang")
+    parser.add_argument("--clean", action="store_true", help="remove the build directory first")
+    parser.add_argument("--verbose", action="store_true", help="print every compiler command")
+    parser.add_argument("--no-pch", action="store_true", help="do not precompile the raylib headers")
+    parser.add_argument("--target", choices=sorted(Targets), default=GameTarget.name)
+    parser.add_argument("--headless", action="store_true", help="build the windowless simulation binary")
+    parser.add_argument("--frame-profile", action="store_true",
+                        help="record per-frame timings to dino_frames.bin (see FrameReport.py)")
+    parser.add_argument("--compare-pch", action="store_true",
+                        help="time a full compile with and without the precompiled header")
+    args = parser.parse_args()
+
+    try:
+        compiler = args.compiler or FindCompiler()
+    except FileNotFoundError as e:
+        print_colored(str(e), 31)
+        sys.exit(1)
+    builder = Builder(compiler, args.config, verbose=args.verbose, usePch=not args.no_pch)
+    if args.clean:
+        shutil.rmtree(builder.buildDirectory, ignore_errors=True)
+
+    target = HeadlessTarget if args.headless else Targets[args.target]
+    if args.frame_profile:
+        target = BuildTarget(target.name + "_profiled", target.sources,
+                             target.defines + ["DINO_PROFILE"], target.libraries, target.packAssets)
+    try:
+        if args.compare_pch:
+            builder.ComparePrecompiledHeader(target)
+        else:
+            builder.Build(target)
+    except subprocess.CalledProcessError as e:
+        print_colored(f"Build failed: {' '.join(e.cmd)}", 31)
+        sys.exit(1)
+    except OSError as e:
+        # The compiler itself could not be started
+        print_colored(f"Build failed: cannot run {e.filename or builder.compiler}: {e.strerror or e}", 31)
+        sys.exit(1)
+
+    assetsDirectory = os.path.join(GameDirectory, "assets")
+    if target.packAssets and not args.compare_pch and os.path.isdir(assetsDirectory):
+        from AssetPack import AssetPacker
+
+        try:
+            AssetPacker(assetsDirectory, os.path.join(builder.buildDirectory, "assets.bundle")).Pack()
+        except (OSError, ValueError) as e:
+            print_colored(f"Packing the assets failed: {e}", 31)
+            sys.exit(1)
@@ -0,0 +1,129 @@
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from Utils import print_colored
+from Build import Builder, BuildTarget, FindCompiler, GameDirectory, Targets
+
+# Builds every game-like source (a .cpp file with a main function) as its own
+# target, spreading the targets across all cores. Only the shared precompiled
+# header is generated serially; compiles and links of different targets run
+# side by side.
+
+
+class BuildScheduler:
+    excludedDirectories = {"build", "include", "lib"}
+    mainPattern = re.compile(rb"\bint\s+main\s*\(")
+
+    def __init__(self, builder, jobs=None):
+        self.builder = builder
+        self.jobs = jobs or os.cpu_count() or 1
+        self.builder.captureOutput = self.jobs > 1
+
+    @classmethod
+    def DiscoverTargets(cls, directory=GameDirectory):
+        # Sources with a target defined in Build.py (such as the raylib-free benchmark) keep its settings
+        knownTargets = {}
+        if os.path.abspath(directory) == GameDirectory:
+            knownTargets = {target.sources[0]: target for target in Targets.values() if not target.defines}
+
+        targets = []
+        for root, directories, files in os.walk(directory):
+            directories[:] = sorted(d for d in directories if d not in cls.excludedDirectories)
+            for fileName in sorted(files):
+                if not fileName.endswith(".cpp"):
+                    continue
+                path = os.path.join(root, fileName)
+                with open(path, "rb") as sourceFile:
+                    if not cls.mainPattern.search(sourceFile.read()):
+                        continue
+                source = os.path.relpath(path, directory)
+                if source in knownTargets:
+                    targets.append(knownTargets[source])
+                    continue
+                name = os.path.splitext(source)[0].replace(os.sep, "_").replace("/", "_")
+                targets.append(BuildTarget(name, [source]))
+        return targets
+
+    def _BuildTarget(self, target):
+        startTime = time.perf_counter()
+        try:
+            _, rebuilt = self.builder.Build(target)
+            status = "built" if rebuilt else "up to date"
+            output = None
+        except subprocess.CalledProcessError as e:
+            status = "failed"
+            output = e.stdout or f"'{' '.join(e.cmd)}' exited with code {e.returncode}"
+        except OSError as e:
+            status = "failed"
+            output = f"Cannot run {e.filename or self.builder.compiler}: {e.strerror or e}"
+        return target, status, time.perf_counter() - startTime, output
+
+    def Run(self, targets):
+        startTime = time.perf_counter()
+
+        # Generate each distinct precompiled header once before the workers need it;
+        # targets that share one find it already built
+        try:
+            for target in targets:
+                self.builder.BuildPrecompiledHeader(target.defines, target.sources)
+        except subprocess.CalledProcessError as e:
+            print_colored(f"Precompiling the raylib headers failed: {' '.join(e.cmd)}", 31)
+            if e.stdout:
+                print(e.stdout.rstrip())
+            return False
+        except OSError as e:
+            print_colored(f"Precompiling the raylib headers failed: cannot run {e.filename or self.builder.compiler}: "
+                          f"{e.strerror or e}", 31)
+            return False
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            results = list(pool.map(self._BuildTarget, targets))
+        self.builder.SaveState()
+
+        self.PrintSummary(results, time.perf_counter() - startTime)
+        return all(status != "failed" for _, status, _, _ in results)
+
+    def PrintSummary(self, results, elapsed):
+        for target, status, _, output in results:
+            if status == "failed":
+                print_colored(f"\n{target.name} failed:", 31)
+                print(output.rstrip() if output else "")
+
+        width = max([len("Target")] + [len(target.name) for target, _, _, _ in results])
+        print(f"\n{'Target':<{width}}  {'Status':<10}  {'Time':>8}")
+        for target, status, targetElapsed, _ in results:
+            color = {"built": 32, "up to date": 32, "failed": 31}[status]
+            print_colored(f"{target.name:<{width}}  {status:<10}  {targetElapsed:>7.2f}s", color)
+
+        failed = sum(1 for _, status, _, _ in results if status == "failed")
+        print(f"{len(results)} targets, {failed} failed, {elapsed:.2f} s with {self.jobs} jobs")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build every game source in parallel.")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="number of parallel jobs (default: all cores)")
+    parser.add_argument("--config", choices=sorted(Builder.compileFlags), default="release")
+    parser.add_argument("--compiler", help="C++ compiler to use instead of the validated Clang")
+    parser.add_argument("--no-pch", action="store_true", help="do not precompile the raylib headers")
+    parser.add_argument("--directory", default=GameDirectory, help="directory to search for sources")
+    args = parser.parse_args()
+
+    directory = os.path.abspath(args.directory)
+    try:
+        compiler = args.compiler or FindCompiler()
+    except FileNotFoundError as e:
+        print_colored(str(e), 31)
+        sys.exit(1)
+    builder = Builder(compiler, args.config, directory=directory, usePch=not args.no_pch)
+    targets = BuildScheduler.DiscoverTargets(directory)
+    if not targets:
+        print_colored(f"No sources with a main function found in {directory}.", 33)
+        sys.exit(1)
+
+    if not BuildScheduler(builder, args.jobs).Run(targets):
+        sys.exit(1)
@@ -0,0 +1,135 @@
+import json
+import os
+import shutil
+
+from Utils import GetCacheDirectory
+
+# On-disk cache of toolchain probe results. Entries are keyed by the resolved
+# binary path and the probe arguments, and are only trusted while the binary's
+# size and mtime still match what was recorded.
+
+
+class DetectionCache:
+    enabled = True
+    fileName = "toolchain.json"
+
+    _entries = None
+    _dirty = False
+
+    @classmethod
+    def GetPath(cls):
+        return os.path.join(GetCacheDirectory(), cls.fileName)
+
+    @classmethod
+    def Load(cls):
+        if cls._entries is not None:
+            return cls._entries
+
+        cls._entries = {}
+        try:
+            with open(cls.GetPath(), "r", encoding="utf-8") as cacheFile:
+                data = json.load(cacheFile)
+            if isinstance(data, dict):
+                cls._entries = data.get("entries", {})
+        except (OSError, ValueError):
+            pass
+        return cls._entries
+
+    @classmethod
+    def Save(cls):
+        if not cls._dirty:
+            return
+
+        entries = cls.Load()
+        # Drop entries whose binary has changed or disappeared since it was cached
+        for key in list(entries):
+            entry = entries[key]
+            if cls._Fingerprint(entry.get("path")) != (entry.get("size"), entry.get("mtime")):
+                del entries[key]
+
+        path = cls.GetPath()
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tempPath = path + ".tmp"
+            with open(tempPath, "w", encoding="utf-8") as cacheFile:
+                json.dump({"entries": entries}, cacheFile, indent=2)
+            os.replace(tempPath, path)
+            cls._dirty = False
+        except OSError as e:
+            print(f"Failed to write toolchain cache: {e}")
+
+    @staticmethod
+    def _Fingerprint(path):
+        try:
+            stat = os.stat(path)
+        except (OSError, TypeError):
+            return None
+        return (stat.st_size, stat.st_mtime_ns)
+
+    @staticmethod
+    def _Resolve(command):
+        executable = shutil.which(command[0])
+        if executable is None:
+            return None
+        return os.path.realpath(executable)
+
+    @classmethod
+    def _Key(cls, command):
+        path = cls._Resolve(command)
+        if path is None:
+            return None, None
+        return path, " ".join([path] + list(command[1:]))
+
+    @classmethod
+    def Lookup(cls, command):
+        if not cls.enabled:
+            return None
+
+        path, key = cls._Key(command)
+        if key is None:
+            return None
+
+        entries = cls.Load()
+        entry = entries.get(key)
+        if entry is None:
+            return None
+
+        if cls._Fingerprint(path) != (entry.get("size"), entry.get("mtime")):
+            # The binary was replaced, so the cached banner no longer applies
+            del entries[key]
+            cls._dirty = True
+            return None
+        return entry
+
+    @classmethod
+    def Store(cls, command, output):
+        path, key = cls._Key(command)
+        if key is None:
+            return None
+
+        fingerprint = cls._Fingerprint(path)
+        if fingerprint is None:
+            return None
+
+        entry = {
+            "path": path,
+            "size": fingerprint[0],
+            "mtime": fingerprint[1],
+            "output": output,
+        }
+        cls.Load()[key] = entry
+        cls._dirty = True
+        return entry
+
+    @classmethod
+    def Remember(cls, command, **fields):
+        # Attach parsed details (version, install dir, verdict) to a cached probe
+        _, key = cls._Key(command)
+        entry = cls.Load().get(key) if key is not None else None
+        if entry is None:
+            return
+
+        for name, value in fields.items():
+            if entry.get(name) != value:
+                entry[name] = value
+                cls._dirty = True
@@ -0,0 +1,547 @@
+import contextlib
+import hashlib
+import http.client
+import json
+import os
+import re
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# Downloads a single URL into a preallocated file using parallel HTTP Range
+# requests. Finished chunks are recorded in a sidecar manifest so an
+# interrupted download resumes where it stopped. Servers that do not support
+# ranges are read as a single stream instead.
+#
+# The SHA-256 is computed over the bytes as they arrive, in file order, so
+# verifying an expected digest costs no extra pass over the file.
+#
+# When the same file is offered by several mirrors, RankMirrors probes all of
+# them at once and the chunks are fetched from the fastest. A chunk whose
+# mirror stalls, or runs far below what another mirror has shown it can do,
+# continues from its last byte on the next best mirror. Requests go through
+# a pool of keep-alive connections, so the chunks of a download (and the
+# probes before it) share a handful of connections instead of opening one each.
+
+
+class ChecksumMismatchError(ValueError):
+    pass
+
+
+class HTTPStatusError(IOError):
+    def __init__(self, status, reason, url):
+        super().__init__(f"HTTP Error {status}: {reason} ({url})")
+        self.status = status
+
+
+class _SlowMirror(Exception):
+    pass
+
+
+class ConnectionPool:
+    maxRedirects = 5
+    maxIdle = 16
+    userAgent = "Mozilla/5.0"
+
+    def __init__(self):
+        self._idle = {}
+        self._lock = threading.Lock()
+        # Permanent redirects are resolved once; later requests go to the final location directly
+        self._redirects = {}
+
+    @staticmethod
+    def _Proxy(scheme, host):
+        # The same proxy settings urllib uses (http_proxy, https_proxy, no_proxy)
+        proxy = urllib.request.getproxies().get(scheme)
+        if not proxy or urllib.request.proxy_bypass(host):
+            return None
+        proxy = urllib.parse.urlsplit(proxy if "://" in proxy else "http://" + proxy)
+        return proxy.hostname, proxy.port or 80
+
+    def _Connect(self, key, timeout):
+        scheme, host, port = key
+        proxy = self._Proxy(scheme, host)
+        if scheme == "https":
+            import ssl
+
+            connection = http.client.HTTPSConnection(*(proxy or (host, port)), timeout=timeout,
+                                                     context=ssl.create_default_context())
+            if proxy:
+                connection.set_tunnel(host, port)
+        else:
+            connection = http.client.HTTPConnection(*(proxy or (host, port)), timeout=timeout)
+        # Plain HTTP through a proxy names the whole URL in the request line
+        connection.absoluteTarget = bool(proxy) and scheme == "http"
+        return connection
+
+    def _Acquire(self, key, timeout):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                connection = idle.pop()
+                connection.timeout = timeout
+                if connection.sock is not None:
+                    connection.sock.settimeout(timeout)
+                return connection, True
+        return self._Connect(key, timeout), False
+
+    def _Release(self, key, connection, response):
+        # Only a connection whose response was read to the end can carry the next request
+        if response.isclosed() and not response.will_close:
+            with self._lock:
+                idle = self._idle.setdefault(key, [])
+                if len(idle) < self.maxIdle:
+                    idle.append(connection)
+                    return
+        connection.close()
+
+    def _Send(self, url, headers, timeout):
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise IOError(f"Unsupported URL scheme in {url}")
+        key = (parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == "https" else 80))
+        target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        headers = {"User-Agent": self.userAgent, **headers}
+
+        # A kept-alive connection may have been closed by the server in the meantime; retry those once
+        for attempt in range(2):
+            connection, reused = self._Acquire(key, timeout)
+            try:
+                connection.request("GET", url if connection.absoluteTarget else target, headers=headers)
+                return key, connection, connection.getresponse()
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                if not reused or attempt == 1:
+                    raise
+
+    # Function to GET a URL, following redirects; the connection goes back to the pool on exit.
+    # Only permanent redirects (301, 308) are remembered: a 302 to a signed URL, as GitHub
+    # sends for release assets, expires long before a large download ends. A remembered
+    # target that answers with a 4xx is dropped and the original URL resolved again.
+    @contextlib.contextmanager
+    def Open(self, url, headers=None, timeout=30):
+        original = url
+        with self._lock:
+            cached = self._redirects.get(original)
+        url = cached or original
+        permanent = True
+        hops = 0
+        while True:
+            key, connection, response = self._Send(url, headers or {}, timeout)
+            if response.status in (301, 302, 303, 307, 308) and response.headers.get("Location"):
+                response.read()
+                self._Release(key, connection, response)
+                hops += 1
+                if hops > self.maxRedirects:
+                    raise IOError(f"Too many redirects for {original}")
+                permanent = permanent and response.status in (301, 308)
+                url = urllib.parse.urljoin(url, response.headers["Location"])
+                continue
+            if response.status >= 400:
+                response.read()
+                self._Release(key, connection, response)
+                if cached is not None and response.status < 500:
+                    with self._lock:
+                        self._redirects.pop(original, None)
+                    url, cached, permanent, hops = original, None, True, 0
+                    continue
+                raise HTTPStatusError(response.status, response.reason, url)
+            break
+
+        if url != original and cached is None and permanent:
+            with self._lock:
+                self._redirects[original] = url
+        response.url = url
+        try:
+            yield response
+        finally:
+            self._Release(key, connection, response)
+
+    def Close(self):
+        with self._lock:
+            for connections in self._idle.values():
+                for connection in connections:
+                    connection.close()
+            self._idle.clear()
+
+
+# One pool for every download in the process
+SharedPool = ConnectionPool()
+
+
+class Mirror:
+    # Weight of the newest throughput measurement
+    smoothing = 0.5
+
+    def __init__(self, url, sha256=None):
+        self.url = url
+        self.sha256 = sha256.lower() if sha256 else None
+        self.latency = None
+        self.throughput = None
+        self.size = None
+        self.ranges = False
+        self.failures = 0
+        self.error = None
+
+    def Observe(self, count, seconds):
+        if seconds <= 0:
+            return
+        rate = count / seconds
+        self.throughput = rate if self.throughput is None else self.smoothing * rate + (1 - self.smoothing) * self.throughput
+
+    def Demote(self, count, seconds):
+        # What a stalled or slow request just delivered replaces the estimate outright
+        self.throughput = count / seconds if seconds > 0 else 0.0
+
+    def Estimate(self, size=None):
+        # Seconds this mirror is expected to need for the whole file
+        if self.error or self.throughput is None:
+            return float("inf")
+        return (self.latency or 0.0) + (size or self.size or 8 * 1024 * 1024) / max(self.throughput, 1.0)
+
+    def Describe(self):
+        if self.error:
+            return f"{self.url} ({self.error})"
+        return f"{self.url} ({self.latency * 1000:.0f} ms, {self.throughput / 1024 / 1024:.2f} MB/s)"
+
+
+# Function to probe every mirror at once with a small range request and sort them, fastest first
+
+
+def RankMirrors(mirrors, probeBytes=64 * 1024, timeout=5, pool=None):
+    pool = pool or SharedPool
+
+    def Probe(mirror):
+        startTime = time.perf_counter()
+        try:
+            with pool.Open(mirror.url, {"Range": f"bytes=0-{probeBytes - 1}"}, timeout) as response:
+                firstByte = time.perf_counter()
+                mirror.latency = firstByte - startTime
+                mirror.ranges = response.status == 206
+                mirror.size = ChunkedDownload._ParseTotalSize(response)
+                if mirror.size is None:
+                    length = response.headers.get("Content-Length")
+                    mirror.size = int(length) if length and length.isdigit() else None
+                received = 0
+                while received < probeBytes:
+                    block = response.read(min(64 * 1024, probeBytes - received))
+                    if not block:
+                        break
+                    received += len(block)
+                mirror.Observe(received, max(time.perf_counter() - firstByte, 1e-4))
+        except HTTPStatusError as e:
+            if e.status != 416:
+                mirror.error = str(e)
+                return
+            # An empty file has no bytes to probe; it costs the same from every mirror
+            mirror.latency = time.perf_counter() - startTime
+            mirror.ranges = True
+            mirror.size = 0
+            mirror.Observe(0, mirror.latency)
+        except Exception as e:
+            mirror.error = str(e) or type(e).__name__
+
+    executor = ThreadPoolExecutor(max_workers=len(mirrors))
+    futures = [executor.submit(Probe, mirror) for mirror in mirrors]
+    # A mirror that does not answer in time is ranked last; its probe is not waited for
+    _, late = wait(futures, timeout=timeout)
+    executor.shutdown(wait=False)
+    for future, mirror in zip(futures, mirrors):
+        if future in late:
+            mirror.error = "probe timed out"
+
+    # sorted() is stable, so mirrors that failed keep the order they were given in
+    return sorted(mirrors, key=lambda mirror: mirror.Estimate())
+
+
+# Function to split ranked mirrors into groups serving the same file; chunks are only ever mixed within a group
+
+
+def MirrorGroups(mirrors):
+    groups = {}
+    for mirror in mirrors:
+        key = (mirror.size, mirror.sha256) if mirror.size is not None and not mirror.error else (None, mirror.url)
+        groups.setdefault(key, []).append(mirror)
+    return list(groups.values())
+
+
+class ChunkedDownload:
+    chunkSize = 4 * 1024 * 1024
+    maxWorkers = 4
+    blockSize = 64 * 1024
+    retries = 3
+    # Seconds without a single byte before a request counts as stalled; shorter
+    # when another mirror can take over
+    timeout = 30
+    stallTimeout = 5
+    # A chunk moves to another mirror once it has run this long at less than
+    # slowFactor times the throughput another mirror has shown
+    graceSeconds = 1.0
+    slowFactor = 0.25
+
+    def __init__(self, url, filepath, chunkSize=None, maxWorkers=None, reporthook=None, sha256=None,
+                 mirrors=None, pool=None):
+        self.url = url
+        self.filepath = os.path.abspath(filepath)
+        self.manifestPath = self.filepath + ".parts"
+        self.chunkSize = chunkSize or ChunkedDownload.chunkSize
+        self.maxWorkers = maxWorkers or ChunkedDownload.maxWorkers
+        self.reporthook = reporthook
+        # Mirrors serving this exact file, best first; the URL itself when there are none
+        self.mirrors = mirrors or [Mirror(url, sha256)]
+        self.pool = pool or SharedPool
+
+        self.expectedSha256 = sha256.lower() if sha256 else None
+        self.hasher = hashlib.sha256()
+        self.sha256 = None
+
+        self.totalSize = None
+        self.downloaded = 0
+        self._lock = threading.Lock()
+
+        # Chunks finish out of order; completed chunk data waits here until every
+        # chunk before it has been fed to the hasher
+        self._hashCondition = threading.Condition(self._lock)
+        self._hashFrontier = 0
+        self._hashPending = {}
+        self._aborted = False
+
+    def Run(self):
+        os.makedirs(os.path.dirname(self.filepath), exist_ok=True)
+
+        best = self.mirrors[0]
+        if best.ranges and best.size is not None:
+            # RankMirrors already asked
+            self.totalSize = best.size
+        else:
+            # Ask for the first byte only; a 206 tells us the server supports ranges
+            # and the Content-Range header tells us the full size
+            try:
+                with self.pool.Open(best.url, {"Range": "bytes=0-0"}, self.timeout) as response:
+                    self.totalSize = self._ParseTotalSize(response)
+                    if response.status != 206 or self.totalSize is None:
+                        self._Stream(response)
+                        self._Verify()
+                        return
+                    response.read()
+            except HTTPStatusError as e:
+                # An empty file has no first byte: "416 Range Not Satisfiable"
+                if e.status != 416:
+                    raise
+                self.totalSize = 0
+
+        self._RunChunks()
+        self._Verify()
+
+    def _Verify(self):
+        digest = self.hasher.hexdigest()
+        if self.expectedSha256 is None:
+            self.sha256 = digest
+            return
+
+        if digest != self.expectedSha256:
+            os.remove(self.filepath)
+            raise ChecksumMismatchError(
+                f"SHA-256 mismatch for {self.url}: expected {self.expectedSha256}, got {digest}"
+            )
+        self.sha256 = digest
+
+    @staticmethod
+    def _ParseTotalSize(response):
+        match = re.match(r"bytes\s+\d+-\d+/(\d+)", response.headers.get("Content-Range", ""))
+        if match:
+            return int(match.group(1))
+        return None
+
+    def _Report(self, count):
+        with self._lock:
+            self.downloaded += count
+            downloaded = self.downloaded
+        if self.reporthook:
+            self.reporthook(downloaded, self.totalSize)
+
+    def _Stream(self, response):
+        # Fallback for servers without range support: the response to the probe
+        # already carries the whole body, so read it straight into the file
+        if self.totalSize is None:
+            length = response.headers.get("Content-Length")
+            self.totalSize = int(length) if length and length.isdigit() else None
+
+        self._RemoveManifest()
+        with self._CreateFile() as file:
+            while True:
+                block = response.read(self.blockSize)
+                if not block:
+                    break
+                file.write(block)
+                self.hasher.update(block)
+                self._Report(len(block))
+
+    def _Chunks(self):
+        return [
+            (index, start, min(start + self.chunkSize, self.totalSize) - 1)
+            for index, start in enumerate(range(0, self.totalSize, self.chunkSize))
+        ]
+
+    def _LoadManifest(self):
+        try:
+            with open(self.manifestPath, "r", encoding="utf-8") as manifestFile:
+                manifest = json.load(manifestFile)
+        except (OSError, ValueError):
+            return set()
+
+        # Only resume a download of the same file and chunk layout. The same URL is the
+        # same file; another mirror only when both name the same pinned digest
+        sameFile = manifest.get("url") == self.url or (
+            self.expectedSha256 is not None and manifest.get("sha256") == self.expectedSha256
+        )
+        if (
+            not sameFile
+            or manifest.get("size") != self.totalSize
+            or manifest.get("chunkSize") != self.chunkSize
+            or os.path.getsize(self.filepath) != self.totalSize
+            # A file linked out of the artifact cache is never a partial download
+            or os.stat(self.filepath).st_nlink > 1
+        ):
+            return set()
+        return set(manifest.get("done", []))
+
+    def _SaveManifest(self, done):
+        tempPath = self.manifestPath + ".tmp"
+        with open(tempPath, "w", encoding="utf-8") as manifestFile:
+            json.dump(
+                {"url": self.url, "sha256": self.expectedSha256, "size": self.totalSize, "chunkSize": self.chunkSize,
+                 "done": sorted(done)},
+                manifestFile,
+            )
+        os.replace(tempPath, self.manifestPath)
+
+    def _CreateFile(self):
+        # A file materialized from the artifact cache shares its inode with the cached
+        # copy, so it is unlinked instead of truncated in place
+        if os.path.lexists(self.filepath):
+            os.remove(self.filepath)
+        return open(self.filepath, "wb")
+
+    def _RemoveManifest(self):
+        if os.path.exists(self.manifestPath):
+            os.remove(self.manifestPath)
+
+    def _RunChunks(self):
+        done = self._LoadManifest() if os.path.exists(self.filepath) else set()
+        if not done:
+            # Preallocate the target so every worker can write at its own offset
+            with self._CreateFile() as file:
+                file.truncate(self.totalSize)
+            self._SaveManifest(done)
+
+        chunks = self._Chunks()
+        pending = [chunk for chunk in chunks if chunk[0] not in done]
+        self._Report(sum(end - start + 1 for index, start, end in chunks if index in done))
+
+        # Bound how far workers may run ahead of the hash frontier so the chunk
+        # data held in memory for hashing stays small
+        window = self.maxWorkers * 2
+
+        def Fetch(chunk):
+            with self._hashCondition:
+                self._hashCondition.wait_for(
+                    lambda: self._aborted or chunk[0] < self._hashFrontier + window
+                )
+                if self._aborted:
+                    return
+            try:
+                data = self._FetchChunk(*chunk)
+            except Exception:
+                # Wake workers waiting on the hash frontier, which will never advance now
+                with self._hashCondition:
+                    self._aborted = True
+                    self._hashCondition.notify_all()
+                raise
+            with self._lock:
+                done.add(chunk[0])
+                self._SaveManifest(done)
+                self._hashPending[chunk[0]] = data
+                self._AdvanceHash(chunks, done)
+
+        with self._lock:
+            self._AdvanceHash(chunks, done)
+
+        with ThreadPoolExecutor(max_workers=self.maxWorkers) as pool:
+            # Consume every result so the first failure is raised here
+            for _ in pool.map(Fetch, pending):
+                pass
+
+        self._RemoveManifest()
+
+    def _AdvanceHash(self, chunks, done):
+        # Called with the lock held
+        while self._hashFrontier < len(chunks) and self._hashFrontier in done:
+            index, start, end = chunks[self._hashFrontier]
+            data = self._hashPending.pop(index, None)
+            if data is None:
+                # Finished by an earlier, interrupted run; only resumed chunks are read back
+                with open(self.filepath, "rb") as file:
+                    file.seek(start)
+                    data = file.read(end - start + 1)
+            self.hasher.update(data)
+            self._hashFrontier += 1
+        self._hashCondition.notify_all()
+
+    def _PickMirror(self):
+        usable = [mirror for mirror in self.mirrors if mirror.failures < self.retries] or self.mirrors
+        return min(usable, key=lambda mirror: mirror.Estimate(self.chunkSize))
+
+    def _Alternatives(self, mirror):
+        return [other for other in self.mirrors
+                if other is not mirror and other.failures < self.retries and not other.error]
+
+    def _ShouldSwitch(self, mirror, rate):
+        alternatives = [other.throughput or 0.0 for other in self._Alternatives(mirror)]
+        return bool(alternatives) and rate < self.slowFactor * max(alternatives)
+
+    def _FetchChunk(self, index, start, end):
+        size = end - start + 1
+        written = 0
+        blocks = []
+        failures = 0
+        while written < size:
+            mirror = self._PickMirror()
+            timeout = self.stallTimeout if self._Alternatives(mirror) else self.timeout
+            requestTime = time.monotonic()
+            received = 0
+            try:
+                with self.pool.Open(mirror.url, {"Range": f"bytes={start + written}-{end}"}, timeout) as response:
+                    if response.status != 206:
+                        raise IOError(f"Server ignored range request for chunk {index}")
+                    with open(self.filepath, "r+b") as file:
+                        file.seek(start + written)
+                        while True:
+                            block = response.read(self.blockSize)
+                            if not block:
+                                break
+                            file.write(block)
+                            blocks.append(block)
+                            written += len(block)
+                            received += len(block)
+                            self._Report(len(block))
+                            elapsed = time.monotonic() - requestTime
+                            if elapsed > self.graceSeconds and self._ShouldSwitch(mirror, received / elapsed):
+                                raise _SlowMirror()
+                mirror.Observe(received, time.monotonic() - requestTime)
+                if written != size:
+                    raise IOError(f"Chunk {index} ended after {written} of {size} bytes")
+            except _SlowMirror:
+                # Keep what arrived and continue the chunk elsewhere
+                mirror.Demote(received, time.monotonic() - requestTime)
+            except Exception:
+                mirror.failures += 1
+                mirror.Demote(received, max(time.monotonic() - requestTime, timeout))
+                failures += 1
+                if failures >= self.retries * len(self.mirrors):
+                    # Roll back the progress of this chunk; the manifest does not know about it
+                    self._Report(-written)
+                    raise
+        return b"".join(blocks)
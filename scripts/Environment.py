@@ -0,0 +1,196 @@
+import ntpath
+import os
+import posixpath
+import sys
+
+from Utils import print_colored, Tracer
+
+# Persistent PATH changes. Entries are collected first and applied in one
+# read-modify-write: the stored PATH is read once, every entry is compared
+# against it (and against the other new entries) by normalized path, and the
+# result is written once and announced once. Where PATH lives depends on the
+# backend: the user or system 'Path' registry value on Windows, a shell
+# profile fragment on other systems, or a string in memory for checking the
+# logic on any machine.
+
+
+class MemoryBackend:
+    def __init__(self, value="", windows=False):
+        self.value = value
+        self.pathModule = ntpath if windows else posixpath
+        self.writes = 0
+        self.broadcasts = 0
+
+    def Read(self):
+        return self.value
+
+    def Write(self, value):
+        self.value = value
+        self.writes += 1
+
+    def Broadcast(self):
+        self.broadcasts += 1
+
+    def Describe(self):
+        return "memory"
+
+
+class RegistryBackend:
+    pathModule = ntpath
+    # Broadcast parameters for WM_SETTINGCHANGE
+    broadcastTimeout = 5000
+
+    def __init__(self, user=True):
+        self.user = user
+        self.valueType = None
+
+    def _Open(self, access):
+        import winreg
+
+        if self.user:
+            return winreg.OpenKey(winreg.HKEY_CURRENT_USER, r"Environment", 0, access)
+        return winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE,
+                              r"SYSTEM\CurrentControlSet\Control\Session Manager\Environment", 0, access)
+
+    def Read(self):
+        import winreg
+
+        with self._Open(winreg.KEY_QUERY_VALUE) as key:
+            try:
+                value, self.valueType = winreg.QueryValueEx(key, "Path")
+            except FileNotFoundError:
+                # A fresh user has no Path of their own yet
+                value, self.valueType = "", winreg.REG_EXPAND_SZ
+        return value
+
+    def Write(self, value):
+        import winreg
+
+        # Keep %VARIABLES% working; never downgrade an expandable value
+        valueType = winreg.REG_EXPAND_SZ if "%" in value or self.valueType is None else self.valueType
+        with self._Open(winreg.KEY_SET_VALUE) as key:
+            winreg.SetValueEx(key, "Path", 0, valueType, value)
+
+    def Broadcast(self):
+        import ctypes
+
+        # Tell Explorer (and with it every shell started from now on) to reload the environment.
+        # Unlike setx this does not rewrite the value, so it is neither truncated nor merged
+        # with the system Path.
+        HWND_BROADCAST = 0xFFFF
+        WM_SETTINGCHANGE = 0x001A
+        SMTO_ABORTIFHUNG = 0x0002
+        result = ctypes.c_ulong()
+        ctypes.windll.user32.SendMessageTimeoutW(HWND_BROADCAST, WM_SETTINGCHANGE, 0, "Environment",
+                                                 SMTO_ABORTIFHUNG, self.broadcastTimeout, ctypes.byref(result))
+
+    def Describe(self):
+        return "the user Path" if self.user else "the system Path"
+
+
+class ProfileBackend:
+    pathModule = posixpath
+    marker = "# Added by the bs14 setup"
+
+    def __init__(self, fragmentPath=None, profilePath=None):
+        configDirectory = os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config")
+        self.fragmentPath = fragmentPath or os.path.join(configDirectory, "bs14", "env.sh")
+        self.profilePath = profilePath or os.path.expanduser("~/.profile")
+
+    def Read(self):
+        # The fragment holds a single line: export PATH="<entries>:$PATH"
+        try:
+            with open(self.fragmentPath, "r", encoding="utf-8") as fragment:
+                for line in fragment:
+                    if line.startswith('export PATH="') and line.rstrip().endswith(':$PATH"'):
+                        return line.strip()[len('export PATH="'):-len(':$PATH"')]
+        except FileNotFoundError:
+            pass
+        return ""
+
+    def Write(self, value):
+        os.makedirs(os.path.dirname(self.fragmentPath), exist_ok=True)
+        temporaryPath = self.fragmentPath + ".tmp"
+        with open(temporaryPath, "w", encoding="utf-8") as fragment:
+            fragment.write(f"{self.marker}; rewritten on every run\n")
+            fragment.write(f'export PATH="{value}:$PATH"\n')
+        os.replace(temporaryPath, self.fragmentPath)
+        self._Hook()
+
+    def _Hook(self):
+        # Source the fragment from the login profile, once
+        hook = f'[ -f "{self.fragmentPath}" ] && . "{self.fragmentPath}"'
+        try:
+            with open(self.profilePath, "r", encoding="utf-8") as profile:
+                if hook in profile.read():
+                    return
+        except FileNotFoundError:
+            pass
+        with open(self.profilePath, "a", encoding="utf-8") as profile:
+            profile.write(f"\n{self.marker}\n{hook}\n")
+
+    def Broadcast(self):
+        # Shells read the profile when they start; there is nobody to notify
+        pass
+
+    def Describe(self):
+        return self.fragmentPath
+
+
+# Function to pick where PATH is stored on this system
+
+
+def DefaultBackend(user=True):
+    if sys.platform.startswith("win"):
+        return RegistryBackend(user)
+    return ProfileBackend()
+
+
+class EnvironmentUpdate:
+    def __init__(self, backend=None):
+        self.backend = backend or DefaultBackend()
+        self.pending = []
+        self.added = []
+
+    def AddPath(self, *entries):
+        self.pending.extend(entries)
+        return self
+
+    def Normalize(self, entry):
+        # The same directory written differently ("C:/msys64/mingw64/bin\", "c:\MSYS64\mingw64\bin")
+        pathModule = self.backend.pathModule
+        return pathModule.normcase(pathModule.normpath(pathModule.expandvars(entry.strip())))
+
+    def Plan(self, current):
+        pathModule = self.backend.pathModule
+        separator = ";" if pathModule is ntpath else ":"
+        seen = {self.Normalize(entry) for entry in current.split(separator) if entry.strip()}
+        added = []
+        for entry in self.pending:
+            normalized = self.Normalize(entry)
+            if normalized not in seen:
+                seen.add(normalized)
+                added.append(pathModule.normpath(entry))
+        value = separator.join([entry for entry in current.split(separator) if entry] + added)
+        return value, added
+
+    # Function to apply every pending entry with one read, at most one write and one broadcast
+    def Apply(self):
+        with Tracer.Span("update PATH", "environment", entries=len(self.pending)) as span:
+            try:
+                value, self.added = self.Plan(self.backend.Read())
+                for entry in self.pending:
+                    if self.backend.pathModule.normpath(entry) not in self.added:
+                        print(f"'{entry}' is already in the Path.")
+                if self.added:
+                    self.backend.Write(value)
+                    self.backend.Broadcast()
+                    for entry in self.added:
+                        print(f"Added '{entry}' to Path successfully.")
+            except Exception as e:
+                print_colored(f"Failed to update {self.backend.Describe()}: {e}", 31)
+                return False
+            finally:
+                self.pending = []
+            span.Set(added=len(self.added))
+        return True
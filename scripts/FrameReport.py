@@ -0,0 +1,124 @@
+import argparse
+import mmap
+import struct
+import sys
+
+from Utils import Percentile, print_colored
+
+# Reads the frame timing files written by a DINO_PROFILE build of the game
+# (see game/frame_profiler.h) and reports percentiles and the worst stalls,
+# or compares two runs.
+
+
+class FrameProfile:
+    magic = b"DFRM"
+    header = struct.Struct("<4sHH")
+    record = struct.Struct("<I4f")
+    metrics = ["updateMs", "drawMs", "presentMs", "frameMs"]
+
+    def __init__(self, path):
+        self.path = path
+        self.frames = []
+        self.columns = {metric: [] for metric in self.metrics}
+        self._Load()
+
+    def _Load(self):
+        with open(self.path, "rb") as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                if len(data) < self.header.size:
+                    raise ValueError(f"{self.path} is too short to be a frame profile")
+                magic, version, recordSize = self.header.unpack_from(data, 0)
+                if magic != self.magic or version != 1 or recordSize != self.record.size:
+                    raise ValueError(f"{self.path} is not a version 1 frame profile")
+
+                # A run that was killed mid-flush may end in a partial record
+                end = self.header.size + (len(data) - self.header.size) // recordSize * recordSize
+                view = memoryview(data)[self.header.size:end]
+                try:
+                    for frame, *values in self.record.iter_unpack(view):
+                        self.frames.append(frame)
+                        for metric, value in zip(self.metrics, values):
+                            self.columns[metric].append(value)
+                finally:
+                    view.release()
+
+    def Summary(self):
+        summary = {}
+        for metric, values in self.columns.items():
+            sortedValues = sorted(values)
+            summary[metric] = {
+                "p50": Percentile(sortedValues, 50),
+                "p95": Percentile(sortedValues, 95),
+                "p99": Percentile(sortedValues, 99),
+                "max": sortedValues[-1] if sortedValues else 0.0,
+                "mean": sum(sortedValues) / len(sortedValues) if sortedValues else 0.0,
+            }
+        return summary
+
+    def WorstStalls(self, count):
+        frameTimes = self.columns["frameMs"]
+        worst = sorted(range(len(frameTimes)), key=frameTimes.__getitem__, reverse=True)[:count]
+        return [
+            {"frame": self.frames[index], **{metric: self.columns[metric][index] for metric in self.metrics}}
+            for index in worst
+        ]
+
+
+def PrintReport(profile, stalls):
+    summary = profile.Summary()
+    print(f"{profile.path}: {len(profile.frames)} frames")
+    print(f"{'':<12}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for metric in FrameProfile.metrics:
+        values = summary[metric]
+        print(f"{metric:<12}{values['p50']:>9.3f}{values['p95']:>9.3f}{values['p99']:>9.3f}{values['max']:>9.3f}")
+
+    if stalls:
+        print(f"\nWorst {stalls} frames (ms):")
+        print(f"{'frame':>8}{'frame':>9}{'update':>9}{'draw':>9}{'present':>9}")
+        for stall in profile.WorstStalls(stalls):
+            print(
+                f"{stall['frame']:>8}{stall['frameMs']:>9.3f}{stall['updateMs']:>9.3f}"
+                f"{stall['drawMs']:>9.3f}{stall['presentMs']:>9.3f}"
+            )
+
+
+def PrintComparison(baseline, candidate, threshold):
+    baselineSummary = baseline.Summary()
+    candidateSummary = candidate.Summary()
+    print(f"Baseline:  {baseline.path} ({len(baseline.frames)} frames)")
+    print(f"Candidate: {candidate.path} ({len(candidate.frames)} frames)")
+    print(f"{'':<16}{'baseline':>10}{'candidate':>11}{'change':>9}")
+
+    regressed = False
+    for metric in FrameProfile.metrics:
+        for statistic in ("p50", "p95", "p99", "max"):
+            before = baselineSummary[metric][statistic]
+            after = candidateSummary[metric][statistic]
+            change = (after - before) / before * 100 if before else 0.0
+            line = f"{metric + ' ' + statistic:<16}{before:>10.3f}{after:>11.3f}{change:>+8.1f}%"
+            if threshold is not None and statistic != "max" and change > threshold:
+                regressed = True
+                print_colored(line, 31)
+            else:
+                print(line)
+    return regressed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize or compare Dino frame timing files.")
+    parser.add_argument("profile", help="frame timing file written by a DINO_PROFILE build")
+    parser.add_argument("candidate", nargs="?", help="second file to compare against the first")
+    parser.add_argument("--stalls", type=int, default=10, help="number of worst frames to list")
+    parser.add_argument("--threshold", type=float,
+                        help="with two files, exit with 1 if a p50/p95/p99 grows by more than this percentage")
+    args = parser.parse_args()
+
+    try:
+        baseline = FrameProfile(args.profile)
+        if args.candidate is None:
+            PrintReport(baseline, args.stalls)
+        elif PrintComparison(baseline, FrameProfile(args.candidate), args.threshold):
+            sys.exit(1)
+    except (OSError, ValueError) as e:
+        print_colored(str(e), 31)
+        sys.exit(2)
@@ -0,0 +1,406 @@
+import os
+import re
+import sys
+
+from Utils import print_colored, RunProcess, Tracer
+
+# Linux install backends. Each one turns a set of missing tools into as few
+# package-manager transactions as it can: one update and one install for apt,
+# a single install for dnf and pacman. Only packages whose candidate version
+# meets the requirement are installed; the other tools, and everything where
+# no package manager is available (or --backend tarball is given), come from
+# the official release archives, unpacked under ~/.local/opt/bs14 and linked
+# into ~/.local/bin without root.
+#
+# Package managers are found on PATH, so a fake 'apt-get' in front of the
+# real one is enough to exercise a backend without touching the network.
+# Every package manager backend provides Commands(packages), the install
+# commands, and CandidateVersion(package), the version it would install.
+#
+# shutil and platform are imported where an install needs them, so validating
+# a complete toolchain stays on the fast startup path.
+
+
+class PackageBackend:
+    name = None
+    executable = None
+    # Tool name -> package names to try in order. A package named after an LLVM
+    # release (clang-18) only ships versioned binaries, which get linked under
+    # the tool's own name
+    packages = {}
+    # Binaries that come with a tool's package and are linked next to it
+    companions = {"clang": ["clang++"]}
+    environment = {}
+    # "1:18.1.8-1ubuntu1" -> "18.1.8"
+    versionPattern = re.compile(r"(?:\d+:)?(\d+(?:\.\d+)*)")
+
+    @classmethod
+    def Available(cls):
+        import shutil
+
+        return shutil.which(cls.executable) is not None
+
+    @classmethod
+    def Refresh(cls):
+        # Commands that update the package index before candidate versions are read
+        return []
+
+    @classmethod
+    def _QueryVersion(cls, command, prefix):
+        # The version on the first output line that starts with prefix; None if there is none
+        try:
+            output = RunProcess(command, capture_output=True, text=True).stdout
+        except OSError:
+            return None
+        for line in output.splitlines():
+            line = line.strip()
+            if line.startswith(prefix):
+                match = cls.versionPattern.match(line[len(prefix):].lstrip(" \t:"))
+                if match:
+                    return match.group(1)
+        return None
+
+    @classmethod
+    def Choose(cls, tools):
+        # tool -> the first package whose candidate meets the tool's requirement
+        from Versions import ToolRequirements
+
+        chosen = {}
+        for tool in tools:
+            for package in cls.packages[tool]:
+                version = cls.CandidateVersion(package)
+                if version is not None and ToolRequirements[tool].range.Contains(version):
+                    chosen[tool] = package
+                    break
+        return chosen
+
+    @classmethod
+    def _Privileged(cls, command, unattended=False):
+        import shutil
+
+        # System package managers need root; use sudo when we are not root already
+        if hasattr(os, "geteuid") and os.geteuid() != 0 and shutil.which("sudo"):
+            # Nobody is there to type a password in an unattended run; -n fails instead of waiting
+            sudo = ["sudo", "-n"] if unattended else ["sudo"]
+            # sudo resets the environment, so the variables are passed as assignments
+            return sudo + [f"{name}={value}" for name, value in cls.environment.items()] + command
+        return command
+
+    @classmethod
+    def _RunAll(cls, commands, tools, unattended=False):
+        environment = dict(os.environ, **cls.environment)
+        for command in commands:
+            command = cls._Privileged(command, unattended)
+            print_colored(" ".join(command), 36)
+            try:
+                failed = RunProcess(command, env=environment).returncode != 0
+            except OSError as e:
+                failed = e
+            if failed:
+                print_colored(f"'{' '.join(command)}' failed. Please install {', '.join(tools)} manually.", 31)
+                if command[:2] == ["sudo", "-n"]:
+                    print_colored("Unattended installs need root or sudo without a password.", 31)
+                return False
+        return True
+
+    @classmethod
+    def Describe(cls, tools):
+        options = []
+        for tool in tools:
+            option = "|".join(cls.packages[tool])
+            if option not in options:
+                options.append(option)
+        return f"{cls.name}: {' '.join(options)}; release archives where those are too old"
+
+    @classmethod
+    def Install(cls, tools, unattended=False):
+        if not cls._RunAll(cls.Refresh(), tools, unattended):
+            return False
+
+        chosen = cls.Choose(tools)
+        if chosen:
+            packages = []
+            for package in chosen.values():
+                if package not in packages:
+                    packages.append(package)
+            if not cls._RunAll(cls.Commands(packages), list(chosen), unattended):
+                return False
+            # clang-18 installs /usr/bin/clang-18 and clang++-18; the setup and the build look for clang and clang++
+            import shutil
+
+            versioned = {}
+            for tool, package in chosen.items():
+                match = re.fullmatch(re.escape(tool) + r"(-\d+)", package)
+                if match:
+                    for name in [tool] + cls.companions.get(tool, []):
+                        versioned[name] = shutil.which(name + match.group(1))
+            if versioned and not LinkTools(versioned):
+                return False
+            print_colored(f"Installed {', '.join(chosen)} with {cls.name}.", 32)
+
+        outdated = [tool for tool in tools if tool not in chosen]
+        if outdated:
+            print_colored(f"{cls.name} has no package of {', '.join(outdated)} that is new enough; "
+                          f"using the release archives.", 33)
+            return TarballBackend.Install(outdated, unattended)
+        return True
+
+
+class AptBackend(PackageBackend):
+    name = "apt"
+    executable = "apt-get"
+    # Debian 12 and Ubuntu 22.04 ship clang 14 as 'clang'; newer releases come as clang-N
+    packages = {
+        "cmake": ["cmake"],
+        "ninja": ["ninja-build"],
+        "clang": ["clang", "clang-19", "clang-18"],
+        "clangd": ["clangd", "clangd-19", "clangd-18"],
+    }
+    environment = {"DEBIAN_FRONTEND": "noninteractive"}
+
+    @classmethod
+    def Refresh(cls):
+        return [["apt-get", "update"]]
+
+    @classmethod
+    def Commands(cls, packages):
+        return [["apt-get", "install", "-y", "--no-install-recommends"] + packages]
+
+    @classmethod
+    def CandidateVersion(cls, package):
+        return cls._QueryVersion(["apt-cache", "policy", package], "Candidate")
+
+
+class DnfBackend(PackageBackend):
+    name = "dnf"
+    executable = "dnf"
+    packages = {"cmake": ["cmake"], "ninja": ["ninja-build"], "clang": ["clang"], "clangd": ["clang-tools-extra"]}
+
+    @classmethod
+    def Commands(cls, packages):
+        return [["dnf", "install", "-y"] + packages]
+
+    @classmethod
+    def CandidateVersion(cls, package):
+        return cls._QueryVersion(
+            ["dnf", "repoquery", "--latest-limit", "1", "--queryformat", "version: %{version}\n", package],
+            "version")
+
+
+class PacmanBackend(PackageBackend):
+    name = "pacman"
+    executable = "pacman"
+    # Arch ships clangd in the clang package
+    packages = {"cmake": ["cmake"], "ninja": ["ninja"], "clang": ["clang"], "clangd": ["clang"]}
+
+    @classmethod
+    def Commands(cls, packages):
+        return [["pacman", "-S", "--needed", "--noconfirm"] + packages]
+
+    @classmethod
+    def CandidateVersion(cls, package):
+        return cls._QueryVersion(["pacman", "-Si", package], "Version")
+
+
+class TarballBackend(PackageBackend):
+    name = "tarball"
+    installDirectory = os.path.expanduser("~/.local/opt/bs14")
+    binDirectory = os.path.expanduser("~/.local/bin")
+    # Set BS14_TARBALL_MIRROR to a directory URL holding the same file names to stay offline
+    mirror = os.environ.get("BS14_TARBALL_MIRROR")
+
+    # Tool -> (archive URL per machine, path of the binary inside the unpacked archive)
+    archives = {
+        "cmake": (
+            {
+                "x86_64": "https://github.com/Kitware/CMake/releases/download/v3.30.5/cmake-3.30.5-linux-x86_64.tar.gz",
+                "aarch64": "https://github.com/Kitware/CMake/releases/download/v3.30.5/cmake-3.30.5-linux-aarch64.tar.gz",
+            },
+            "bin/cmake",
+        ),
+        "ninja": (
+            {
+                "x86_64": "https://github.com/ninja-build/ninja/releases/download/v1.12.1/ninja-linux.zip",
+                "aarch64": "https://github.com/ninja-build/ninja/releases/download/v1.12.1/ninja-linux-aarch64.zip",
+            },
+            "ninja",
+        ),
+        "clang": (
+            {
+                "x86_64": "https://github.com/llvm/llvm-project/releases/download/llvmorg-18.1.8/clang+llvm-18.1.8-x86_64-linux-gnu-ubuntu-18.04.tar.xz",
+                "aarch64": "https://github.com/llvm/llvm-project/releases/download/llvmorg-18.1.8/clang+llvm-18.1.8-aarch64-linux-gnu.tar.xz",
+            },
+            "bin/clang",
+        ),
+    }
+    # clangd comes with the LLVM archive
+    archives["clangd"] = (archives["clang"][0], "bin/clangd")
+
+    @classmethod
+    def Available(cls):
+        import platform
+
+        return platform.machine() in cls.archives["cmake"][0]
+
+    @classmethod
+    def Url(cls, tool):
+        import platform
+
+        url = cls.archives[tool][0][platform.machine()]
+        if cls.mirror:
+            return cls.mirror.rstrip("/") + "/" + os.path.basename(url)
+        return url
+
+    @classmethod
+    def Packages(cls, tools):
+        # One download per archive, however many tools it provides
+        urls = []
+        for tool in tools:
+            if cls.Url(tool) not in urls:
+                urls.append(cls.Url(tool))
+        return urls
+
+    @classmethod
+    def Describe(cls, tools):
+        return f"tarball: {' '.join(os.path.basename(url) for url in cls.Packages(tools))} into {cls.installDirectory}"
+
+    @classmethod
+    def _Unpack(cls, url):
+        import shutil
+        import tarfile
+        from Utils import DownloadFile, UnzipFile
+
+        fileName = os.path.basename(url)
+        target = os.path.join(cls.installDirectory, fileName.split(".tar")[0].removesuffix(".zip"))
+        if os.path.isdir(target):
+            return target
+        archivePath = os.path.join(cls.installDirectory, "downloads", fileName)
+        DownloadFile(url, archivePath)
+
+        with Tracer.Span(fileName, "unpack"):
+            staging = target + ".partial"
+            shutil.rmtree(staging, ignore_errors=True)
+            os.makedirs(staging)
+            if fileName.endswith(".zip"):
+                os.replace(archivePath, os.path.join(staging, fileName))
+                UnzipFile(os.path.join(staging, fileName))
+            else:
+                with tarfile.open(archivePath) as archive:
+                    if hasattr(tarfile, "data_filter"):
+                        archive.extractall(staging, filter="data")
+                    else:
+                        archive.extractall(staging)
+                os.remove(archivePath)
+
+            # Release tarballs hold a single top-level directory; drop it
+            entries = os.listdir(staging)
+            if len(entries) == 1 and os.path.isdir(os.path.join(staging, entries[0])):
+                os.replace(os.path.join(staging, entries[0]), target)
+                os.rmdir(staging)
+            else:
+                os.replace(staging, target)
+        return target
+
+    @classmethod
+    def Install(cls, tools, unattended=False):
+        from concurrent.futures import ThreadPoolExecutor
+
+        # The archives are independent, so they download and unpack side by side
+        try:
+            with ThreadPoolExecutor(max_workers=len(cls.Packages(tools))) as pool:
+                targets = dict(zip(cls.Packages(tools), pool.map(cls._Unpack, cls.Packages(tools))))
+        except Exception as e:
+            print_colored(f"Failed to install {', '.join(tools)} from release archives: {e}", 31)
+            return False
+
+        binaries = {}
+        for tool in tools:
+            path = cls.archives[tool][1]
+            paths = {tool: path}
+            paths.update({name: os.path.join(os.path.dirname(path), name) for name in cls.companions.get(tool, [])})
+            for name, path in paths.items():
+                binary = os.path.join(targets[cls.Url(tool)], path)
+                if not os.path.isfile(binary):
+                    print_colored(f"{path} is missing from {os.path.basename(cls.Url(tool))}.", 31)
+                    return False
+                # zip archives do not keep the executable bit
+                os.chmod(binary, os.stat(binary).st_mode | 0o111)
+                binaries[name] = binary
+
+        LinkTools(binaries)
+        print_colored(f"Installed {', '.join(tools)} into {cls.binDirectory}.", 32)
+        return True
+
+
+# Function to link binaries into ~/.local/bin under the tool names ({tool: binary path})
+# and to put that directory on the PATH of new shells
+
+
+def LinkTools(binaries):
+    binDirectory = TarballBackend.binDirectory
+    os.makedirs(binDirectory, exist_ok=True)
+    for tool, binary in binaries.items():
+        if binary is None:
+            print_colored(f"The package for {tool} did not install a binary on PATH.", 31)
+            return False
+        link = os.path.join(binDirectory, tool)
+        if os.path.lexists(link):
+            os.remove(link)
+        os.symlink(binary, link)
+
+    if binDirectory not in os.environ.get("PATH", "").split(os.pathsep):
+        from Environment import EnvironmentUpdate
+
+        if EnvironmentUpdate().AddPath(binDirectory).Apply():
+            print_colored(f"{binDirectory} is on the PATH of new login shells.", 33)
+        else:
+            print_colored(f"Add {binDirectory} to your PATH to use them.", 33)
+    return True
+
+
+Backends = {backend.name: backend for backend in [AptBackend, DnfBackend, PacmanBackend, TarballBackend]}
+
+
+# Function to pick the install backend: the requested one, else the first package manager found
+
+
+def SelectBackend(name=None):
+    if not sys.platform.startswith("linux"):
+        return None
+    if name is not None:
+        return Backends[name]
+    for backend in (AptBackend, DnfBackend, PacmanBackend, TarballBackend):
+        if backend.Available():
+            return backend
+    return None
+
+
+# Function to install tools with the selected backend in one transaction
+
+
+def InstallTools(tools, backendName=None, unattended=False):
+    backend = SelectBackend(backendName)
+    if backend is None:
+        print_colored(f"Platform '{sys.platform}' is not supported.", 31)
+        return False
+    return backend.Install(tools, unattended)
+
+
+# Function to install the missing tools in one transaction after a single question.
+# Setup.py only loads this module once a check has failed
+
+
+def InstallMissing(missing, backendName=None):
+    backend = SelectBackend(backendName)
+    if backend is None:
+        print_colored(f"No way to install {', '.join(missing)} on this system. Please install them manually.", 31)
+        return False
+
+    # One question and one transaction for everything that is missing
+    print_colored(f"Missing or outdated: {', '.join(missing)}", 33)
+    while True:
+        reply = input(f"Would you like to install them ({backend.Describe(missing)})? [Y/N]: ").lower().strip()[:1]
+        if reply == "n":
+            return False
+        if reply == "y":
+            return backend.Install(missing)
@@ -0,0 +1,222 @@
+import os
+import sys
+import threading
+import time
+
+# One progress display shared by every download and extraction. Tasks only
+# add to a counter on the hot path; the display is rebuilt at most every
+# Progress.interval seconds, no matter how many blocks or files come in.
+# Throughput is an exponentially weighted moving average, so the ETA follows
+# the current speed instead of the average since the start.
+#
+# On a terminal every running task gets its own line, redrawn in place. When
+# stdout is not a terminal (CI logs, pipes) a task writes a line when it
+# finishes and otherwise at most every Progress.logInterval seconds.
+# BS14_PROGRESS=plain forces log lines, BS14_PROGRESS=off disables output.
+
+
+def FormatBytes(count):
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(count) < 1024 or unit == "GB":
+            return f"{count:.0f} {unit}" if unit == "B" else f"{count:.1f} {unit}"
+        count /= 1024
+
+
+def FormatDuration(seconds):
+    if seconds is None:
+        return "--:--"
+    seconds = int(seconds + 0.5)
+    if seconds >= 3600:
+        return f"{seconds // 3600}:{seconds // 60 % 60:02}:{seconds % 60:02}"
+    return f"{seconds // 60}:{seconds % 60:02}"
+
+
+class ProgressTask:
+    # Weight of the newest throughput sample
+    smoothing = 0.3
+
+    def __init__(self, name, total=None):
+        self.name = name
+        self.total = total or None
+        self.done = 0
+        self.startTime = time.monotonic()
+        self.endTime = None
+        self.rate = None
+        self._sampleTime = self.startTime
+        self._sampleDone = 0
+        self._lastLog = self.startTime
+
+    def Advance(self, count):
+        with Progress._lock:
+            self.done += count
+        Progress._Tick()
+
+    def Update(self, done, total=None):
+        with Progress._lock:
+            self.done = done
+            if total:
+                self.total = total
+        Progress._Tick()
+
+    def Finish(self):
+        Progress._Finish(self)
+
+    def _Sample(self, now):
+        # A window much shorter than a redraw, such as the first tick right after the task
+        # started, measures scheduling noise; it stays open until the next redraw instead
+        elapsed = now - self._sampleTime
+        if elapsed < Progress.interval:
+            return
+        current = (self.done - self._sampleDone) / elapsed
+        self.rate = current if self.rate is None else self.smoothing * current + (1 - self.smoothing) * self.rate
+        self._sampleTime = now
+        self._sampleDone = self.done
+
+    def Eta(self):
+        if self.total is None or not self.rate or self.rate <= 0:
+            return None
+        return max(self.total - self.done, 0) / self.rate
+
+    def Status(self):
+        if self.endTime is not None:
+            elapsed = self.endTime - self.startTime
+            rate = self.done / elapsed if elapsed > 0 else 0.0
+            return f"{FormatBytes(self.done)} in {elapsed:.1f} s ({FormatBytes(rate)}/s)"
+        return f"{FormatBytes(self.rate or 0.0)}/s, ETA {FormatDuration(self.Eta())}"
+
+    def Render(self, width, nameWidth=28, barWidth=30):
+        if self.total is None:
+            line = f"{FormatBytes(self.done)} {self.Status()}"
+        else:
+            fraction = min(max(self.done / self.total, 0.0), 1.0)
+            filled = int(barWidth * fraction)
+            line = f"[{'█' * filled}{'.' * (barWidth - filled)}] {fraction * 100:6.2f}% {self.Status()}"
+
+        # Keep every line shorter than the terminal; a wrapped line breaks the redraw
+        name = self.name if len(self.name) <= nameWidth else self.name[:nameWidth - 3] + "..."
+        return f"{name:<{nameWidth}} {line}"[:width - 1]
+
+    def LogLine(self):
+        if self.endTime is not None or self.total is None:
+            return f"{self.name}: {self.Status()}"
+        return f"{self.name}: {self.done / self.total * 100:.0f}% of {FormatBytes(self.total)}, {self.Status()}"
+
+
+class Progress:
+    # Seconds between two redraws on a terminal
+    interval = 0.1
+    # Seconds between two log lines of the same task when stdout is not a terminal
+    logInterval = 10.0
+    # None: decide from the stream; True: redraw in place; False: log lines
+    interactive = None
+    enabled = os.environ.get("BS14_PROGRESS", "") != "off"
+
+    _lock = threading.Lock()
+    _tasks = []
+    _drawnLines = 0
+    _nextDraw = 0.0
+    _width = None
+
+    @classmethod
+    def Task(cls, name, total=None):
+        task = ProgressTask(name, total)
+        with cls._lock:
+            cls._tasks.append(task)
+        return task
+
+    @classmethod
+    def _Interactive(cls):
+        if cls.interactive is None:
+            cls.interactive = (
+                os.environ.get("BS14_PROGRESS", "") != "plain"
+                and hasattr(sys.stdout, "isatty") and sys.stdout.isatty()
+                and os.environ.get("TERM") != "dumb"
+            )
+        return cls.interactive
+
+    @classmethod
+    def _Tick(cls):
+        # Called for every block or file; almost always returns right here
+        now = time.monotonic()
+        if now < cls._nextDraw:
+            return
+        with cls._lock:
+            if now < cls._nextDraw:
+                return
+            cls._nextDraw = now + cls.interval
+            for task in cls._tasks:
+                if task.endTime is None:
+                    task._Sample(now)
+            cls._Draw(now)
+
+    @classmethod
+    def _Draw(cls, now):
+        if not cls.enabled:
+            return
+        if not cls._Interactive():
+            lines = []
+            for task in cls._tasks:
+                if task.endTime is None and now - task._lastLog >= cls.logInterval:
+                    task._lastLog = now
+                    lines.append(task.LogLine() + "\n")
+            if lines:
+                sys.stdout.write("".join(lines))
+                sys.stdout.flush()
+            return
+
+        if cls._width is None:
+            try:
+                cls._width = os.get_terminal_size(sys.stdout.fileno()).columns
+            except (OSError, ValueError):
+                cls._width = 0
+            # A pseudo terminal without a size reports 0 columns
+            cls._width = cls._width or 80
+        # Names get up to 28 columns, the bar whatever is left after the numbers (about 45 columns)
+        nameWidth = min(max((len(task.name) for task in cls._tasks), default=0), 28)
+        barWidth = max(min(cls._width - nameWidth - 48, 30), 10)
+        output = cls._Rewind()
+        output += "\n".join(task.Render(cls._width, nameWidth, barWidth) + "\x1b[K" for task in cls._tasks)
+        cls._drawnLines = len(cls._tasks)
+        sys.stdout.write(output)
+        sys.stdout.flush()
+
+    @classmethod
+    def _Rewind(cls):
+        # Back to the start of the first line of the display
+        if cls._drawnLines > 1:
+            return f"\x1b[{cls._drawnLines - 1}F"
+        return "\r"
+
+    @classmethod
+    def _Finish(cls, task):
+        with cls._lock:
+            if task.endTime is not None:
+                return
+            task.endTime = time.monotonic()
+            if not cls.enabled:
+                cls._tasks.remove(task)
+                return
+            if not cls._Interactive():
+                cls._tasks.remove(task)
+                sys.stdout.write(task.LogLine() + "\n")
+                sys.stdout.flush()
+                return
+            cls._Draw(task.endTime)
+            # The display stays until its last task is done
+            if all(other.endTime is not None for other in cls._tasks):
+                sys.stdout.write("\n")
+                sys.stdout.flush()
+                cls._tasks.clear()
+                cls._drawnLines = 0
+
+    # Function to print a message without tearing up the display
+    @classmethod
+    def Print(cls, *args):
+        with cls._lock:
+            if cls._drawnLines and cls._Interactive():
+                sys.stdout.write(cls._Rewind() + "\x1b[J")
+                print(*args)
+                cls._drawnLines = 0
+                cls._Draw(time.monotonic())
+            else:
+                print(*args)
@@ -0,0 +1,303 @@
+import json
+import os
+import platform
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from Utils import print_colored, Tracer
+from ToolProbe import ToolProbe
+from DetectionCache import DetectionCache
+from SetupPython import PythonConfiguration
+from SetupBuildTools import BuildToolsConfiguration
+from SetupClang import ClangConfiguration
+from Versions import CheckAll, ToolRequirements
+
+# Unattended provisioning for CI runners. The whole validate-and-install plan
+# is computed before anything is installed, independent installs run side by
+# side, nothing ever waits for a keypress, and the outcome is an exit code
+# plus an optional JSON report with the timing of every step.
+
+# Exit codes
+ExitOk = 0
+ExitFailed = 1          # an install step failed
+ExitUsage = 2           # bad arguments or config file
+ExitUnmet = 3           # a requirement is unmet and may not (or cannot) be installed
+ExitRestartNeeded = 4   # installs succeeded, but the tools only show up in a new shell
+ExitTooOld = 5          # installs succeeded, but a tool found afterwards is still too old
+
+
+class ProvisionError(ValueError):
+    pass
+
+
+class ProvisionStep:
+    def __init__(self, name, action, dependsOn=(), tools=()):
+        self.name = name
+        self.action = action
+        self.dependsOn = list(dependsOn)
+        # Tools that are installed once this step succeeded
+        self.tools = list(tools)
+        self.status = "pending"
+        self.elapsed = 0.0
+        self.detail = None
+
+    def Run(self):
+        startTime = time.perf_counter()
+        try:
+            with Tracer.Span(self.name, "step"):
+                self.status = "ok" if self.action() else "failed"
+        except Exception as e:
+            self.status = "failed"
+            self.detail = str(e)
+        self.elapsed = time.perf_counter() - startTime
+
+    def ToJson(self):
+        return {"name": self.name, "status": self.status, "elapsed": round(self.elapsed, 4),
+                "dependsOn": self.dependsOn, "tools": self.tools, "detail": self.detail}
+
+
+class ProvisionOptions:
+    tools = list(ToolRequirements)
+
+    def __init__(self, install=None, jobs=None, report=None, refresh=False, backend=None):
+        # Tools that may be installed when their requirement is not met
+        self.install = self.tools if install is None else install
+        self.jobs = jobs
+        self.report = report
+        self.refresh = refresh
+        # Linux package backend (see PackageManagers.py); picked automatically when None
+        self.backend = backend
+
+    @classmethod
+    def Load(cls, path):
+        try:
+            with open(path, "r", encoding="utf-8") as configFile:
+                config = json.load(configFile)
+        except (OSError, ValueError) as e:
+            raise ProvisionError(f"Cannot read config file {path}: {e}")
+        if not isinstance(config, dict):
+            raise ProvisionError(f"{path} must contain a JSON object")
+
+        unknown = set(config) - {"install", "jobs", "report", "refresh", "backend"}
+        if unknown:
+            raise ProvisionError(f"Unknown keys in {path}: {', '.join(sorted(unknown))}")
+        return cls(cls.ParseInstall(config.get("install", "all")), config.get("jobs"),
+                   config.get("report"), bool(config.get("refresh", False)),
+                   cls.ParseBackend(config.get("backend")))
+
+    @classmethod
+    def ParseInstall(cls, value):
+        # "all", "none", "cmake,ninja" or a JSON list
+        if isinstance(value, str):
+            if value == "all":
+                return list(cls.tools)
+            if value == "none":
+                return []
+            value = [tool.strip() for tool in value.split(",") if tool.strip()]
+        if not isinstance(value, list):
+            raise ProvisionError("'install' must be \"all\", \"none\" or a list of tools")
+        unknown = [tool for tool in value if tool not in cls.tools]
+        if unknown:
+            raise ProvisionError(f"Unknown tools: {', '.join(unknown)} (known: {', '.join(cls.tools)})")
+        return value
+
+    @classmethod
+    def ParseBackend(cls, value):
+        from PackageManagers import Backends
+
+        if value is not None and value not in Backends:
+            raise ProvisionError(f"Unknown backend '{value}' (known: {', '.join(Backends)})")
+        return value
+
+
+class Provisioner:
+    def __init__(self, options):
+        self.options = options
+        self.steps = []
+        self.checks = {}
+        self.verified = {}
+
+    def _Timed(self, name, action):
+        step = ProvisionStep(name, action)
+        self.steps.append(step)
+        step.Run()
+        return step
+
+    def _Unsupported(self, tool):
+        def Action():
+            print_colored(f"Installing {tool} is not supported on '{sys.platform}'.", 31)
+            return False
+        return Action
+
+    # Function to turn the unmet requirements into install steps with their dependencies
+    def Plan(self, checks):
+        missing = [name for name, check in checks.items() if not check.satisfied]
+        allowed = [name for name in missing if name in self.options.install]
+        plan = []
+        isWindows = sys.platform.startswith("win")
+
+        if sys.platform.startswith("linux") and allowed:
+            from PackageManagers import SelectBackend
+
+            # Package managers lock their database, so every tool goes into one transaction
+            backend = SelectBackend(self.options.backend)
+            if backend is not None:
+                plan.append(ProvisionStep(f"install-{backend.name}", lambda: backend.Install(allowed, unattended=True),
+                                          tools=allowed))
+                return plan, [name for name in missing if name not in allowed]
+
+        if "cmake" in allowed:
+            plan.append(ProvisionStep("install-cmake", lambda: BuildToolsConfiguration.InstallCMake(unattended=True),
+                                      tools=["cmake"]))
+        if "ninja" in allowed:
+            plan.append(ProvisionStep("install-ninja", lambda: BuildToolsConfiguration.InstallNinja(unattended=True),
+                                      tools=["ninja"]))
+
+        clangTools = [name for name in ("clang", "clangd") if name in allowed]
+        if clangTools and isWindows:
+            # Both come from MSYS2, and pacman holds a lock on its database, so they run in sequence.
+            # An existing MSYS2 is neither reinstalled nor upgraded just to add a package
+            msys2Installed = os.path.isdir(ClangConfiguration.msys2Path)
+            previous = []
+            if not msys2Installed:
+                plan.append(ProvisionStep("install-msys2", lambda: ClangConfiguration.InstallMSYS2(unattended=True)))
+                plan.append(ProvisionStep("update-msys2", ClangConfiguration.UpdateMSYS2Keys, ["install-msys2"]))
+                previous = ["update-msys2"]
+            if "clang" in clangTools:
+                plan.append(ProvisionStep("install-clang", ClangConfiguration.InstallClangPackage, previous,
+                                          tools=["clang"]))
+                previous = ["install-clang"]
+            if "clangd" in clangTools:
+                plan.append(ProvisionStep("install-clangd", ClangConfiguration.InstallClangdPackage, previous,
+                                          tools=["clangd"]))
+                previous = ["install-clangd"]
+            # Writes nothing when MSYS2's directories are on PATH already
+            plan.append(ProvisionStep("add-clang-to-path", ClangConfiguration.AddClangToPath, previous))
+        else:
+            for name in clangTools:
+                plan.append(ProvisionStep(f"install-{name}", self._Unsupported(name), tools=[name]))
+
+        return plan, [name for name in missing if name not in allowed]
+
+    def PrintPlan(self, plan, skipped):
+        print("Provisioning plan:")
+        if not plan and not skipped:
+            print_colored("  Every requirement is met; nothing to install.", 32)
+        for step in plan:
+            after = f" (after {', '.join(step.dependsOn)})" if step.dependsOn else ""
+            tools = f": {', '.join(step.tools)}" if len(step.tools) > 1 else ""
+            print_colored(f"  {step.name}{tools}{after}", 36)
+        for name in skipped:
+            print_colored(f"  {name}: {ToolRequirements[name].range} is required, installing it is not allowed", 33)
+
+    # Function to run the steps, starting each one as soon as everything it depends on succeeded
+    def Execute(self, plan):
+        steps = {step.name: step for step in plan}
+        pending = list(plan)
+        running = {}
+        jobs = self.options.jobs or max(len(plan), 1)
+
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            while pending or running:
+                for step in list(pending):
+                    dependencies = [steps[name] for name in step.dependsOn]
+                    if any(dependency.status in ("failed", "skipped") for dependency in dependencies):
+                        step.status = "skipped"
+                        step.detail = "a step it depends on did not succeed"
+                        pending.remove(step)
+                    elif all(dependency.status == "ok" for dependency in dependencies) and len(running) < jobs:
+                        running[pool.submit(step.Run)] = step
+                        pending.remove(step)
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    step = running.pop(future)
+                    color = 32 if step.status == "ok" else 31
+                    print_colored(f"{step.name}: {step.status} ({step.elapsed:.1f} s)", color)
+        self.steps.extend(plan)
+
+    def Verify(self, names):
+        # Probe the installed tools again, bypassing the detection cache
+        DetectionCache.enabled = False
+        commands = {**BuildToolsConfiguration.Probes(), **ClangConfiguration.Probes()}
+        probes = ToolProbe.RunAll({name: commands[name] for name in names})
+        DetectionCache.enabled = not self.options.refresh
+        return CheckAll(probes)
+
+    def Run(self):
+        startTime = time.perf_counter()
+        DetectionCache.enabled = not self.options.refresh
+        PythonConfiguration.assumeYes = True
+
+        if not self._Timed("validate-python", PythonConfiguration.Validate).status == "ok":
+            return self.Finish(ExitFailed, startTime)
+
+        probes = {}
+        self._Timed("probe-tools", lambda: probes.update(
+            ToolProbe.RunAll({**BuildToolsConfiguration.Probes(), **ClangConfiguration.Probes()})) or True)
+        ToolProbe.PrintReport(probes)
+        self._Timed("check-versions", lambda: self.checks.update(CheckAll(probes)) or True)
+
+        plan, skipped = self.Plan(self.checks)
+        self.PrintPlan(plan, skipped)
+        self.Execute(plan)
+
+        succeeded = {tool for step in plan if step.status == "ok" for tool in step.tools}
+        installed = [name for name in self.checks if name in succeeded]
+        if installed:
+            self._Timed("verify", lambda: self.verified.update(self.Verify(installed)) or True)
+        DetectionCache.Save()
+
+        if any(step.status != "ok" for step in plan):
+            return self.Finish(ExitFailed, startTime)
+        if skipped:
+            return self.Finish(ExitUnmet, startTime)
+        outdated = [check for check in self.verified.values() if check.version is not None and not check.satisfied]
+        if outdated:
+            # Another shell would find the same binaries, so asking for one would loop forever
+            for check in outdated:
+                print_colored(f"{check.name} {check.Describe()} is still first on PATH after the install, but "
+                              f"{check.requirement.range.Describe()} is required. Remove it from PATH or "
+                              f"run the setup with --backend tarball.", 31)
+            return self.Finish(ExitTooOld, startTime)
+        if any(not check.satisfied for check in self.verified.values()):
+            print_colored("The installs succeeded, but the new tools are not on this shell's PATH yet. "
+                          "Start a new shell and run the setup again.", 33)
+            return self.Finish(ExitRestartNeeded, startTime)
+        return self.Finish(ExitOk, startTime)
+
+    def Finish(self, exitCode, startTime):
+        elapsed = time.perf_counter() - startTime
+        print_colored(f"Provisioning finished with exit code {exitCode} in {elapsed:.1f} s.",
+                      32 if exitCode == ExitOk else 31)
+        if self.options.report:
+            self.WriteReport(exitCode, elapsed)
+        return exitCode
+
+    def WriteReport(self, exitCode, elapsed):
+        tools = {}
+        for name, check in self.checks.items():
+            after = self.verified.get(name)
+            tools[name] = {
+                "required": str(check.requirement.range),
+                "found": str(check.version) if check.version is not None else None,
+                "satisfied": check.satisfied,
+                "afterInstall": None if after is None else {
+                    "found": str(after.version) if after.version is not None else None,
+                    "satisfied": after.satisfied,
+                },
+            }
+        report = {
+            "exitCode": exitCode,
+            "platform": platform.platform(),
+            "elapsed": round(elapsed, 4),
+            "steps": [step.ToJson() for step in self.steps],
+            "tools": tools,
+        }
+        reportPath = os.path.abspath(self.options.report)
+        os.makedirs(os.path.dirname(reportPath), exist_ok=True)
+        with open(reportPath, "w", encoding="utf-8") as reportFile:
+            json.dump(report, reportFile, indent=2)
+        print(f"Report written to {reportPath}")
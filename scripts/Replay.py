@@ -0,0 +1,239 @@
+import argparse
+import os
+import struct
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from Utils import print_colored
+
+# Reads the replay files written by the game and the headless simulation (see
+# game/replay.h). Files are parsed as a stream of fixed-size chunks, so
+# validating a replay, seeking to a tick or summarizing a large corpus never
+# holds a whole file in memory.
+
+
+class ReplayError(ValueError):
+    pass
+
+
+class ReplayFile:
+    magic = b"DRPL"
+    header = struct.Struct("<4sHHQf")
+    endMarker = 0xFF
+    inputJump = 1
+    inputRestart = 2
+    chunkSize = 1024 * 1024
+    # An end record (marker and three 64-bit varints) is the longest record
+    maxRecordSize = 1 + 3 * 10
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as file:
+            raw = file.read(self.header.size)
+        if len(raw) < self.header.size:
+            raise ReplayError(f"{path} is too short to be a replay")
+        magic, version, headerSize, self.seed, self.timestep = self.header.unpack(raw)
+        if magic != self.magic or version != 1 or headerSize != self.header.size:
+            raise ReplayError(f"{path} is not a version 1 replay")
+        # Set once Runs() reached the end record: (ticks, games, score)
+        self.end = None
+
+    @staticmethod
+    def _ReadVarint(buffer, position):
+        value = 0
+        shift = 0
+        while position < len(buffer):
+            byte = buffer[position]
+            position += 1
+            value |= (byte & 0x7F) << shift
+            if not byte & 0x80:
+                return value, position
+            shift += 7
+            if shift >= 64:
+                break
+        raise ReplayError("truncated or oversized varint")
+
+    # Function to iterate over the runs of equal inputs as (first tick, input, tick count, file offset)
+    def Runs(self):
+        self.end = None
+        tick = 0
+        with open(self.path, "rb") as file:
+            file.seek(self.header.size)
+            buffer = b""
+            position = 0
+            bufferOffset = self.header.size
+            atEnd = False
+            while True:
+                if len(buffer) - position < self.maxRecordSize and not atEnd:
+                    chunk = file.read(self.chunkSize)
+                    atEnd = len(chunk) < self.chunkSize
+                    bufferOffset += position
+                    buffer = buffer[position:] + chunk
+                    position = 0
+                if position >= len(buffer):
+                    # No end record: the recording was cut off
+                    return
+
+                offset = bufferOffset + position
+                value = buffer[position]
+                try:
+                    if value == self.endMarker:
+                        ticks, position = self._ReadVarint(buffer, position + 1)
+                        games, position = self._ReadVarint(buffer, position)
+                        score, position = self._ReadVarint(buffer, position)
+                        if position != len(buffer) or (not atEnd and file.read(1)):
+                            raise ReplayError("data after the end record")
+                        self.end = (ticks, games, score)
+                        return
+                    count, position = self._ReadVarint(buffer, position + 1)
+                except ReplayError as e:
+                    raise ReplayError(f"{self.path}: {e} at byte {offset}") from None
+                if value & ~(self.inputJump | self.inputRestart) or count == 0:
+                    raise ReplayError(f"{self.path}: invalid run at byte {offset}")
+                yield tick, value, count, offset
+                tick += count
+
+    # Function to check a replay and collect its statistics
+    def Analyze(self):
+        ticks = 0
+        jumps = 0
+        restarts = 0
+        runs = 0
+        for _, value, count, _ in self.Runs():
+            runs += 1
+            ticks += count
+            if value & self.inputJump:
+                jumps += count
+            if value & self.inputRestart:
+                restarts += count
+
+        if self.end is not None:
+            endTicks, games, _ = self.end
+            if endTicks != ticks:
+                raise ReplayError(f"{self.path}: end record says {endTicks} ticks, the runs hold {ticks}")
+            # Restarts only count once the game is over
+            if games < 1 or games > restarts + 1:
+                raise ReplayError(f"{self.path}: end record says {games} games with {restarts} restart ticks")
+
+        return {
+            "seed": self.seed,
+            "timestep": self.timestep,
+            "ticks": ticks,
+            "seconds": ticks * self.timestep,
+            "runs": runs,
+            "jumps": jumps,
+            "restarts": restarts,
+            "complete": self.end is not None,
+            "games": self.end[1] if self.end else None,
+            "score": self.end[2] if self.end else None,
+        }
+
+    # Function to fast-forward to a tick without decoding anything past it
+    def Seek(self, targetTick):
+        jumps = 0
+        restarts = 0
+        for tick, value, count, offset in self.Runs():
+            if targetTick < tick + count:
+                return {"tick": targetTick, "input": value, "runStart": tick, "runLength": count,
+                        "offset": offset, "jumpsBefore": jumps, "restartsBefore": restarts}
+            if value & self.inputJump:
+                jumps += count
+            if value & self.inputRestart:
+                restarts += count
+        return None
+
+
+def FindReplays(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, directories, files in os.walk(path):
+                directories.sort()
+                for fileName in sorted(files):
+                    if fileName.endswith(".dreplay"):
+                        yield os.path.join(root, fileName)
+        else:
+            yield path
+
+
+def AnalyzeFile(path):
+    try:
+        return path, ReplayFile(path).Analyze(), None
+    except (OSError, ReplayError) as e:
+        return path, None, str(e)
+
+
+def DescribeInput(value):
+    names = [name for bit, name in ((ReplayFile.inputJump, "jump"), (ReplayFile.inputRestart, "restart")) if value & bit]
+    return "+".join(names) or "none"
+
+
+def Validate(paths, jobs):
+    failed = 0
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for path, result, error in pool.map(AnalyzeFile, FindReplays(paths), chunksize=16):
+            if error:
+                failed += 1
+                print_colored(error, 31)
+            elif not result["complete"]:
+                print_colored(f"{path}: cut off after {result['ticks']} ticks (no end record)", 33)
+            else:
+                print_colored(f"{path}: {result['ticks']} ticks, {result['games']} games, score {result['score']}", 32)
+    return failed == 0
+
+
+def PrintStats(paths, jobs):
+    totals = {"files": 0, "invalid": 0, "cutOff": 0, "ticks": 0, "seconds": 0.0, "jumps": 0, "games": 0}
+    scores = []
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for _, result, error in pool.map(AnalyzeFile, FindReplays(paths), chunksize=64):
+            totals["files"] += 1
+            if error:
+                totals["invalid"] += 1
+                continue
+            for key in ("ticks", "seconds", "jumps"):
+                totals[key] += result[key]
+            if result["complete"]:
+                totals["games"] += result["games"]
+                scores.append(result["score"])
+            else:
+                totals["cutOff"] += 1
+
+    scores.sort()
+    print("{files} replays ({invalid} invalid, {cutOff} cut off)".format(**totals))
+    print("{ticks} ticks, {seconds:.1f} s of play, {games} games, {jumps} jump ticks".format(**totals))
+    if scores:
+        print(f"Final score: mean {sum(scores) / len(scores):.2f}, median {scores[len(scores) // 2]}, "
+              f"min {scores[0]}, max {scores[-1]}")
+    return totals["invalid"] == 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate, seek in and summarize Dino replay files.")
+    parser.add_argument("-j", "--jobs", type=int, help="number of parallel parser processes")
+    commands = parser.add_subparsers(dest="command", required=True)
+    validateParser = commands.add_parser("validate", help="check replay files for corruption")
+    validateParser.add_argument("paths", nargs="+", help="replay files or directories of .dreplay files")
+    seekParser = commands.add_parser("seek", help="show the input at a tick")
+    seekParser.add_argument("path")
+    seekParser.add_argument("tick", type=int)
+    statsParser = commands.add_parser("stats", help="summarize a corpus of replays")
+    statsParser.add_argument("paths", nargs="+", help="replay files or directories of .dreplay files")
+    args = parser.parse_args()
+
+    if args.command == "validate":
+        sys.exit(0 if Validate(args.paths, args.jobs) else 1)
+    if args.command == "stats":
+        sys.exit(0 if PrintStats(args.paths, args.jobs) else 1)
+
+    try:
+        position = ReplayFile(args.path).Seek(args.tick)
+    except (OSError, ReplayError) as e:
+        print_colored(str(e), 31)
+        sys.exit(2)
+    if position is None:
+        print_colored(f"{args.path} ends before tick {args.tick}", 31)
+        sys.exit(1)
+    print(f"Tick {position['tick']}: input {DescribeInput(position['input'])} "
+          f"(run of {position['runLength']} ticks from tick {position['runStart']} at byte {position['offset']})")
+    print(f"{position['jumpsBefore']} jump and {position['restartsBefore']} restart ticks before it")
+    print(f"Watch from here with: dino_game --replay {args.path} --skip-to {args.tick}")
@@ -1,11 +1,93 @@
+import argparse
+
+parser = argparse.ArgumentParser(description="Validate and install the C++ toolchain.")
+parser.add_argument("--refresh", action="store_true",
+                    help="ignore the toolchain detection cache and probe every tool again")
+parser.add_argument("--yes", action="store_true",
+                    help="run unattended: install every tool that does not meet its requirement without asking")
+parser.add_argument("--install", metavar="TOOLS",
+                    help="run unattended, installing only these tools (comma separated, 'all' or 'none')")
+parser.add_argument("--config", help="run unattended with the settings in this JSON file")
+parser.add_argument("--report", help="with an unattended run, write a JSON report of every step to this file")
+parser.add_argument("--backend", choices=["apt", "dnf", "pacman", "tarball"],
+                    help="on Linux, install through this package manager (or release tarballs) instead of the first one found")
+parser.add_argument("-j", "--jobs", type=int, help="with an unattended run, the number of installs run at once")
+parser.add_argument("--trace", metavar="FILE",
+                    help="record timed spans to FILE (Chrome trace JSON, or JSON lines if it ends in .jsonl)")
+parser.add_argument("--profile", action="store_true", help="print where the time went when the setup ends")
+args = parser.parse_args()
+
+if args.trace or args.profile:
+    import atexit
+    from Utils import Tracer
+
+    Tracer.Enable()
+    # Also runs when an unattended run leaves through sys.exit
+    atexit.register(Tracer.Finish, args.trace, args.profile)
+
+if args.yes or args.install is not None or args.config or args.report:
+    import sys
+    from Provision import ExitUsage, ProvisionError, ProvisionOptions, Provisioner
+
+    try:
+        options = ProvisionOptions.Load(args.config) if args.config else ProvisionOptions()
+        if args.install is not None:
+            options.install = ProvisionOptions.ParseInstall(args.install)
+    except ProvisionError as e:
+        print(e, file=sys.stderr)
+        sys.exit(ExitUsage)
+    options.refresh = options.refresh or args.refresh
+    options.report = args.report or options.report
+    options.jobs = args.jobs or options.jobs
+    options.backend = args.backend or options.backend
+    sys.exit(Provisioner(options).Run())
+
+import sys
+
+from Utils import Tracer
 from SetupPython import PythonConfiguration as PythonRequirements
 # Make sure everything we need for the setup is installed
-PythonRequirements.Validate()
+with Tracer.Span("validate python", "phase"):
+    PythonRequirements.Validate()
 
+from ToolProbe import ToolProbe
+from DetectionCache import DetectionCache
 from SetupBuildTools import BuildToolsConfiguration as BuildRequirements
-# Make sure CMake and Ninja are insalled correctly
-BuildRequirements.Validate()
-
 from SetupClang import ClangConfiguration as ClangRequirements
-# Make sure Clang is installed correctly
-ClangRequirements.Validate()
\ No newline at end of file
+from Versions import CheckAll
+
+DetectionCache.enabled = not args.refresh
+
+# Query every tool version at once before any prompt is shown
+with Tracer.Span("probe tools", "phase"):
+    probes = ToolProbe.RunAll({**BuildRequirements.Probes(), **ClangRequirements.Probes()})
+ToolProbe.PrintReport(probes)
+
+# Check every version against the requirement table in one pass
+with Tracer.Span("check versions", "phase"):
+    checks = CheckAll(probes)
+
+if sys.platform.startswith("linux"):
+    with Tracer.Span("toolchain", "phase"):
+        reporters = {
+            "cmake": BuildRequirements.CheckCMakeInstallation,
+            "ninja": BuildRequirements.CheckNinjaInstallation,
+            "clang": ClangRequirements.CheckClangInstallation,
+            "clangd": ClangRequirements.CheckClangdInstallation,
+        }
+        missing = [name for name, check in checks.items() if not reporters[name](check)]
+        if missing:
+            import PackageManagers
+
+            # One question and one package-manager transaction for every missing tool
+            PackageManagers.InstallMissing(missing, args.backend)
+else:
+    # Make sure CMake and Ninja are insalled correctly (includes time spent at prompts)
+    with Tracer.Span("build tools", "phase"):
+        BuildRequirements.Validate(checks)
+
+    # Make sure Clang is installed correctly (includes time spent at prompts)
+    with Tracer.Span("clang", "phase"):
+        ClangRequirements.Validate(checks)
+
+DetectionCache.Save()
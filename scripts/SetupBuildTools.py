@@ -1,63 +1,65 @@
-import subprocess
 import sys
 
-from Utils import print_colored
+from Utils import print_colored, RunProcess
+from ToolProbe import ToolProbe
+from DetectionCache import DetectionCache
+from Versions import ToolRequirements
 
 class BuildToolsConfiguration:
-    requiredCMakeVersion = "3.28"
-    requiredNinjaVersion = "1.10.0"
+    requiredCMakeVersion = ToolRequirements["cmake"].range.Describe()
+    requiredNinjaVersion = ToolRequirements["ninja"].range.Describe()
 
     @classmethod
-    def Validate(cls):
-        cls.InstallBuildTools()
+    def Probes(cls):
+        return {
+            "cmake": ["cmake", "--version"],
+            "ninja": ["ninja", "--version"],
+        }
 
     @classmethod
-    def CheckCMakeInstallation(cls):
-        try:
-            # Check CMake version
-            cmake_version_output = subprocess.check_output(
-                ["cmake", "--version"], text=True
-            )
-            cmake_version = cmake_version_output.strip().split()[2]
-
-            if cmake_version >= cls.requiredCMakeVersion:
-                print_colored(f"CMake {cmake_version} is installed.", 32)
-                return True
-            else:
-                print_colored(
-                    f"CMake {cls.requiredCMakeVersion} is required but version {cmake_version} is installed.",
-                    31,
-                )
-                return False
-        except FileNotFoundError:
+    def Validate(cls, checks=None):
+        cls.InstallBuildTools(checks)
+
+    @classmethod
+    def CheckCMakeInstallation(cls, check=None):
+        # Check CMake version
+        if check is None:
+            check = ToolRequirements["cmake"].Check(ToolProbe.Run("cmake", cls.Probes()["cmake"]))
+        if check.version is None:
             return False
 
+        if check.satisfied:
+            print_colored(f"CMake {check.Describe()} is installed.", 32)
+            return True
+        print_colored(
+            f"CMake {cls.requiredCMakeVersion} is required but version {check.Describe()} is installed.",
+            31,
+        )
+        return False
+
     @classmethod
-    def CheckNinjaInstallation(cls):
-        try:
-            # Check Ninja version
-            ninja_version_output = subprocess.check_output(
-                ["ninja", "--version"], text=True
-            )
-            ninja_version = ninja_version_output.strip()
-
-            if ninja_version >= cls.requiredNinjaVersion:
-                print_colored(f"Ninja {ninja_version} is installed.", 32)
-                return True
-            else:
-                print_colored(
-                    f"Ninja {cls.requiredNinjaVersion} is required but version {ninja_version} is installed.",
-                    31,
-                )
-                return False
-        except FileNotFoundError:
+    def CheckNinjaInstallation(cls, check=None):
+        # Check Ninja version
+        if check is None:
+            check = ToolRequirements["ninja"].Check(ToolProbe.Run("ninja", cls.Probes()["ninja"]))
+        if check.version is None:
             return False
 
+        if check.satisfied:
+            print_colored(f"Ninja {check.Describe()} is installed.", 32)
+            return True
+        print_colored(
+            f"Ninja {cls.requiredNinjaVersion} is required but version {check.Describe()} is installed.",
+            31,
+        )
+        return False
+
     @classmethod
-    def InstallBuildTools(cls):
+    def InstallBuildTools(cls, checks=None):
+        checks = checks or {}
         permissionGranted = False
-        isCMakeInstalled = cls.CheckCMakeInstallation()
-        isNinjaInstalled = cls.CheckNinjaInstallation()
+        isCMakeInstalled = cls.CheckCMakeInstallation(checks.get("cmake"))
+        isNinjaInstalled = cls.CheckNinjaInstallation(checks.get("ninja"))
         if not isCMakeInstalled:
             while not permissionGranted:
                     print_colored(
@@ -78,10 +80,7 @@ class BuildToolsConfiguration:
             
 
         if permissionGranted:
-            if sys.platform.startswith("win"):
-                cls.InstallCMakeOnWindows()
-            else:
-                print_colored(f"Platform '{sys.platform}' is not supported.", 31)
+            cls.InstallCMake()
 
         permissionGranted = False
         if not isNinjaInstalled:
@@ -99,41 +98,65 @@ class BuildToolsConfiguration:
                     permissionGranted = reply == "y"
 
             if permissionGranted:
-                if sys.platform.startswith("win"):
-                    cls.InstallNinjaOnWindows()
-                else:
-                    print_colored(f"Platform '{sys.platform}' is not supported.", 31)
+                cls.InstallNinja()
+
+    # Arguments that keep winget from asking for agreements on unattended machines
+    wingetUnattendedArguments = ["--silent", "--accept-package-agreements", "--accept-source-agreements"]
+
+    @classmethod
+    def InstallCMake(cls, unattended=False):
+        if sys.platform.startswith("win"):
+            return cls.InstallCMakeOnWindows(unattended)
+        from PackageManagers import InstallTools
+        return InstallTools(["cmake"], unattended=unattended)
 
     @classmethod
-    def InstallCMakeOnWindows(cls):
+    def InstallNinja(cls, unattended=False):
+        if sys.platform.startswith("win"):
+            return cls.InstallNinjaOnWindows(unattended)
+        from PackageManagers import InstallTools
+        return InstallTools(["ninja"], unattended=unattended)
+
+    @classmethod
+    def InstallCMakeOnWindows(cls, unattended=False):
+        import subprocess
+
         try:
-            subprocess.run(
-                ["winget", "install", "cmake"],
+            RunProcess(
+                ["winget", "install", "cmake"] + (cls.wingetUnattendedArguments if unattended else []),
                 check=True,
             )
-            print_colored(
-                f"CMake {cls.requiredCMakeVersion} has been installed successfully.", 32
-            )
-        except subprocess.CalledProcessError:
+            installed = ToolProbe.DescribeInstalled("cmake", "CMake", cls.Probes()["cmake"])
+            print_colored(f"{installed} has been installed successfully.", 32)
+            return True
+        except (subprocess.CalledProcessError, OSError):
             print_colored(
                 f"Failed to install CMake {cls.requiredCMakeVersion}. Please install it manually.",
                 31,
             )
+            return False
 
     @classmethod
-    def InstallNinjaOnWindows(cls):
+    def InstallNinjaOnWindows(cls, unattended=False):
+        import subprocess
+
         try:
-            subprocess.run(["winget", "install", "ninja-build.Ninja"], check=True)
-            print_colored(
-                f"Ninja {cls.requiredNinjaVersion} has been installed successfully.", 32
+            RunProcess(
+                ["winget", "install", "ninja-build.Ninja"] + (cls.wingetUnattendedArguments if unattended else []),
+                check=True,
             )
-        except subprocess.CalledProcessError:
+            installed = ToolProbe.DescribeInstalled("ninja", "Ninja", cls.Probes()["ninja"])
+            print_colored(f"{installed} has been installed successfully.", 32)
+            return True
+        except (subprocess.CalledProcessError, OSError):
             print_colored(
                 f"Failed to install Ninja {cls.requiredNinjaVersion}. Please install it manually.",
                 31,
             )
+            return False
 
 # Main execution block
 if __name__ == "__main__":
     # Validate the CMake and Ninja installation
-    BuildToolsConfiguration.Validate()
\ No newline at end of file
+    BuildToolsConfiguration.Validate()
+    DetectionCache.Save()
\ No newline at end of file
@@ -1,66 +1,80 @@
 import os
-import subprocess
 import sys
-import re
 
 import Utils as Utils
-from Utils import print_colored
+from Utils import print_colored, RunProcess
+from ToolProbe import ToolProbe
+from DetectionCache import DetectionCache
+from Versions import ToolRequirements
 
-if sys.platform.startswith("win"):
-    import winreg as reg
+# subprocess and winreg are imported by the methods that install or edit the registry
 
 # Class for managing Clang configuration and validation
 
 class ClangConfiguration:
-    requiredClangVersion = "18.0.0"
-    requiredClangdVersion = requiredClangVersion
+    requiredClangVersion = ToolRequirements["clang"].range.Describe()
+    requiredClangdVersion = ToolRequirements["clangd"].range.Describe()
+    msys2Path = "C:/msys64"
+    msys2Installer = "https://github.com/msys2/msys2-installer/releases/download/2024-07-27/msys2-x86_64-20240727.exe"
+    # Expected SHA-256 of the MSYS2 installer; the download is verified when this is set
+    msys2InstallerSha256 = None
 
     @classmethod
-    def Validate(cls):
-        if not cls.CheckClangInstallation():
+    def Probes(cls):
+        return {
+            "clang": ["clang", "--version"],
+            "clangd": ["clangd", "--version"],
+        }
+
+    @classmethod
+    def Validate(cls, checks=None):
+        checks = checks or {}
+        # Gather both verdicts before prompting for any install
+        isClangInstalled = cls.CheckClangInstallation(checks.get("clang"))
+        isClangdInstalled = cls.CheckClangdInstallation(checks.get("clangd"))
+        if not isClangInstalled:
             print_colored(
-                "Clang is not installed or has an incompatible version. Engine needs clang >= 18.0.0", 31)
+                f"Clang is not installed or has an incompatible version. Engine needs clang {cls.requiredClangVersion}", 31)
             cls.InstallClang()
-        if not cls.CheckClangdInstallation():
-            print_colored("Clangd is not installed or has an incompatible version. Engine needs clangd >= 18.0.0. Please ensure clangd has the same version as your installed compiler.", 31)
+        if not isClangdInstalled:
+            print_colored(f"Clangd is not installed or has an incompatible version. Engine needs clangd {cls.requiredClangdVersion}. Please ensure clangd has the same version as your installed compiler.", 31)
             cls.InstallClangd()
 
     @classmethod
-    def CheckClangInstallation(cls):
-        try:
-            # Check Clang version
-            output = subprocess.check_output(
-                ["clang", "--version"], text=True)
-            clang_version = output.strip().split()[2]
+    def CheckClangInstallation(cls, check=None):
+        # Check Clang version
+        if check is None:
+            check = ToolRequirements["clang"].Check(ToolProbe.Run("clang", cls.Probes()["clang"]))
+        if check.version is None:
+            return False
 
-            match = re.search(r'InstalledDir:\s*(.*)', output)
-            installation_dir = match.group(1).strip()
+        installation_dir = "unknown location"
+        for line in check.probe.output.splitlines():
+            if line.startswith("InstalledDir:"):
+                installation_dir = line[len("InstalledDir:"):].strip()
+        check.probe.Remember(installDir=installation_dir)
 
-            if clang_version >= cls.requiredClangVersion:
-                print_colored(
-                    f"Clang {clang_version} is installed. ({installation_dir})", 32)
-                return True
+        if check.satisfied:
             print_colored(
-                f"Clang {cls.requiredClangVersion} is required but version {clang_version} is installed.", 33)
-            return False
-        except FileNotFoundError:
-            return False
+                f"Clang {check.Describe()} is installed. ({installation_dir})", 32)
+            return True
+        print_colored(
+            f"Clang {cls.requiredClangVersion} is required but version {check.Describe()} is installed.", 33)
+        return False
 
     @classmethod
-    def CheckClangdInstallation(cls):
-        try:
-            output = subprocess.check_output(
-                ["clangd", "--version"], text=True)
-            clangd_version = output.strip().split()[2]
+    def CheckClangdInstallation(cls, check=None):
+        if check is None:
+            check = ToolRequirements["clangd"].Check(ToolProbe.Run("clangd", cls.Probes()["clangd"]))
+        if check.version is None:
+            return False
 
-            if clangd_version >= cls.requiredClangdVersion:
-                print_colored(f"Clangd {clangd_version} is installed.", 32)
-                return True
+        if check.satisfied:
+            print_colored(f"Clangd {check.Describe()} is installed.", 32)
+            return True
 
-            print_colored(f"Clangd {cls.requiredClangdVersion} is required but version {clangd_version} is installed.", 33)
-            return False
-        except FileNotFoundError:
-            return False
+        print_colored(f"Clangd {cls.requiredClangdVersion} is required but version {check.Describe()} is installed.", 33)
+        return False
 
     @classmethod
     def InstallClangd(cls):
@@ -74,15 +88,10 @@ class ClangConfiguration:
             permission_granted = reply == 'y'
 
         if sys.platform.startswith("win"):
-            msys2_path = "C:/msys64"
-            clangd_command = f"{msys2_path}/usr/bin/bash -lc 'pacman -Sy --noconfirm mingw-w64-x86_64-clang-tools-extra"
-            try:
-                subprocess.run(clangd_command, shell=True, check=True)
-                print_colored(
-                    f"Clangd {cls.requiredClangdVersion} has been installed successfully.", 32)
-            except subprocess.CalledProcessError:
-                print_colored(
-                    f"Failed to install Clang {cls.requiredClangdVersion}. Please install it manually (https://packages.msys2.org/packages/mingw-w64-x86_64-clang-tools-extra)", 31)
+            cls.InstallClangdPackage()
+        else:
+            from PackageManagers import InstallTools
+            InstallTools(["clangd"])
 
     @classmethod
     def InstallClang(cls):
@@ -104,96 +113,119 @@ class ClangConfiguration:
             cls.UpdateMSYS2Keys()
 
             # Use MSYS2 to install Clang
-            msys2_path = "C:/msys64"
-            clang_command = f"{msys2_path}/usr/bin/bash -lc 'pacman -Sy --noconfirm mingw-w64-x86_64-clang'"
-
-            try:
-                subprocess.run(clang_command, shell=True, check=True)
-                print_colored(
-                    f"Clang {cls.requiredClangVersion} has been installed successfully.", 32)
-            except subprocess.CalledProcessError:
-                print_colored(
-                    f"Failed to install Clang {cls.requiredClangVersion}. Please install it manually (https://packages.msys2.org/packages/mingw-w64-x86_64-clang)", 31)
+            cls.InstallClangPackage()
 
             # Add the installed Clang to PATH on Windows
-            clang_path = os.path.join(msys2_path, "mingw64", "bin")
-            clang_lib = os.path.join(msys2_path, "mingw64", "lib")
-            clang_include = os.path.join(msys2_path, "mingw64", "include")
-            cls.SetEnvironmentVariable(clang_path)
-            cls.SetEnvironmentVariable(clang_lib)
-            cls.SetEnvironmentVariable(clang_include)
+            cls.AddClangToPath()
+        else:
+            from PackageManagers import InstallTools
+            InstallTools(["clang"])
 
-    @staticmethod
-    def SetEnvironmentVariable(var_value, user=True):
-        try:
-            # Choose the registry key based on whether it's for user or system
-            if user:
-                reg_key = reg.HKEY_CURRENT_USER
-                reg_path = r'Environment'
-            else:
-                reg_key = reg.HKEY_LOCAL_MACHINE
-                reg_path = r'SYSTEM\CurrentControlSet\Control\Session Manager\Environment'
+    @classmethod
+    def InstallClangPackage(cls):
+        import subprocess
 
-            # Open the registry key for editing
-            with reg.OpenKey(reg_key, reg_path, 0, reg.KEY_SET_VALUE | reg.KEY_QUERY_VALUE) as key:
-                # Get the current value of the Path variable
-                current_path, _ = reg.QueryValueEx(key, "Path")
+        clang_command = f"{cls.msys2Path}/usr/bin/bash -lc 'pacman -Sy --noconfirm mingw-w64-x86_64-clang'"
+        try:
+            RunProcess(clang_command, shell=True, check=True)
+            # Probe the MSYS2 binary itself; its directory is not on this shell's PATH yet
+            installed = ToolProbe.DescribeInstalled(
+                "clang", "Clang", [os.path.join(cls.msys2Path, "mingw64", "bin", "clang"), "--version"])
+            print_colored(f"{installed} has been installed successfully.", 32)
+            return True
+        except subprocess.CalledProcessError:
+            print_colored(
+                f"Failed to install Clang {cls.requiredClangVersion}. Please install it manually (https://packages.msys2.org/packages/mingw-w64-x86_64-clang)", 31)
+            return False
 
-                if var_value not in current_path:
-                    # Append the new path to the current Path variable
-                    updated_path = current_path + ';' + var_value
+    @classmethod
+    def InstallClangdPackage(cls):
+        import subprocess
 
-                    # Set the updated Path value
-                    reg.SetValueEx(key, "Path", 0, reg.REG_EXPAND_SZ, updated_path)
+        clangd_command = f"{cls.msys2Path}/usr/bin/bash -lc 'pacman -Sy --noconfirm mingw-w64-x86_64-clang-tools-extra'"
+        try:
+            RunProcess(clangd_command, shell=True, check=True)
+            # Probe the MSYS2 binary itself; its directory is not on this shell's PATH yet
+            installed = ToolProbe.DescribeInstalled(
+                "clangd", "Clangd", [os.path.join(cls.msys2Path, "mingw64", "bin", "clangd"), "--version"])
+            print_colored(f"{installed} has been installed successfully.", 32)
+            return True
+        except subprocess.CalledProcessError:
+            print_colored(
+                f"Failed to install Clangd {cls.requiredClangdVersion}. Please install it manually (https://packages.msys2.org/packages/mingw-w64-x86_64-clang-tools-extra)", 31)
+            return False
 
-                    print(f"Added '{var_value}' to Path successfully.")
-                else:
-                    print(f"'{var_value}' is already in the Path.")
-            os.system('setx PATH "{}"'.format(updated_path))
-    
-        except Exception as e:
-            print(f"Failed to update Path: {e}")
+    @classmethod
+    def AddClangToPath(cls):
+        from Environment import EnvironmentUpdate
 
+        clang_path = os.path.join(cls.msys2Path, "mingw64", "bin")
+        clang_lib = os.path.join(cls.msys2Path, "mingw64", "lib")
+        clang_include = os.path.join(cls.msys2Path, "mingw64", "include")
+        # One registry read, one write and one broadcast for all three
+        return EnvironmentUpdate().AddPath(clang_path, clang_lib, clang_include).Apply()
 
     @staticmethod
-    def InstallMSYS2():
+    def SetEnvironmentVariable(var_value, user=True):
+        from Environment import DefaultBackend, EnvironmentUpdate
+
+        return EnvironmentUpdate(DefaultBackend(user)).AddPath(var_value).Apply()
+
+    @classmethod
+    def InstallMSYS2(cls, unattended=False):
         # Download and install MSYS2
-        msys2_installer = "https://github.com/msys2/msys2-installer/releases/download/2024-07-27/msys2-x86_64-20240727.exe"
-        msys2_path = "C:/msys64"
-        if not os.path.exists(msys2_path):
+        if not os.path.exists(cls.msys2Path):
             # Download the MSYS2 installer to the current directory
-            msys2_installer = "https://github.com/msys2/msys2-installer/releases/download/2024-07-27/msys2-x86_64-20240727.exe"
-            msys2_installer_filename = os.path.basename(msys2_installer)
+            msys2_installer_filename = os.path.basename(cls.msys2Installer)
             msys2_installer_path = "Raven/vendor/" + msys2_installer_filename
 
             print("Downloading MSYS2 installer...")
-            Utils.DownloadFile(msys2_installer, msys2_installer_path)
+            try:
+                Utils.DownloadFile(cls.msys2Installer, msys2_installer_path,
+                                   sha256=cls.msys2InstallerSha256)
+            except Exception as e:
+                print_colored(f"Failed to download the MSYS2 installer: {e}", 31)
+                return False
 
             # Run the installer
             print_colored("Running installer...", 36)
-            os.system(os.path.abspath(msys2_installer_path))
+            if unattended:
+                # The installer's command line mode needs no window and no clicks
+                result = RunProcess([os.path.abspath(msys2_installer_path), "in", "--confirm-command",
+                                         "--accept-messages", "--root", cls.msys2Path])
+                if result.returncode != 0:
+                    print_colored(f"The MSYS2 installer exited with code {result.returncode}.", 31)
+                    return False
+            else:
+                with Utils.Tracer.Span(msys2_installer_filename, "subprocess"):
+                    os.system(os.path.abspath(msys2_installer_path))
 
-            # Prompt the user to continue after the installer completes
-            print_colored(
-                input("Press Enter to continue after MSYS2 installation..."), 36)
+                # Prompt the user to continue after the installer completes
+                print_colored(
+                    input("Press Enter to continue after MSYS2 installation..."), 36)
 
             print_colored("MSYS2 installed successfully.", 32)
         else:
             print_colored("MSYS2 is already installed.", 32)
+        return True
+
+    @classmethod
+    def UpdateMSYS2Keys(cls):
+        import subprocess
 
-    @staticmethod
-    def UpdateMSYS2Keys():
-        msys2_path = "C:/msys64"
         try:
-            subprocess.run(
-                f"{msys2_path}/usr/bin/bash -lc 'pacman-key --init'", shell=True, check=True)
-            subprocess.run(
-                f"{msys2_path}/usr/bin/bash -lc 'pacman-key --refresh-keys'", shell=True, check=True)
-            subprocess.run(
-                f"{msys2_path}/usr/bin/bash -lc 'pacman -Syu'", shell=True, check=True)
+            RunProcess(
+                f"{cls.msys2Path}/usr/bin/bash -lc 'pacman-key --init'", shell=True, check=True)
+            RunProcess(
+                f"{cls.msys2Path}/usr/bin/bash -lc 'pacman-key --refresh-keys'", shell=True, check=True)
+            RunProcess(
+                f"{cls.msys2Path}/usr/bin/bash -lc 'pacman -Syu --noconfirm'", shell=True, check=True)
+            return True
         except subprocess.CalledProcessError:
             print_colored("Failed to run the necessary msys2 commands. Please open a bug report.", 31)
+            return False
 
 
 if __name__ == "__main__":
     ClangConfiguration.Validate()
+    DetectionCache.Save()
@@ -1,13 +1,16 @@
 import sys
-import subprocess
 import importlib.util as importlib_util
-from Utils import print_colored
+from Utils import print_colored, RunProcess
 
 class PythonConfiguration:
+    # Set by unattended provisioning: install missing packages without asking
+    assumeYes = False
+
     @classmethod
     def Validate(cls):
         if not cls.__ValidatePython():
-            return # cannot validate further
+            return False # cannot validate further
+        return True
         
     @classmethod
     def __ValidatePython(cls, versionMajor = 3, versionMinor = 3):
@@ -32,7 +35,7 @@ class PythonConfiguration:
 
     @classmethod
     def __InstallPackage(cls, packageName):
-        permissionGranted = False
+        permissionGranted = cls.assumeYes
         while not permissionGranted:
             reply = str(input("Would you like to install Python package '{0:s}'? [Y/N]: ".format(packageName))).lower().strip()[:1]
             if reply == 'n':
@@ -40,7 +43,7 @@ class PythonConfiguration:
             permissionGranted = (reply == 'y')
 
         print_colored(f"Installing {packageName} module...", 36)
-        subprocess.check_call(['python', '-m', 'pip', 'install', packageName])
+        RunProcess(['python', '-m', 'pip', 'install', packageName], check=True)
 
         return cls.__ValidatePackage(packageName)
 
@@ -0,0 +1,114 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from Utils import print_colored
+from Build import Builder, FindCompiler, HeadlessTarget
+
+# Runs many headless Dino games in parallel and collects their scores and
+# frame counts. Each worker process plays a contiguous range of seeds, so the
+# same arguments always produce the same results.
+
+
+class Simulation:
+    def __init__(self, executable, policy="reactive", maxFrames=None, deltaTime=None, script=None,
+                 recordDirectory=None):
+        self.executable = executable
+        self.arguments = ["--policy", policy]
+        if maxFrames is not None:
+            self.arguments += ["--max-frames", str(maxFrames)]
+        if deltaTime is not None:
+            self.arguments += ["--dt", repr(deltaTime)]
+        if script is not None:
+            self.arguments += ["--script", os.path.abspath(script)]
+        if recordDirectory is not None:
+            os.makedirs(recordDirectory, exist_ok=True)
+            self.arguments += ["--record-dir", os.path.abspath(recordDirectory)]
+
+    def RunBatch(self, firstSeed, games):
+        output = subprocess.run(
+            [self.executable, "--seed", str(firstSeed), "--games", str(games)] + self.arguments,
+            check=True, capture_output=True, text=True,
+        ).stdout
+        results = []
+        for line in output.splitlines():
+            seed, score, frames = line.split()
+            results.append({"seed": int(seed), "score": int(score), "frames": int(frames)})
+        return results
+
+    def Run(self, firstSeed, games, jobs=None):
+        jobs = jobs or os.cpu_count() or 1
+        # A few batches per worker keeps every core busy when games differ in length
+        batchCount = min(games, jobs * 4)
+        batches = []
+        seed = firstSeed
+        for index in range(batchCount):
+            count = games // batchCount + (1 if index < games % batchCount else 0)
+            batches.append((seed, count))
+            seed += count
+
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            futures = [pool.submit(self.RunBatch, *batch) for batch in batches]
+            return [result for future in futures for result in future.result()]
+
+    @staticmethod
+    def Summarize(results, elapsed):
+        scores = sorted(result["score"] for result in results)
+        frames = sum(result["frames"] for result in results)
+        return {
+            "games": len(results),
+            "frames": frames,
+            "elapsed": elapsed,
+            "gamesPerSecond": len(results) / elapsed if elapsed else 0.0,
+            "framesPerSecond": frames / elapsed if elapsed else 0.0,
+            "meanScore": sum(scores) / len(scores) if scores else 0.0,
+            "medianScore": scores[len(scores) // 2] if scores else 0,
+            "minScore": scores[0] if scores else 0,
+            "maxScore": scores[-1] if scores else 0,
+        }
+
+
+def BuildHeadless(compiler=None):
+    builder = Builder(compiler or FindCompiler())
+    outputPath, _ = builder.Build(HeadlessTarget)
+    return outputPath
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run many headless Dino games and report their scores.")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1, help="seed of the first game")
+    parser.add_argument("--policy", choices=["reactive", "random"], default="reactive")
+    parser.add_argument("--script", help="file with the frame numbers at which jump is pressed")
+    parser.add_argument("--max-frames", type=int, help="stop a game after this many frames")
+    parser.add_argument("--dt", type=float, help="fixed timestep in seconds (default 1/60)")
+    parser.add_argument("-j", "--jobs", type=int, help="number of parallel simulation processes")
+    parser.add_argument("--compiler", help="C++ compiler to use instead of the validated Clang")
+    parser.add_argument("--record-dir", help="write a replay of every game to this directory (see Replay.py)")
+    parser.add_argument("--json", help="write every game's result and the summary to this file")
+    args = parser.parse_args()
+
+    try:
+        executable = BuildHeadless(args.compiler)
+    except subprocess.CalledProcessError:
+        print_colored("Failed to build the headless simulation.", 31)
+        sys.exit(1)
+
+    simulation = Simulation(executable, args.policy, args.max_frames, args.dt, args.script, args.record_dir)
+    startTime = time.perf_counter()
+    results = simulation.Run(args.seed, args.games, args.jobs)
+    summary = Simulation.Summarize(results, time.perf_counter() - startTime)
+
+    print(
+        "{games} games, {frames} frames in {elapsed:.2f} s "
+        "({gamesPerSecond:.0f} games/s, {framesPerSecond:.0f} frames/s)".format(**summary)
+    )
+    print("Score: mean {meanScore:.2f}, median {medianScore}, min {minScore}, max {maxScore}".format(**summary))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as jsonFile:
+            json.dump({"summary": summary, "games": results}, jsonFile, indent=2)
@@ -0,0 +1,208 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from Utils import print_colored
+
+# Measures what Setup.py costs on top of a bare interpreter when the toolchain
+# is already fine and every probe is answered from the detection cache. It
+# reads 'python -X importtime' for the modules Setup.py loads beyond what the
+# interpreter loads by itself, and fails when their import time grows past a
+# baseline recorded on the same machine (or an absolute budget, if one is
+# given) or when a module that only downloads, extracts or edits the registry
+# need shows up. On POSIX systems stub tools stand in for the toolchain; on
+# Windows the installed tools are used.
+
+ScriptsDirectory = os.path.dirname(os.path.abspath(__file__))
+
+# Modules the fast path must never load
+HeavyModules = ["urllib.request", "http.client", "ssl", "zipfile", "subprocess", "concurrent.futures", "winreg"]
+
+StubBanners = {
+    "cmake": "cmake version 3.30.0",
+    "ninja": "1.12.1",
+    "clang": "clang version 18.1.8\nInstalledDir: /opt/stub/bin",
+    "clangd": "clangd version 18.1.8",
+}
+
+
+def WriteStubTools(directory, latency=0.0):
+    for name, banner in StubBanners.items():
+        path = os.path.join(directory, name)
+        with open(path, "w", encoding="utf-8") as stub:
+            stub.write("#!/bin/sh\n")
+            if latency:
+                stub.write(f"sleep {latency:g}\n")
+            for line in banner.splitlines():
+                stub.write(f"echo '{line}'\n")
+        os.chmod(path, 0o755)
+
+
+# Function to parse the stderr of 'python -X importtime' into {module: self time in ms}
+
+
+def ParseImportTimes(stderr):
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        selfTime, _, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(selfTime) / 1000
+    return times
+
+
+class StartupBenchmark:
+    def __init__(self, runs=5, useStubs=None):
+        self.runs = runs
+        self.useStubs = not sys.platform.startswith("win") if useStubs is None else useStubs
+
+    def _Environment(self, directory):
+        environment = dict(os.environ)
+        # A private detection cache, warmed by the first run
+        environment["XDG_CACHE_HOME"] = directory
+        environment["LOCALAPPDATA"] = directory
+        # Users run with bytecode, so it is allowed and kept in the private directory;
+        # the warmup runs compile it before anything is measured
+        environment.pop("PYTHONDONTWRITEBYTECODE", None)
+        environment["PYTHONPYCACHEPREFIX"] = os.path.join(directory, "pycache")
+        if self.useStubs:
+            WriteStubTools(directory)
+            environment["PATH"] = directory + os.pathsep + environment.get("PATH", "")
+        return environment
+
+    def _Run(self, arguments, environment):
+        startTime = time.perf_counter()
+        result = subprocess.run([sys.executable] + arguments, cwd=ScriptsDirectory, env=environment,
+                                stdin=subprocess.DEVNULL, capture_output=True, text=True)
+        return result, (time.perf_counter() - startTime) * 1000
+
+    def Run(self):
+        with tempfile.TemporaryDirectory() as directory:
+            environment = self._Environment(directory)
+            self._Run(["-c", "pass"], environment)
+            warmup, _ = self._Run(["Setup.py"], environment)
+            if warmup.returncode != 0:
+                raise RuntimeError(f"Setup.py failed while warming the cache:\n{warmup.stdout}{warmup.stderr}")
+
+            baseModules = set()
+            extraTimes = []
+            moduleTimes = {}
+            bareWall = []
+            setupWall = []
+            for _ in range(self.runs):
+                bare, _ = self._Run(["-X", "importtime", "-c", "pass"], environment)
+                baseModules |= set(ParseImportTimes(bare.stderr))
+                setup, _ = self._Run(["-X", "importtime", "Setup.py"], environment)
+                if setup.returncode != 0:
+                    raise RuntimeError(f"Setup.py failed:\n{setup.stdout}{setup.stderr}")
+                times = ParseImportTimes(setup.stderr)
+                extra = {name: value for name, value in times.items() if name not in baseModules}
+                extraTimes.append(sum(extra.values()))
+                for name, value in extra.items():
+                    moduleTimes.setdefault(name, []).append(value)
+
+                # Wall-clock time without the importtime overhead
+                bareWall.append(self._Run(["-c", "pass"], environment)[1])
+                setupWall.append(self._Run(["Setup.py"], environment)[1])
+
+        return {
+            "runs": self.runs,
+            "python": platform.python_version(),
+            "platform": sys.platform,
+            "stubTools": self.useStubs,
+            "importMs": statistics.median(extraTimes),
+            "bareWallMs": statistics.median(bareWall),
+            "setupWallMs": statistics.median(setupWall),
+            "heavyModules": sorted(name for name in moduleTimes if name in HeavyModules),
+            "modules": dict(sorted(((name, statistics.median(values)) for name, values in moduleTimes.items()),
+                                   key=lambda item: item[1], reverse=True)),
+        }
+
+
+# Function to read the stored baseline; None when there is none yet
+
+
+def LoadBaseline(path):
+    try:
+        with open(path, "r", encoding="utf-8") as baselineFile:
+            return json.load(baselineFile)
+    except (OSError, ValueError):
+        return None
+
+
+def SaveBaseline(path, result):
+    with open(path, "w", encoding="utf-8") as baselineFile:
+        json.dump({key: result[key] for key in ("python", "platform", "stubTools", "importMs")}, baselineFile,
+                  indent=2)
+
+
+def PrintResult(result, baseline, threshold, minDeltaMs, budget, top):
+    print(f"Bare interpreter:  {result['bareWallMs']:.1f} ms")
+    print(f"Setup.py (cached): {result['setupWallMs']:.1f} ms "
+          f"(+{result['setupWallMs'] - result['bareWallMs']:.1f} ms)")
+    print(f"Imports beyond the bare interpreter: {result['importMs']:.1f} ms")
+    for name, value in list(result["modules"].items())[:top]:
+        print(f"  {name:<32}{value:>8.2f} ms")
+
+    passed = True
+    if result["heavyModules"]:
+        print_colored(f"Loaded on the fast path: {', '.join(result['heavyModules'])}", 31)
+        passed = False
+    if baseline is not None:
+        # Slower by a percentage and by an absolute margin, so sub-millisecond jitter never fails
+        limit = max(baseline["importMs"] * (1 + threshold / 100), baseline["importMs"] + minDeltaMs)
+        print(f"Baseline: {baseline['importMs']:.1f} ms, limit {limit:.1f} ms")
+        if result["importMs"] > limit:
+            print_colored(f"Import time {result['importMs']:.1f} ms is over the {limit:.1f} ms limit.", 31)
+            passed = False
+    if budget is not None and result["importMs"] > budget:
+        print_colored(f"Import time {result['importMs']:.1f} ms is over the {budget:g} ms budget.", 31)
+        passed = False
+    if passed:
+        print_colored("Startup is within budget.", 32)
+    return passed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check how much Setup.py adds to interpreter startup.")
+    parser.add_argument("--runs", type=int, default=5, help="measured runs; medians are reported")
+    parser.add_argument("--baseline", default="startup-baseline.json",
+                        help="import time to compare against; written by the first run")
+    parser.add_argument("--update-baseline", action="store_true", help="replace the baseline with this run")
+    parser.add_argument("--threshold", type=float, default=25.0,
+                        help="allowed growth of the import time over the baseline in percent")
+    parser.add_argument("--min-delta-ms", type=float, default=3.0,
+                        help="growth in ms that is never reported, whatever the percentage")
+    parser.add_argument("--budget", type=float, default=None,
+                        help="also fail when the import time beyond the bare interpreter exceeds this many ms")
+    parser.add_argument("--top", type=int, default=10, help="number of slowest modules to list")
+    parser.add_argument("--real-tools", action="store_true", help="probe the installed tools instead of stubs")
+    parser.add_argument("--json", help="also write the result to this file")
+    args = parser.parse_args()
+
+    try:
+        result = StartupBenchmark(args.runs, False if args.real_tools else None).Run()
+    except RuntimeError as e:
+        print_colored(str(e), 31)
+        sys.exit(2)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as jsonFile:
+            json.dump(result, jsonFile, indent=2)
+
+    baseline = None if args.update_baseline else LoadBaseline(args.baseline)
+    if baseline is not None and any(baseline.get(key) != result[key] for key in ("python", "platform", "stubTools")):
+        print_colored(f"{args.baseline} was recorded with Python {baseline.get('python')} on {baseline.get('platform')} "
+                      f"(stub tools: {baseline.get('stubTools')}); pass --update-baseline to replace it.", 31)
+        sys.exit(2)
+    passed = PrintResult(result, baseline, args.threshold, args.min_delta_ms, args.budget, args.top)
+    if baseline is None:
+        SaveBaseline(args.baseline, result)
+        print(f"Saved the baseline to {args.baseline}.")
+    sys.exit(0 if passed else 1)
@@ -0,0 +1,124 @@
+import time
+
+from Utils import print_colored, Tracer
+from DetectionCache import DetectionCache
+
+# Result of a single '<tool> --version' query
+
+
+class ProbeResult:
+    def __init__(self, name, command, output=None, error=None, elapsed=0.0, cached=False):
+        self.name = name
+        self.command = command
+        self.output = output
+        self.error = error
+        self.elapsed = elapsed
+        self.cached = cached
+
+    @property
+    def found(self):
+        return self.output is not None
+
+    def Remember(self, **fields):
+        # Store the parsed version, install dir and verdict next to the cached banner
+        if self.found:
+            DetectionCache.Remember(self.command, **fields)
+
+
+# Runs version queries for several tools at once so one slow or hung tool
+# cannot stall the others
+
+
+class ToolProbe:
+    defaultTimeout = 10.0
+
+    @classmethod
+    def Run(cls, name, command, timeout=None):
+        result = cls._FromCache(name, command)
+        if result is None:
+            result = cls._Spawn(name, command, timeout)
+            cls._Store(result)
+        return result
+
+    @classmethod
+    def DescribeInstalled(cls, name, label, command):
+        # "CMake 3.29.2" right after an install, just the label while the tool is not reachable yet
+        from Versions import ToolRequirements
+
+        check = ToolRequirements[name].Check(cls.Run(name, command))
+        return f"{label} {check.Describe()}" if check.version is not None else label
+
+    @staticmethod
+    def _FromCache(name, command):
+        entry = DetectionCache.Lookup(command)
+        if entry is None:
+            return None
+        return ProbeResult(name, command, entry["output"], cached=True)
+
+    @staticmethod
+    def _Store(result):
+        if result.found:
+            DetectionCache.Store(result.command, result.output)
+
+    @staticmethod
+    def _Spawn(name, command, timeout=None):
+        import subprocess
+
+        if timeout is None:
+            timeout = ToolProbe.defaultTimeout
+
+        startTime = time.perf_counter()
+        output = None
+        error = None
+        try:
+            # subprocess.run kills the child once the timeout expires
+            with Tracer.Span(name, "probe", command=" ".join(command)):
+                output = subprocess.run(
+                    command, capture_output=True, text=True, timeout=timeout, check=True
+                ).stdout
+        except FileNotFoundError:
+            error = "not found"
+        except subprocess.TimeoutExpired:
+            error = f"timed out after {timeout:g}s"
+        except subprocess.CalledProcessError as e:
+            error = f"exited with code {e.returncode}"
+        except OSError as e:
+            error = str(e)
+
+        return ProbeResult(name, command, output, error, time.perf_counter() - startTime)
+
+    @classmethod
+    def RunAll(cls, probes, timeout=None):
+        # probes maps a tool name to the command that prints its version
+        # The cache is consulted and updated on this thread only; the pool just spawns
+        results = {name: cls._FromCache(name, command) for name, command in probes.items()}
+        misses = {name: probes[name] for name, result in results.items() if result is None}
+
+        if misses:
+            from concurrent.futures import ThreadPoolExecutor
+
+            with ThreadPoolExecutor(max_workers=len(misses)) as pool:
+                futures = {
+                    name: pool.submit(cls._Spawn, name, command, timeout)
+                    for name, command in misses.items()
+                }
+                for name, future in futures.items():
+                    results[name] = future.result()
+                    cls._Store(results[name])
+
+        return results
+
+    @staticmethod
+    def PrintReport(results):
+        print("Toolchain probe report:")
+        width = max((len(name) for name in results), default=0)
+        for name, result in results.items():
+            if result.cached:
+                elapsed = "(cached)"
+            else:
+                elapsed = "({:.0f} ms)".format(result.elapsed * 1000)
+            if result.found:
+                banner = result.output.strip().splitlines()[0] if result.output.strip() else ""
+                print_colored(f"  {name:<{width}}  {banner} {elapsed}", 32)
+            else:
+                print_colored(f"  {name:<{width}}  {result.error} {elapsed}", 31)
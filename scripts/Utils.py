@@ -1,11 +1,12 @@
 import os
 import sys
+import threading
 import time
-import urllib
-import urllib.request
-from urllib.request import urlopen, urlretrieve
 
-from zipfile import ZipFile
+# Everything else (subprocess, zipfile, urllib through Downloader, json) is
+# imported inside the function that needs it. Setup.py runs on a machine where
+# the toolchain is already fine should not pay for downloads and extraction it
+# never does; StartupBenchmark.py keeps an eye on that.
 
 # Print colored text
 
@@ -14,6 +15,151 @@ def print_colored(text, color_code):
     print(f"\x1b[{color_code}m{text}\x1b[0m")
 
 
+# Timed spans for the setup scripts, written as a Chrome trace (chrome://tracing,
+# Perfetto) or as JSON lines. Tracing is off until Tracer.Enable is called; a
+# span taken while it is off is a shared object that records nothing.
+
+
+class _Span:
+    __slots__ = ("name", "category", "args", "start")
+
+    def __init__(self, name, category, args):
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = 0.0
+
+    def Set(self, **args):
+        self.args.update(args)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, excType, exc, traceback):
+        if excType is not None:
+            self.args["error"] = excType.__name__
+        Tracer._Record(self, time.perf_counter())
+        return False
+
+
+class _NoSpan:
+    def Set(self, **args):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, exc, traceback):
+        return False
+
+
+class Tracer:
+    enabled = False
+
+    _events = []
+    _threads = {}
+    _lock = threading.Lock()
+    _origin = time.perf_counter()
+    _noSpan = _NoSpan()
+
+    @classmethod
+    def Enable(cls):
+        cls.enabled = True
+        cls._origin = time.perf_counter()
+
+    @classmethod
+    def Span(cls, name, category="setup", **args):
+        if not cls.enabled:
+            return cls._noSpan
+        return _Span(name, category, args)
+
+    @classmethod
+    def _Record(cls, span, end):
+        thread = threading.current_thread()
+        event = {
+            "name": span.name,
+            "cat": span.category,
+            "ph": "X",
+            "ts": round((span.start - cls._origin) * 1e6, 1),
+            "dur": round((end - span.start) * 1e6, 1),
+            "pid": os.getpid(),
+            "tid": thread.ident,
+            "args": span.args,
+        }
+        with cls._lock:
+            cls._events.append(event)
+            cls._threads[thread.ident] = thread.name
+
+    @classmethod
+    def Write(cls, path):
+        import json
+
+        with cls._lock:
+            events = sorted(cls._events, key=lambda event: event["ts"])
+            threads = dict(cls._threads)
+        with open(path, "w", encoding="utf-8") as traceFile:
+            if path.endswith(".jsonl"):
+                for event in events:
+                    traceFile.write(json.dumps(event) + "\n")
+                return
+            # Thread names make the rows in the trace viewer readable
+            metadata = [
+                {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": ident, "args": {"name": name}}
+                for ident, name in threads.items()
+            ]
+            json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"}, traceFile)
+
+    @classmethod
+    def Summary(cls):
+        # Total, count and longest duration per span name, the most expensive first
+        totals = {}
+        with cls._lock:
+            for event in cls._events:
+                entry = totals.setdefault((event["cat"], event["name"]), [0, 0.0, 0.0])
+                entry[0] += 1
+                entry[1] += event["dur"] / 1e6
+                entry[2] = max(entry[2], event["dur"] / 1e6)
+        return sorted(
+            ({"category": category, "name": name, "count": count, "total": total, "max": longest}
+             for (category, name), (count, total, longest) in totals.items()),
+            key=lambda entry: entry["total"], reverse=True,
+        )
+
+    @classmethod
+    def PrintSummary(cls):
+        summary = cls.Summary()
+        if not summary:
+            return
+        print("\nTime by span (nested spans are included in their parents):")
+        print(f"{'category':<12}{'name':<48}{'count':>7}{'total':>10}{'max':>10}")
+        for entry in summary:
+            name = entry["name"] if len(entry["name"]) <= 46 else entry["name"][:43] + "..."
+            print(f"{entry['category']:<12}{name:<48}{entry['count']:>7}"
+                  f"{entry['total']:>9.3f}s{entry['max']:>9.3f}s")
+
+    @classmethod
+    def Finish(cls, path=None, printSummary=False):
+        if path:
+            cls.Write(path)
+            print(f"Trace written to {os.path.abspath(path)}")
+        if printSummary:
+            cls.PrintSummary()
+
+
+# Function to run a command like subprocess.run inside a trace span
+
+
+def RunProcess(command, **kwargs):
+    import subprocess
+
+    name = command if isinstance(command, str) else " ".join(command)
+    with Tracer.Span(name, "subprocess") as span:
+        result = subprocess.run(command, **kwargs)
+        span.Set(returncode=result.returncode)
+        return result
+
+
 # Function to retrieve a system environment variable on Windows
 
 
@@ -48,6 +194,8 @@ def GetSystemEnvironmentVariable(name):
 
 def GetUserEnvironmentVariable(name):
     if sys.platform.startswith("win"):
+        import winreg
+
         try:
             # Open the Windows registry key for user environment variables
             key = winreg.OpenKey(winreg.HKEY_CURRENT_USER, r"Environment")
@@ -67,10 +215,41 @@ def GetUserEnvironmentVariable(name):
         return None
 
 
-# Function to download a file from the given URL and save it to the specified filepath
+# Function to get the per-user cache directory used by the setup scripts
+
+
+def GetCacheDirectory():
+    if sys.platform.startswith("win"):
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~/AppData/Local")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "bs14")
+
+
+# Function to link a previously downloaded file out of the shared artifact cache.
+# Only a pinned digest is looked up: an unpinned URL may serve new content at any time.
+
 
+def _MaterializeFromCache(url, sha256, filepath):
+    from ArtifactCache import ArtifactCache
 
-def DownloadFile(url, filepath):
+    if not ArtifactCache.enabled or not sha256:
+        return False
+    with Tracer.Span(os.path.basename(filepath), "cache", url=url) as span:
+        materialized = ArtifactCache.Materialize(sha256, filepath)
+        span.Set(hit=materialized)
+    if materialized:
+        print_colored(f"Using cached {os.path.basename(filepath)}", 32)
+        return True
+    return False
+
+
+# Function to download a file from the given URL and save it to the specified filepath.
+# sha256 is an optional expected digest, or a list with one digest per URL in the list.
+# Files already in the shared artifact cache are linked into place without downloading.
+
+
+def DownloadFile(url, filepath, sha256=None):
     path = filepath
     filepath = os.path.abspath(filepath)
     # Create the directory if it does not exist
@@ -78,123 +257,207 @@ def DownloadFile(url, filepath):
 
     # Handle the case when multiple URLs are provided as a list
     if type(url) is list:
-        for url_option in url:
-            print("Downloading", url_option, "to: ", filepath)
+        if type(sha256) is not list:
+            sha256 = [sha256] * len(url)
+        elif len(sha256) != len(url):
+            # zip() would silently drop the mirrors without a digest
+            raise ValueError(f"Got {len(sha256)} SHA-256 digests for {len(url)} URLs")
+        # Any mirror's artifact is as good as another's, so check the cache for all of them first
+        for url_option, sha256_option in zip(url, sha256):
+            if _MaterializeFromCache(url_option, sha256_option, filepath):
+                return
+        from Downloader import ChecksumMismatchError, Mirror, MirrorGroups, RankMirrors
+
+        # Race the mirrors instead of trying them in order; a slow mirror that never fails
+        # would otherwise never be replaced
+        with Tracer.Span(os.path.basename(filepath), "mirrors", count=len(url)):
+            mirrors = RankMirrors([Mirror(url_option, sha256_option) for url_option, sha256_option in zip(url, sha256)])
+        for rank, mirror in enumerate(mirrors):
+            print_colored(f"  {rank + 1}. {mirror.Describe()}", 36 if not mirror.error else 33)
+
+        # Mirrors serving the same file share the chunks of one download; other files are the backup
+        attempts = MirrorGroups(mirrors)
+        while attempts:
+            group = attempts.pop(0)
+            # The manifest is keyed by the first of these URLs in the given order, so resuming
+            # does not depend on which mirror happened to be fastest
+            primary = min(group, key=lambda mirror: url.index(mirror.url))
+            print("Downloading", group[0].url, "to: ", filepath)
             try:
-                # Recursively call DownloadFile for each URL in the list
-                DownloadFile(url_option, filepath)
+                _DownloadSingleFile(primary.url, filepath, primary.sha256, mirrors=group)
                 return
+            except ChecksumMismatchError as e:
+                print(f"Error encountered: {e}. Proceeding with backup...\n\n")
+                if len(group) > 1:
+                    # Any of the mirrors may have sent the bad bytes, so each one gets to
+                    # serve the whole file alone before the next group
+                    attempts[:0] = [[mirror] for mirror in group]
             except Exception as e:
-                # If an error occurs during download, print an error message, remove the downloaded file, and continue
+                # The partial file and its chunk manifest stay, so a mirror of the same
+                # pinned digest (or the next run) resumes instead of starting over
                 print(f"Error encountered: {e}. Proceeding with backup...\n\n")
-                os.remove(filepath)
-                pass
         # If none of the URLs in the list are successfully downloaded, raise an exception
         raise ValueError(f"Failed to download {filepath}")
 
     if not type(url) is str:
         raise TypeError("Argument 'url' must be of type list or string")
 
-    # Function to display a progress bar during the download
-    def report_hook(blocknum, blocksize, totalsize):
-        downloaded = blocknum * blocksize
-        percentage = min(downloaded / totalsize * 100, 100)
-        sys.stdout.write(
-            "\r[{}{}] {:.2f}%     ".format(
-                "█" * int(50 * percentage / 100),
-                "." * int(50 * (1 - percentage / 100)),
-                percentage,
-            )
-        )
-        sys.stdout.flush()
+    if not _MaterializeFromCache(url, sha256, filepath):
+        _DownloadSingleFile(url, filepath, sha256)
+
+
+def _DownloadSingleFile(url, filepath, sha256, mirrors=None):
+    from Downloader import ChunkedDownload
+    from Progress import Progress
 
+    if mirrors is None:
+        Progress.Print("Downloading", url)
+    # Parallel chunks all report into one task; the display redraws on its own schedule
+    task = Progress.Task(os.path.basename(filepath))
+    download = ChunkedDownload(url, filepath, reporthook=task.Update, sha256=sha256, mirrors=mirrors)
     try:
-        opener = urllib.request.build_opener()
-        opener.addheaders = [("User-Agent", "Mozilla/5.0")]
-        urllib.request.install_opener(opener)
-        print("Downloading", url)
-        # Download the file from the URL and display a progress bar using the report_hook function
-        urlretrieve(url, filename=filepath, reporthook=report_hook)
+        with Tracer.Span(os.path.basename(filepath), "download", url=url) as span:
+            download.Run()
+            span.Set(bytes=os.path.getsize(filepath))
     except Exception as e:
-        # If an error occurs during download, print an error message, remove the downloaded file, and raise the exception
-        print(f"\nError encountered: {e}")
-        if os.path.exists(filepath):
+        # If an error occurs during download, print an error message and raise the exception.
+        # A partial file with a chunk manifest is kept so the next attempt can resume it,
+        # a file that failed its checksum has already been removed.
+        task.Finish()
+        Progress.Print(f"Error encountered: {e}")
+        if os.path.exists(filepath) and not os.path.exists(download.manifestPath):
             os.remove(filepath)
         raise
+    task.Finish()
 
-    sys.stdout.write("\n")
+    if sha256:
+        from ArtifactCache import ArtifactCache
 
+        ArtifactCache.Store(filepath, download.sha256)
 
-# Function to unzip a file
 
+# Function to unzip a file. Members are spread across a thread pool where every
+# worker reads through its own ZipFile handle; files that already exist are skipped.
+# With the archive's sha256, a missing archive is first taken from the artifact cache
+# and a deleted one is kept there.
+
+
+def UnzipFile(filepath, deleteZipFile=True, workers=None, bufferSize=1024 * 1024, sha256=None):
+    from concurrent.futures import ThreadPoolExecutor
+    from zipfile import ZipFile
+    from Progress import Progress
 
-def UnzipFile(filepath, deleteZipFile=True):
     zipFilePath = os.path.abspath(filepath)  # get full path of files
     zipFileLocation = os.path.dirname(zipFilePath)
+    if not os.path.isfile(zipFilePath) and not _MaterializeFromCache(zipFilePath, sha256, zipFilePath):
+        raise FileNotFoundError(f"{zipFilePath} does not exist and is not in the artifact cache")
 
-    zipFileContent = dict()
-    zipFileContentSize = 0
+    # Resolve every member up front, skipping files that are already extracted
+    pendingMembers = []
+    directories = set()
     with ZipFile(zipFilePath, "r") as zipFileFolder:
-        for name in zipFileFolder.namelist():
-            zipFileContent[name] = zipFileFolder.getinfo(name).file_size
-        zipFileContentSize = sum(zipFileContent.values())
-        extractedContentSize = 0
-        startTime = time.time()
-        for zippedFileName, zippedFileSize in zipFileContent.items():
-            UnzippedFilePath = os.path.abspath(f"{zipFileLocation}/{zippedFileName}")
-            os.makedirs(os.path.dirname(UnzippedFilePath), exist_ok=True)
-            if os.path.isfile(UnzippedFilePath):
-                zipFileContentSize -= zippedFileSize
+        for info in zipFileFolder.infolist():
+            UnzippedFilePath = os.path.abspath(os.path.join(zipFileLocation, info.filename))
+            if not UnzippedFilePath.startswith(os.path.join(zipFileLocation, "")):
+                raise ValueError(f"Refusing to extract '{info.filename}' outside of {zipFileLocation}")
+            if info.is_dir():
+                directories.add(UnzippedFilePath)
+                continue
+            directories.add(os.path.dirname(UnzippedFilePath))
+            if not os.path.isfile(UnzippedFilePath):
+                pendingMembers.append((info.filename, UnzippedFilePath, info.file_size))
+
+    # Create the whole directory tree in one pass before any worker starts
+    for directory in sorted(directories):
+        os.makedirs(directory, exist_ok=True)
+
+    zipFileContentSize = sum(size for _, _, size in pendingMembers)
+    # Workers report every member (and every buffer of a large one); the display throttles itself
+    task = Progress.Task(os.path.basename(zipFilePath), zipFileContentSize)
+    handleLock = threading.Lock()
+
+    workerState = threading.local()
+    workerHandles = []
+
+    def ExtractBatch(batch):
+        zipFileFolder = getattr(workerState, "zipFileFolder", None)
+        if zipFileFolder is None:
+            zipFileFolder = workerState.zipFileFolder = ZipFile(zipFilePath, "r")
+            with handleLock:
+                workerHandles.append(zipFileFolder)
+
+        for zippedFileName, UnzippedFilePath, zippedFileSize in batch:
+            # Stream large members in fixed-size buffers instead of inflating them whole
+            with zipFileFolder.open(zippedFileName) as source, open(UnzippedFilePath, "wb") as target:
+                if zippedFileSize <= bufferSize:
+                    target.write(source.read())
+                    task.Advance(zippedFileSize)
+                else:
+                    while True:
+                        block = source.read(bufferSize)
+                        if not block:
+                            break
+                        target.write(block)
+                        task.Advance(len(block))
+
+    # Hand out contiguous runs of members of roughly equal size, so workers read
+    # the archive sequentially and the pool is not paying per-file scheduling costs
+    workers = workers or os.cpu_count() or 1
+    batchSize = max(zipFileContentSize // (workers * 4), 1)
+    batches = [[]]
+    batchBytes = 0
+    for member in pendingMembers:
+        if batchBytes >= batchSize or len(batches[-1]) >= 1024:
+            batches.append([])
+            batchBytes = 0
+        batches[-1].append(member)
+        batchBytes += member[2]
+
+    try:
+        with Tracer.Span(os.path.basename(zipFilePath), "unzip", files=len(pendingMembers), bytes=zipFileContentSize):
+            if workers == 1:
+                for batch in batches:
+                    ExtractBatch(batch)
             else:
-                zipFileFolder.extract(zippedFileName, path=zipFileLocation, pwd=None)
-                extractedContentSize += zippedFileSize
-            try:
-                done = int(50 * extractedContentSize / zipFileContentSize)
-                percentage = (extractedContentSize / zipFileContentSize) * 100
-            except ZeroDivisionError:
-                done = 50
-                percentage = 100
-            elapsedTime = time.time() - startTime
-            try:
-                avgKBPerSecond = (extractedContentSize / 1024) / elapsedTime
-            except ZeroDivisionError:
-                avgKBPerSecond = 0.0
-            avgSpeedString = "{:.2f} KB/s".format(avgKBPerSecond)
-            if avgKBPerSecond > 1024:
-                avgMBPerSecond = avgKBPerSecond / 1024
-                avgSpeedString = "{:.2f} MB/s".format(avgMBPerSecond)
-            sys.stdout.write(
-                "\r[{}{}] {:.2f}% ({})     ".format(
-                    "█" * done, "." * (50 - done), percentage, avgSpeedString
-                )
-            )
-            sys.stdout.flush()
-    sys.stdout.write("\n")
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    for _ in pool.map(ExtractBatch, batches):
+                        pass
+    finally:
+        for handle in workerHandles:
+            handle.close()
+        task.Finish()
 
     if deleteZipFile:
+        # Keep a copy in the shared artifact cache so the next checkout can skip the download
+        # (a hardlinked archive already came out of the cache)
+        from ArtifactCache import ArtifactCache
+
+        if sha256 and os.stat(zipFilePath).st_nlink == 1:
+            ArtifactCache.Store(zipFilePath)
         os.remove(zipFilePath)  # delete zip file
 
 
 def CompareVersions(v1, v2):
     """
     Compare two version strings v1 and v2.
+    Pre-release tags sort before their release ("3.28.0-rc1" < "3.28.0").
     Returns:
         -1 if v1 < v2
          0 if v1 == v2
          1 if v1 > v2
     """
-    v1_parts = [int(part) for part in v1.split(".")]
-    v2_parts = [int(part) for part in v2.split(".")]
+    from Versions import ParseVersion
+
+    version1 = ParseVersion(v1)
+    version2 = ParseVersion(v2)
+    return (version1 > version2) - (version1 < version2)
+
 
-    for part1, part2 in zip(v1_parts, v2_parts):
-        if part1 < part2:
-            return -1
-        elif part1 > part2:
-            return 1
+# Function to pick the nearest-rank percentile from values sorted in ascending order
 
-    if len(v1_parts) < len(v2_parts):
-        return -1
-    elif len(v1_parts) > len(v2_parts):
-        return 1
 
-    return 0
+def Percentile(sortedValues, percentile):
+    if not sortedValues:
+        return 0.0
+    index = max(int(-(-percentile * len(sortedValues) // 100)) - 1, 0)
+    return sortedValues[min(index, len(sortedValues) - 1)]
@@ -0,0 +1,257 @@
+import functools
+import re
+
+# Version parsing and the requirements every tool of the toolchain has to
+# meet. Versions compare numerically ("9.0" < "18.0.0") with pre-releases
+# ordered before their release ("3.28.0-rc1" < "3.28.0"). Requirements are
+# ranges such as ">=18, <21" or "==3.28.*", compiled once when the table
+# below is built, and parsed versions are memoized, so checking every probe
+# again is cheap.
+
+
+class VersionError(ValueError):
+    pass
+
+
+@functools.total_ordering
+class Version:
+    versionPattern = re.compile(r"v?(?P<release>\d+(?:\.\d+)*)(?P<rest>.*)", re.IGNORECASE)
+    # A pre-release tag has to end the version or be followed by build metadata, so
+    # builds like "1.11.1.git.kitware.jobserver-1" stay releases
+    preReleasePattern = re.compile(
+        r"[-.~_]?(?P<tag>dev|git|alpha|beta|preview|pre|rc|a|b)[-.]?(?P<number>\d*)(?:$|\+)", re.IGNORECASE
+    )
+    # Ranks of the pre-release tags; a final release ranks above all of them
+    phases = {"dev": 0, "git": 0, "alpha": 1, "a": 1, "beta": 2, "b": 2, "pre": 3, "preview": 3, "rc": 3}
+    releasePhase = 4
+
+    __slots__ = ("text", "release", "preRelease", "_key")
+
+    def __init__(self, text):
+        match = self.versionPattern.fullmatch(text.strip())
+        if match is None:
+            raise VersionError(f"'{text}' is not a version")
+
+        self.text = text.strip()
+        self.release = tuple(int(part) for part in match.group("release").split("."))
+        self.preRelease = None
+        preRelease = self.preReleasePattern.match(match.group("rest"))
+        if preRelease:
+            self.preRelease = (preRelease.group("tag").lower(), int(preRelease.group("number") or 0))
+
+        # Trailing zeros do not count, so 3.28 == 3.28.0
+        release = list(self.release)
+        while len(release) > 1 and release[-1] == 0:
+            release.pop()
+        if self.preRelease:
+            phase = (self.phases[self.preRelease[0]], self.preRelease[1])
+        else:
+            phase = (self.releasePhase, 0)
+        self._key = (tuple(release), phase)
+
+    def __eq__(self, other):
+        return isinstance(other, Version) and self._key == other._key
+
+    def __lt__(self, other):
+        if not isinstance(other, Version):
+            return NotImplemented
+        return self._key < other._key
+
+    def __hash__(self):
+        return hash(self._key)
+
+    def __repr__(self):
+        return f"Version('{self.text}')"
+
+    def __str__(self):
+        return self.text
+
+    def StartsWith(self, prefix):
+        return self.release[:len(prefix)] == prefix
+
+
+# Function to parse a version once; every later call with the same text is a dictionary lookup
+
+
+@functools.lru_cache(maxsize=None)
+def ParseVersion(text):
+    return Version(text)
+
+
+class VersionRange:
+    clausePattern = re.compile(r"(?P<operator>>=|<=|==|!=|>|<)?\s*(?P<version>[^\s,*]+?)(?P<wildcard>\.\*)?")
+    operators = {
+        ">=": lambda version, bound: version >= bound,
+        ">": lambda version, bound: version > bound,
+        "<=": lambda version, bound: version <= bound,
+        "<": lambda version, bound: version < bound,
+        "==": lambda version, bound: version == bound,
+        "!=": lambda version, bound: version != bound,
+    }
+
+    # How each clause reads in a message: ">=3.28" is "3.28 or newer"
+    wording = {
+        ">=": "{} or newer",
+        ">": "newer than {}",
+        "<=": "{} or older",
+        "<": "older than {}",
+        "==": "{}",
+        "!=": "not {}",
+    }
+
+    def __init__(self, specifier):
+        self.specifier = specifier
+        self.clauses = []
+        self.words = []
+        for clause in filter(None, (part.strip() for part in specifier.split(","))):
+            match = self.clausePattern.fullmatch(clause)
+            if match is None:
+                raise VersionError(f"'{clause}' is not a version requirement")
+            operator = match.group("operator") or "=="
+            bound = ParseVersion(match.group("version"))
+            self.words.append(self.wording[operator].format(str(bound) + (".x" if match.group("wildcard") else "")))
+            if match.group("wildcard"):
+                if operator not in ("==", "!="):
+                    raise VersionError(f"'{clause}': wildcards only work with == and !=")
+                self.clauses.append(self._Wildcard(operator, bound.release))
+            else:
+                self.clauses.append(functools.partial(self._Compare, self.operators[operator], bound))
+
+    @staticmethod
+    def _Compare(operator, bound, version):
+        return operator(version, bound)
+
+    @staticmethod
+    def _Wildcard(operator, prefix):
+        if operator == "==":
+            return lambda version: version.StartsWith(prefix)
+        return lambda version: not version.StartsWith(prefix)
+
+    def Contains(self, version):
+        if isinstance(version, str):
+            version = ParseVersion(version)
+        return all(clause(version) for clause in self.clauses)
+
+    def Describe(self):
+        return " and ".join(self.words)
+
+    def __str__(self):
+        return self.specifier
+
+
+# Result of checking one probe against its requirement
+
+
+class VersionCheck:
+    def __init__(self, name, requirement, probe, version=None, vendor=None, upstream=None, reason=None):
+        self.name = name
+        self.requirement = requirement
+        self.probe = probe
+        self.version = version
+        self.vendor = vendor
+        # The version compared against the range; differs from version for vendor builds
+        self.upstream = upstream or version
+        self.reason = reason
+
+    @property
+    def satisfied(self):
+        return self.upstream is not None and self.requirement.range.Contains(self.upstream)
+
+    def Describe(self):
+        if self.version is None:
+            return self.reason
+        text = str(self.version)
+        if self.vendor:
+            text = f"{self.vendor} {text}"
+            if self.upstream != self.version:
+                text += f" (upstream {self.upstream})"
+        return text
+
+
+# Apple ships clang with its own version numbers; each entry is the first
+# Apple clang release that is based on the given LLVM version.
+AppleClangVersions = [
+    ("12.0.0", "10.0.0"),
+    ("12.0.5", "11.1.0"),
+    ("13.0.0", "12.0.0"),
+    ("13.1.6", "13.0.0"),
+    ("14.0.0", "14.0.0"),
+    ("14.0.3", "15.0.0"),
+    ("15.0.0", "16.0.0"),
+    ("16.0.0", "17.0.6"),
+    ("17.0.0", "19.1.4"),
+]
+
+
+# Function to translate an Apple clang version to the LLVM version it is based on
+
+
+def AppleClangToUpstream(version):
+    upstream = None
+    for appleVersion, llvmVersion in AppleClangVersions:
+        if version >= ParseVersion(appleVersion):
+            upstream = ParseVersion(llvmVersion)
+    # Older than the table: certainly too old for any requirement we have
+    return upstream or ParseVersion("0")
+
+
+class ToolRequirement:
+    def __init__(self, name, specifier, banner, vendors=None):
+        self.name = name
+        self.range = VersionRange(specifier)
+        self.banner = re.compile(banner, re.MULTILINE)
+        # Maps a vendor named in the banner to a function returning the upstream version
+        self.vendors = vendors or {}
+
+    def Check(self, probe):
+        if probe is None or not probe.found:
+            reason = probe.error if probe is not None and probe.error else "not found"
+            return VersionCheck(self.name, self, probe, reason=reason)
+
+        match = self.banner.search(probe.output)
+        if match is None:
+            return VersionCheck(self.name, self, probe, reason="unrecognized version banner")
+        try:
+            version = ParseVersion(match.group("version"))
+        except VersionError as e:
+            return VersionCheck(self.name, self, probe, reason=str(e))
+
+        vendor = match.groupdict().get("vendor")
+        vendor = vendor.strip() if vendor else None
+        upstream = self.vendors[vendor](version) if vendor in self.vendors else version
+        check = VersionCheck(self.name, self, probe, version, vendor, upstream)
+        probe.Remember(version=str(version), vendor=vendor, upstream=str(upstream),
+                       required=str(self.range), verdict=check.satisfied)
+        return check
+
+    def __str__(self):
+        return f"{self.name} {self.range}"
+
+
+# Every tool the setup validates, with the range it accepts and how to find the
+# version in its '--version' output. Distributions put their name in front
+# ("Ubuntu clang version 18.1.3 (1ubuntu1)", "Homebrew clang version 18.1.8"),
+# MSYS2 appends package releases ("18.1.8-1"); only Apple changes the meaning
+# of the number.
+_clangVendors = {"Apple": AppleClangToUpstream}
+
+ToolRequirements = {
+    requirement.name: requirement
+    for requirement in [
+        ToolRequirement("cmake", ">=3.28", r"cmake version (?P<version>\S+)"),
+        ToolRequirement("ninja", ">=1.10.0", r"^\s*(?P<version>\d\S*)"),
+        ToolRequirement("clang", ">=18.0.0", r"(?:(?P<vendor>\w+) )?clang version (?P<version>\S+)", _clangVendors),
+        ToolRequirement("clangd", ">=18.0.0", r"(?:(?P<vendor>\w+) )?clangd version (?P<version>\S+)", _clangVendors),
+    ]
+}
+
+
+# Function to check every probe against the table in one pass
+
+
+def CheckAll(probes):
+    return {
+        name: ToolRequirements[name].Check(probe)
+        for name, probe in probes.items()
+        if name in ToolRequirements
+    }
@@ -0,0 +1,130 @@
+import http.server
+import threading
+import time
+
+# A local HTTP/1.1 server for the download tests. Files are served from
+# memory with optional Range support, throttling, stalls and redirects, and
+# every request and connection is counted so tests can check reuse.
+
+
+class LocalServer:
+    def __init__(self, files, ranges=True, rate=None, stallAfter=None):
+        # path -> bytes
+        self.files = dict(files)
+        self.ranges = ranges
+        # Bytes per second per response; None sends as fast as possible
+        self.rate = rate
+        # A response stops sending (without closing) after this many bytes
+        self.stallAfter = stallAfter
+        # path -> (status, location, seconds the location stays valid or None)
+        self.redirects = {}
+        self.requests = []
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+
+            def do_GET(self):
+                with server._lock:
+                    server.requests.append((self.path, self.headers.get("Range")))
+                path = self.path.partition("?")[0]
+
+                if path in server.redirects:
+                    status, location, lifetime = server.redirects[path]
+                    if lifetime is not None:
+                        # Every answer signs a fresh URL that expires after lifetime seconds
+                        location = f"{location}?expires={time.monotonic() + lifetime}"
+                    self.send_response(status)
+                    self.send_header("Location", location)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                if path.startswith("/signed/") and not server._SignatureValid(self.path):
+                    self.send_error(403, "Signature expired")
+                    return
+                path = path.removeprefix("/signed")
+                if path not in server.files:
+                    self.send_error(404)
+                    return
+
+                data = server.files[path]
+                start, end = 0, len(data) - 1
+                requested = self.headers.get("Range", "")
+                if server.ranges and requested.startswith("bytes="):
+                    first, _, last = requested[len("bytes="):].partition("-")
+                    start = int(first)
+                    if start >= len(data):
+                        self.send_response(416)
+                        self.send_header("Content-Range", f"bytes */{len(data)}")
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    end = min(int(last) if last else len(data) - 1, len(data) - 1)
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+                else:
+                    self.send_response(200)
+                self.send_header("Content-Length", str(end - start + 1))
+                self.end_headers()
+                self._Send(data[start:end + 1])
+
+            def _Send(self, body):
+                startTime = time.monotonic()
+                sent = 0
+                while sent < len(body):
+                    if server.stallAfter is not None and sent >= server.stallAfter:
+                        # Hold the connection open without sending anything
+                        server._stopped.wait(60)
+                        return
+                    block = body[sent:sent + 16 * 1024]
+                    if server.rate:
+                        ahead = (sent + len(block)) / server.rate - (time.monotonic() - startTime)
+                        if ahead > 0:
+                            time.sleep(ahead)
+                    try:
+                        self.wfile.write(block)
+                    except ConnectionError:
+                        self.close_connection = True
+                        return
+                    sent += len(block)
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def Redirect(self, path, location, status=302, lifetime=None):
+        # With a lifetime the location should be under /signed/, which rejects expired
+        # signatures with 403 like the storage behind GitHub release assets does
+        self.redirects[path] = (status, self.url + location, lifetime)
+
+    def _SignatureValid(self, path):
+        _, _, query = path.partition("?expires=")
+        return bool(query) and float(query) > time.monotonic()
+
+    def RangeRequests(self, path):
+        with self._lock:
+            return [requested for requestPath, requested in self.requests
+                    if requestPath.partition("?")[0] == path and requested]
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, excType, exc, traceback):
+        self._stopped.set()
+        self.server.shutdown()
+        self.server.server_close()
+        return False
@@ -0,0 +1,95 @@
+import hashlib
+import os
+import sys
+import tempfile
+import unittest
+import zipfile
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ArtifactCache import ArtifactCache
+from Downloader import ChunkedDownload
+from LocalServer import LocalServer
+from Progress import Progress
+from Utils import DownloadFile, UnzipFile
+
+Payload = b"installer " * 10000
+PayloadSha256 = hashlib.sha256(Payload).hexdigest()
+
+
+class ArtifactCacheTests(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.path = os.path.join(self.directory, "project", "installer.bin")
+        for patch in (
+            mock.patch.dict(os.environ, {"XDG_CACHE_HOME": os.path.join(self.directory, "cache")}),
+            mock.patch.object(ArtifactCache, "enabled", True),
+            mock.patch.object(Progress, "enabled", False),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def ReadFile(self, path):
+        with open(path, "rb") as file:
+            return file.read()
+
+    def testPinnedDownloadIsServedFromTheCache(self):
+        with LocalServer({"/installer.bin": Payload}) as server:
+            DownloadFile(server.url + "/installer.bin", self.path, PayloadSha256)
+            os.remove(self.path)
+            requests = len(server.requests)
+            DownloadFile(server.url + "/installer.bin", self.path, PayloadSha256)
+            self.assertEqual(len(server.requests), requests)
+        self.assertEqual(self.ReadFile(self.path), Payload)
+
+    def testUnpinnedUrlIsDownloadedAgain(self):
+        # Without a digest the server may hand out new content under the same URL
+        with LocalServer({"/installer.bin": Payload}) as server:
+            DownloadFile(server.url + "/installer.bin", self.path)
+            server.files["/installer.bin"] = b"new release"
+            DownloadFile(server.url + "/installer.bin", self.path)
+        self.assertEqual(self.ReadFile(self.path), b"new release")
+
+    def testRewritingTheProjectFileKeepsTheCachedCopy(self):
+        other = b"other " * 5000
+        with LocalServer({"/installer.bin": Payload, "/other.bin": other}) as server:
+            DownloadFile(server.url + "/installer.bin", self.path, PayloadSha256)
+            os.remove(self.path)
+            DownloadFile(server.url + "/installer.bin", self.path, PayloadSha256)
+            # The path is now linked to the cached artifact; downloading something else over it
+            # must not write through the link
+            ChunkedDownload(server.url + "/other.bin", self.path, chunkSize=16 * 1024).Run()
+        self.assertEqual(self.ReadFile(self.path), other)
+        self.assertEqual(self.ReadFile(ArtifactCache._ArtifactPath(PayloadSha256)), Payload)
+
+    def testDamagedArtifactIsNotServed(self):
+        source = os.path.join(self.directory, "installer.bin")
+        with open(source, "wb") as file:
+            file.write(Payload)
+        ArtifactCache.Store(source, PayloadSha256)
+        with open(ArtifactCache._ArtifactPath(PayloadSha256), "r+b") as file:
+            file.write(b"X")
+
+        self.assertFalse(ArtifactCache.Materialize(PayloadSha256, self.path))
+        self.assertFalse(os.path.exists(ArtifactCache._ArtifactPath(PayloadSha256)))
+
+    def testUnzipTakesAMissingArchiveFromTheCache(self):
+        archivePath = os.path.join(self.directory, "project", "tools.zip")
+        os.makedirs(os.path.dirname(archivePath))
+        with zipfile.ZipFile(archivePath, "w") as archive:
+            archive.writestr("bin/tool", Payload)
+        archiveSha256 = ArtifactCache.HashFile(archivePath)
+
+        UnzipFile(archivePath, sha256=archiveSha256)
+        self.assertFalse(os.path.exists(archivePath))
+        os.remove(os.path.join(self.directory, "project", "bin", "tool"))
+
+        UnzipFile(archivePath, sha256=archiveSha256)
+        self.assertEqual(self.ReadFile(os.path.join(self.directory, "project", "bin", "tool")), Payload)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import unittest
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from AssetPack import AssetPacker, DecodePng, GameDirectory, PixelFormats, ReadBundle
+
+AssetsDirectory = os.path.join(GameDirectory, "assets")
+# Bytes per pixel of the formats AssetPack writes
+PixelSizes = {PixelFormats["gray"]: 1, PixelFormats["gray-alpha"]: 2, PixelFormats["rgb"]: 3, PixelFormats["rgba"]: 4}
+
+
+class GameAssetsTests(unittest.TestCase):
+    def Pack(self, compress):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "assets.bundle")
+        with contextlib.redirect_stdout(io.StringIO()):
+            AssetPacker(AssetsDirectory, path, compress=compress).Pack()
+        with open(path, "rb") as bundle:
+            return ReadBundle(path), bundle.read()
+
+    def testSpritesTheGameLoadsAreInTheBundle(self):
+        for compress in (False, True):
+            assets, data = self.Pack(compress)
+            self.assertEqual([asset["name"] for asset in assets], ["dino", "obstacle"])
+            for asset in assets:
+                # What game/asset_bundle.h checks before a texture is uploaded
+                pixelSize = asset["width"] * asset["height"] * PixelSizes[asset["format"]]
+                self.assertEqual(asset["rawSize"], pixelSize)
+                stored = data[asset["offset"]:asset["offset"] + asset["size"]]
+                pixels = zlib.decompress(stored, -15) if asset["compression"] else stored
+                self.assertEqual(pixels, DecodePng(os.path.join(AssetsDirectory, asset["name"] + ".png"))[3])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,243 @@
+import hashlib
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Downloader import ChecksumMismatchError, ChunkedDownload, ConnectionPool, Mirror, RankMirrors
+from LocalServer import LocalServer
+
+Payload = random.Random(3).randbytes(1024 * 1024 + 123)
+PayloadSha256 = hashlib.sha256(Payload).hexdigest()
+ChunkSize = 64 * 1024
+
+
+class ChunkedDownloadTests(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "payload.bin")
+        self.pool = ConnectionPool()
+        self.addCleanup(self.pool.Close)
+
+    def Download(self, url, sha256=None, mirrors=None):
+        download = ChunkedDownload(url, self.path, chunkSize=ChunkSize, sha256=sha256, mirrors=mirrors, pool=self.pool)
+        download.Run()
+        return download
+
+    def ReadFile(self):
+        with open(self.path, "rb") as file:
+            return file.read()
+
+    def WritePartial(self, url, doneChunks, sha256=None):
+        # What an interrupted download leaves: the preallocated file with some chunks and their manifest
+        data = bytearray(len(Payload))
+        for index in doneChunks:
+            data[index * ChunkSize:(index + 1) * ChunkSize] = Payload[index * ChunkSize:(index + 1) * ChunkSize]
+        with open(self.path, "wb") as file:
+            file.write(data)
+        with open(self.path + ".parts", "w", encoding="utf-8") as manifest:
+            json.dump({"url": url, "sha256": sha256, "size": len(Payload), "chunkSize": ChunkSize,
+                       "done": sorted(doneChunks)}, manifest)
+
+    def testChunksAndDigest(self):
+        with LocalServer({"/payload.bin": Payload}) as server:
+            download = self.Download(server.url + "/payload.bin", PayloadSha256)
+        self.assertEqual(self.ReadFile(), Payload)
+        self.assertEqual(download.sha256, PayloadSha256)
+        self.assertFalse(os.path.exists(self.path + ".parts"))
+
+    def testServerWithoutRanges(self):
+        with LocalServer({"/payload.bin": Payload}, ranges=False) as server:
+            download = self.Download(server.url + "/payload.bin")
+        self.assertEqual(self.ReadFile(), Payload)
+        self.assertEqual(download.sha256, PayloadSha256)
+
+    def testEmptyFile(self):
+        # The first-byte probe of an empty file is answered with 416
+        with LocalServer({"/empty.bin": b""}) as server:
+            download = self.Download(server.url + "/empty.bin", hashlib.sha256(b"").hexdigest())
+        self.assertEqual(self.ReadFile(), b"")
+        self.assertEqual(download.totalSize, 0)
+
+    def testChecksumMismatchRemovesFile(self):
+        with LocalServer({"/payload.bin": Payload}) as server:
+            with self.assertRaises(ChecksumMismatchError):
+                self.Download(server.url + "/payload.bin", "0" * 64)
+        self.assertFalse(os.path.exists(self.path))
+
+    def testResumeFetchesOnlyMissingChunks(self):
+        chunks = -(-len(Payload) // ChunkSize)
+        with LocalServer({"/payload.bin": Payload}) as server:
+            url = server.url + "/payload.bin"
+            self.WritePartial(url, range(0, chunks, 2))
+            self.Download(url, PayloadSha256)
+            # The size probe plus one request per missing chunk
+            self.assertEqual(len(server.RangeRequests("/payload.bin")), 1 + chunks // 2)
+        self.assertEqual(self.ReadFile(), Payload)
+
+    def testResumeOnAnotherMirrorOfThePinnedDigest(self):
+        chunks = -(-len(Payload) // ChunkSize)
+        with LocalServer({"/payload.bin": Payload}) as server:
+            self.WritePartial("http://mirror.invalid/payload.bin", range(chunks - 1), PayloadSha256)
+            self.Download(server.url + "/payload.bin", PayloadSha256)
+            self.assertEqual(len(server.RangeRequests("/payload.bin")), 2)
+        self.assertEqual(self.ReadFile(), Payload)
+
+    def testUnpinnedDownloadDoesNotResumeAnotherUrl(self):
+        # Without a digest another URL's chunks may belong to another file
+        chunks = -(-len(Payload) // ChunkSize)
+        with LocalServer({"/payload.bin": Payload}) as server:
+            self.WritePartial("http://mirror.invalid/payload.bin", range(chunks - 1))
+            self.Download(server.url + "/payload.bin")
+            self.assertEqual(len(server.RangeRequests("/payload.bin")), 1 + chunks)
+        self.assertEqual(self.ReadFile(), Payload)
+
+    def testFailedMirrorListKeepsPartialDownload(self):
+        from unittest import mock
+        from ArtifactCache import ArtifactCache
+        from Progress import Progress
+        from Utils import DownloadFile
+
+        # The mirror answers the ranking probe, then stalls in the middle of the only chunk
+        with LocalServer({"/payload.bin": Payload}, stallAfter=256 * 1024) as server:
+            url = server.url + "/payload.bin"
+            with mock.patch.object(ArtifactCache, "enabled", False), mock.patch.object(Progress, "enabled", False), \
+                    mock.patch.object(ChunkedDownload, "timeout", 0.5), mock.patch.object(ChunkedDownload, "retries", 1):
+                with self.assertRaises(ValueError):
+                    DownloadFile([url], self.path, [PayloadSha256])
+        self.assertTrue(os.path.exists(self.path))
+        with open(self.path + ".parts", "r", encoding="utf-8") as manifest:
+            self.assertEqual(json.load(manifest)["sha256"], PayloadSha256)
+
+    def testDigestListMustMatchUrls(self):
+        from Utils import DownloadFile
+
+        with self.assertRaises(ValueError):
+            DownloadFile(["http://a.invalid/x", "http://b.invalid/x"], self.path, [PayloadSha256])
+
+    def testExpiringSignedRedirectIsResolvedForEveryChunk(self):
+        # Throttled so the download outlives the signature, as the LLVM archive does on GitHub
+        with LocalServer({"/payload.bin": Payload}, rate=512 * 1024) as server:
+            server.Redirect("/asset", "/signed/payload.bin", 302, lifetime=0.2)
+            self.Download(server.url + "/asset", PayloadSha256)
+            # The signed location is never remembered, so every request starts at the asset URL
+            self.assertEqual(len(server.RangeRequests("/asset")), len(server.RangeRequests("/signed/payload.bin")))
+        self.assertEqual(self.ReadFile(), Payload)
+
+
+class MirrorTests(unittest.TestCase):
+    def setUp(self):
+        from ArtifactCache import ArtifactCache
+        from Progress import Progress
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "payload.bin")
+        self.pool = ConnectionPool()
+        self.addCleanup(self.pool.Close)
+        for patch in (
+            mock.patch.object(ArtifactCache, "enabled", False),
+            mock.patch.object(Progress, "enabled", False),
+            mock.patch.object(ChunkedDownload, "stallTimeout", 0.5),
+            mock.patch.object(ChunkedDownload, "graceSeconds", 0.2),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def Ranked(self, url, throughput):
+        mirror = Mirror(url, PayloadSha256)
+        mirror.throughput = throughput
+        return mirror
+
+    def Download(self, mirrors):
+        download = ChunkedDownload(mirrors[0].url, self.path, chunkSize=ChunkSize, sha256=PayloadSha256,
+                                   mirrors=mirrors, pool=self.pool)
+        download.Run()
+        with open(self.path, "rb") as file:
+            self.assertEqual(file.read(), Payload)
+
+    def testFasterMirrorIsRankedFirst(self):
+        with LocalServer({"/payload.bin": Payload}, rate=256 * 1024) as slow, \
+                LocalServer({"/payload.bin": Payload}) as fast:
+            mirrors = RankMirrors([Mirror(slow.url + "/payload.bin"), Mirror(fast.url + "/payload.bin"),
+                                   Mirror(fast.url + "/missing.bin")], pool=self.pool)
+        self.assertEqual([mirror.url for mirror in mirrors],
+                         [fast.url + "/payload.bin", slow.url + "/payload.bin", fast.url + "/missing.bin"])
+        self.assertIsNotNone(mirrors[2].error)
+
+    def testStalledTransferFinishesFromAnotherMirror(self):
+        with LocalServer({"/payload.bin": Payload}, stallAfter=16 * 1024) as stalling, \
+                LocalServer({"/payload.bin": Payload}) as good:
+            # Ranked by hand (a probe would stall too), with the stalling mirror first
+            self.Download([self.Ranked(stalling.url + "/payload.bin", 100e6), self.Ranked(good.url + "/payload.bin", 10e6)])
+            self.assertTrue(stalling.RangeRequests("/payload.bin"))
+            self.assertTrue(good.RangeRequests("/payload.bin"))
+
+    def testSlowTransferMovesToAFasterMirror(self):
+        with LocalServer({"/payload.bin": Payload}, rate=32 * 1024) as slow, \
+                LocalServer({"/payload.bin": Payload}) as fast:
+            startTime = time.monotonic()
+            self.Download([self.Ranked(slow.url + "/payload.bin", 100e6), self.Ranked(fast.url + "/payload.bin", 10e6)])
+            # The whole file from the slow mirror alone would take half a minute
+            self.assertLess(time.monotonic() - startTime, 10)
+            self.assertTrue(fast.RangeRequests("/payload.bin"))
+
+    def testCorruptMirrorIsLeftOutAfterAChecksumMismatch(self):
+        from Utils import DownloadFile
+
+        corrupt = bytearray(Payload)
+        corrupt[len(corrupt) // 2] ^= 0xFF
+        # The good mirror is throttled so the corrupt one ranks first and serves the chunks
+        with LocalServer({"/payload.bin": bytes(corrupt)}) as bad, \
+                LocalServer({"/payload.bin": Payload}, rate=4 * 1024 * 1024) as good:
+            DownloadFile([bad.url + "/payload.bin", good.url + "/payload.bin"], self.path, PayloadSha256)
+        with open(self.path, "rb") as file:
+            self.assertEqual(file.read(), Payload)
+
+
+class ConnectionPoolTests(unittest.TestCase):
+    def setUp(self):
+        self.pool = ConnectionPool()
+        self.addCleanup(self.pool.Close)
+
+    def Get(self, url):
+        with self.pool.Open(url) as response:
+            return response.read()
+
+    def Paths(self, server):
+        return [path for path, _ in server.requests]
+
+    def testPermanentRedirectIsRemembered(self):
+        with LocalServer({"/payload.bin": Payload}) as server:
+            server.Redirect("/old", "/payload.bin", 301)
+            self.Get(server.url + "/old")
+            self.Get(server.url + "/old")
+            self.assertEqual(self.Paths(server), ["/old", "/payload.bin", "/payload.bin"])
+
+    def testTemporaryRedirectIsFollowedEveryTime(self):
+        with LocalServer({"/payload.bin": Payload}) as server:
+            server.Redirect("/latest", "/payload.bin", 302)
+            self.Get(server.url + "/latest")
+            self.Get(server.url + "/latest")
+            self.assertEqual(self.Paths(server), ["/latest", "/payload.bin"] * 2)
+
+    def testRememberedTargetThatIsGoneIsResolvedAgain(self):
+        with LocalServer({"/v1.bin": b"v1", "/v2.bin": b"v2"}) as server:
+            server.Redirect("/tool", "/v1.bin", 301)
+            self.assertEqual(self.Get(server.url + "/tool"), b"v1")
+            del server.files["/v1.bin"]
+            server.Redirect("/tool", "/v2.bin", 301)
+            self.assertEqual(self.Get(server.url + "/tool"), b"v2")
+            self.assertEqual(self.Get(server.url + "/tool"), b"v2")
+            self.assertEqual(self.Paths(server), ["/tool", "/v1.bin", "/v1.bin", "/tool", "/v2.bin", "/v2.bin"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Environment import EnvironmentUpdate, MemoryBackend, ProfileBackend
+
+
+class EnvironmentUpdateTests(unittest.TestCase):
+    def Apply(self, backend, *entries):
+        # Apply prints a line per entry
+        with contextlib.redirect_stdout(io.StringIO()):
+            return EnvironmentUpdate(backend).AddPath(*entries).Apply()
+
+    def testEntriesAreWrittenAndAnnouncedOnce(self):
+        backend = MemoryBackend("/usr/bin:/bin")
+        self.assertTrue(self.Apply(backend, "/opt/a/bin", "/opt/b/bin", "/opt/c/bin"))
+        self.assertEqual(backend.value, "/usr/bin:/bin:/opt/a/bin:/opt/b/bin:/opt/c/bin")
+        self.assertEqual(backend.writes, 1)
+        self.assertEqual(backend.broadcasts, 1)
+
+    def testNothingIsWrittenWhenEveryEntryIsPresent(self):
+        backend = MemoryBackend("/usr/bin:/opt/a/bin")
+        self.assertTrue(self.Apply(backend, "/opt/a/bin", "/usr/bin/"))
+        self.assertEqual(backend.value, "/usr/bin:/opt/a/bin")
+        self.assertEqual(backend.writes, 0)
+        self.assertEqual(backend.broadcasts, 0)
+
+    def testDuplicatesAmongNewEntriesAreAddedOnce(self):
+        backend = MemoryBackend("")
+        self.Apply(backend, "/opt/a/bin", "/opt/a/./bin", "/opt/a/bin/")
+        self.assertEqual(backend.value, "/opt/a/bin")
+        self.assertEqual(backend.writes, 1)
+
+    def testWindowsSpellingsOfTheSameDirectoryMatch(self):
+        backend = MemoryBackend(r"C:\msys64\mingw64\bin;%USERPROFILE%\tools;", windows=True)
+        with mock.patch.dict(os.environ, {"USERPROFILE": r"C:\Users\dino"}):
+            self.Apply(backend, "c:/MSYS64/mingw64/bin/", r"C:\Users\Dino\tools")
+        self.assertEqual(backend.writes, 0)
+
+        with mock.patch.dict(os.environ, {"USERPROFILE": r"C:\Users\dino"}):
+            self.Apply(backend, "C:/msys64/mingw64/lib", "c:/msys64/MINGW64/lib")
+        self.assertEqual(backend.value, r"C:\msys64\mingw64\bin;%USERPROFILE%\tools;C:\msys64\mingw64\lib")
+        self.assertEqual(backend.writes, 1)
+        self.assertEqual(backend.broadcasts, 1)
+
+    def testProfileFragmentIsHookedOnce(self):
+        with tempfile.TemporaryDirectory() as directory:
+            backend = ProfileBackend(os.path.join(directory, "bs14", "env.sh"), os.path.join(directory, ".profile"))
+            self.Apply(backend, "/opt/a/bin")
+            self.Apply(ProfileBackend(backend.fragmentPath, backend.profilePath), "/opt/b/bin", "/opt/a/bin")
+
+            self.assertEqual(backend.Read(), "/opt/a/bin:/opt/b/bin")
+            with open(backend.profilePath, "r", encoding="utf-8") as profile:
+                self.assertEqual(profile.read().count(f'. "{backend.fragmentPath}"'), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
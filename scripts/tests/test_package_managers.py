@@ -0,0 +1,98 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PackageManagers import AptBackend, DnfBackend, TarballBackend
+
+# Candidate versions as Debian 12 reports them: the default clang and cmake are too old
+FakeAptCache = """#!/bin/sh
+case "$2" in
+    cmake) candidate="3.25.1-1" ;;
+    ninja-build) candidate="1.11.1-1" ;;
+    clang) candidate="1:14.0-55.7~deb12u1" ;;
+    clangd) candidate="1:14.0-55.7~deb12u1" ;;
+    clang-18) candidate="1:18.1.8~++20240731024944+3b5b5c1ec4a3-1~exp1~20240731145000.144" ;;
+    clangd-18) candidate="1:18.1.8~++20240731024944+3b5b5c1ec4a3-1~exp1~20240731145000.144" ;;
+    *) candidate="(none)" ;;
+esac
+echo "$2:"
+echo "  Installed: (none)"
+echo "  Candidate: $candidate"
+"""
+
+# Logs its arguments and "installs" every package as an executable of the same name;
+# clang-N also brings clang++-N
+FakeAptGet = """#!/bin/sh
+echo "$@" >> "$(dirname "$0")/apt-get.log"
+if [ "$1" = install ]; then
+    for package in "$@"; do
+        case "$package" in -*|install) continue ;; clang-*) binaries="$package clang++-${package#clang-}" ;; *) binaries="$package" ;; esac
+        for binary in $binaries; do
+            printf '#!/bin/sh\\n' > "$(dirname "$0")/$binary"; chmod +x "$(dirname "$0")/$binary"
+        done
+    done
+fi
+"""
+
+
+class AptBackendTests(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.fakeDirectory = os.path.join(directory.name, "fake")
+        self.binDirectory = os.path.join(directory.name, "bin")
+        os.makedirs(self.fakeDirectory)
+        for name, script in (("apt-cache", FakeAptCache), ("apt-get", FakeAptGet)):
+            path = os.path.join(self.fakeDirectory, name)
+            with open(path, "w", encoding="utf-8") as fake:
+                fake.write(script)
+            os.chmod(path, 0o755)
+
+        self.tarballTools = []
+        path = os.pathsep.join([self.fakeDirectory, self.binDirectory, os.environ.get("PATH", "")])
+        for patch in (
+            mock.patch.dict(os.environ, {"PATH": path}),
+            mock.patch.object(TarballBackend, "binDirectory", self.binDirectory),
+            mock.patch.object(TarballBackend, "Install",
+                              side_effect=lambda tools, unattended=False: self.tarballTools.extend(tools) or True),
+            # No sudo in front of the fake
+            mock.patch.object(AptBackend, "_Privileged", side_effect=lambda command, unattended=False: command),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def AptGetCalls(self):
+        with open(os.path.join(self.fakeDirectory, "apt-get.log"), "r", encoding="utf-8") as log:
+            return log.read().splitlines()
+
+    def testChoosesPackagesThatMeetTheRequirements(self):
+        self.assertEqual(AptBackend.Choose(["cmake", "ninja", "clang", "clangd"]),
+                         {"ninja": "ninja-build", "clang": "clang-18", "clangd": "clangd-18"})
+
+    def testOutdatedToolsComeFromTheReleaseArchives(self):
+        self.assertTrue(AptBackend.Install(["cmake", "ninja", "clang", "clangd"]))
+
+        self.assertEqual(self.AptGetCalls(), [
+            "update",
+            "install -y --no-install-recommends ninja-build clang-18 clangd-18",
+        ])
+        self.assertEqual(self.tarballTools, ["cmake"])
+        # The versioned binaries answer to the names the setup probes and the build runs
+        for tool in ("clang", "clang++", "clangd"):
+            self.assertEqual(os.readlink(os.path.join(self.binDirectory, tool)),
+                             os.path.join(self.fakeDirectory, tool + "-18"))
+        self.assertFalse(os.path.exists(os.path.join(self.binDirectory, "ninja")))
+
+    def testUnattendedInstallsNeverWaitForAPassword(self):
+        with mock.patch("os.geteuid", return_value=1000), mock.patch("shutil.which", return_value="/usr/bin/sudo"):
+            self.assertEqual(DnfBackend._Privileged(["dnf", "install", "-y", "cmake"], unattended=True),
+                             ["sudo", "-n", "dnf", "install", "-y", "cmake"])
+            self.assertEqual(DnfBackend._Privileged(["dnf", "install", "-y", "cmake"])[:2], ["sudo", "dnf"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Progress import Progress, ProgressTask
+
+
+class ProgressTaskTests(unittest.TestCase):
+    def testShortWindowsDoNotSeedTheRate(self):
+        task = ProgressTask("payload.bin", 10000)
+        # A block lands a few microseconds after the start, right before a redraw
+        task.done = 16
+        task._Sample(task.startTime + 0.00001)
+        self.assertIsNone(task.rate)
+
+        # The window stays open, so the first rate covers the whole first interval
+        task.done = 1000
+        task._Sample(task.startTime + Progress.interval * 2)
+        self.assertAlmostEqual(task.rate, 1000 / (Progress.interval * 2))
+
+    def testRateFollowsRecentThroughput(self):
+        task = ProgressTask("payload.bin", 100000)
+        step = Progress.interval * 1.5
+        now = task.startTime
+        for _ in range(20):
+            now += step
+            task.done += 500
+            task._Sample(now)
+        for _ in range(20):
+            now += step
+            task.done += 5000
+            task._Sample(now)
+        self.assertAlmostEqual(task.rate, 5000 / step, delta=0.01 * 5000 / step)
+
+
+if __name__ == "__main__":
+    unittest.main()